@@ -18,6 +18,8 @@ from ragstack_colbert import (
 from ragstack_langchain.colbert import ColbertVectorStore as LangChainColbertVectorStore
 from transformers import BertTokenizer
 
+from ragulate import cached_resource
+
 LLM_MODEL = "gpt-3.5-turbo"
 
 batch_size = 640
@@ -35,10 +37,12 @@ logging.getLogger("http").setLevel(logging.ERROR)
 logging.getLogger("httpx").setLevel(logging.ERROR)
 
 
+@cached_resource
 def get_embedding_model(chunk_size: int) -> ColbertEmbeddingModel:
     return ColbertEmbeddingModel(doc_maxlen=chunk_size, batch_size=batch_size)
 
 
+@cached_resource
 def get_database(chunk_size: int) -> CassandraDatabase:
     table_name = f"colbert_chunk_size_{chunk_size}"
 
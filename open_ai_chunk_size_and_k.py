@@ -8,10 +8,13 @@ from langchain_core.runnables import RunnablePassthrough
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from ragulate import cached_resource
+
 EMBEDDING_MODEL = "text-embedding-3-small"
 LLM_MODEL = "gpt-3.5-turbo"
 
 
+@cached_resource
 def get_vector_store(chunk_size: int):
     return AstraDBVectorStore(
         embedding=OpenAIEmbeddings(model=EMBEDDING_MODEL),
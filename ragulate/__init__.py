@@ -0,0 +1,6 @@
+from .resources import cached_resource, clear_resources
+
+__all__ = [
+    "cached_resource",
+    "clear_resources",
+]
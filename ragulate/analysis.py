@@ -1,5 +1,10 @@
-from typing import List
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
+import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
@@ -8,71 +13,196 @@ import seaborn as sns
 from pandas import DataFrame
 from plotly.io import write_image
 
-from .utils import get_tru
+from .result_extraction import extract_results
+from .result_store import ResultStore
+
+DEFAULT_RENDER_WORKERS = os.cpu_count() or 1
+
+
+def _init_render_worker() -> None:
+    # figures are only written to files, never shown
+    matplotlib.use("Agg")
+
+
+def _render(tasks: List[Tuple[Callable, Dict[str, Any]]], workers: int) -> None:
+    """
+    runs figure rendering tasks, one figure per task, on a pool of processes.
+    Each worker keeps its own Kaleido renderer running between the figures it
+    writes. With one worker, or one task, figures are rendered in this process.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        for func, kwargs in tasks:
+            func(**kwargs)
+        return
+
+    # spawned, as forking a process with running threads isn't safe
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(tasks)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_render_worker,
+    ) as pool:
+        futures = [pool.submit(func, **kwargs) for func, kwargs in tasks]
+        for future in futures:
+            future.result()
+
+
+# Custom function to set bin ranges and filter invalid values
+def _custom_hist(data, **kws):
+    metric = data["metric"].iloc[0]
+    data = data[np.isfinite(data["value"])]  # Remove NaN and infinite values
+    data = data[data["value"] >= 0]  # Ensure no negative values
+    if metric == "latency":
+        bins = np.concatenate(
+            [
+                np.linspace(
+                    0,
+                    15,
+                ),
+                [np.inf],
+            ]
+        )  # 46 bins from 0 to 15 seconds, plus one for >15 seconds
+        sns.histplot(data, x="value", bins=bins, stat="percent", **kws)
+    else:
+        bin_range = (0, 1)
+        sns.histplot(
+            data,
+            x="value",
+            stat="percent",
+            bins=10,
+            binrange=bin_range,
+            **kws,
+        )
+
+
+def _write_histogram_grid(
+    df: DataFrame, metrics: List[str], dataset: str, output_path: str
+) -> None:
+    # Melt the DataFrame to long format
+    df_melted = pd.melt(
+        df,
+        id_vars=["record_id", "recipe", "dataset"],
+        value_vars=metrics,
+        var_name="metric",
+        value_name="value",
+    )
+
+    # Set the theme for the plot
+    sns.set_theme(style="darkgrid")
+
+    # Create the FacetGrid
+    g = sns.FacetGrid(
+        df_melted,
+        col="metric",
+        row="recipe",
+        margin_titles=True,
+        height=3.5,
+        aspect=1,
+        sharex="col",
+        legend_out=False,
+    )
+
+    g.set_titles(row_template="{row_name}", col_template="{col_name}")
+
+    # Map the custom histogram function to the FacetGrid
+    g.map_dataframe(_custom_hist)
+
+    for ax, metric in zip(g.axes.flat, g.col_names * len(g.row_names)):
+        ax.set_ylim(0, 100)
+        # Set custom x-axis label
+        if metric == "latency":
+            ax.set_xlabel("Seconds")
+        else:
+            ax.set_xlabel("Score")
+
+    g.set_axis_labels(y_var="Percentage")
+
+    # Set the title for the entire figure
+    g.figure.suptitle(dataset, fontsize=16)
+
+    # Adjust the layout to make room for the title
+    g.figure.subplots_adjust(top=0.9)
+
+    # Save the plot as a PNG file
+    g.savefig(output_path)
+
+    # Close the plot to avoid displaying it
+    plt.close()
 
 
 class Analysis:
 
-    def get_all_data(self, recipes: List[str]) -> DataFrame:
-        df_all = pd.DataFrame()
+    database_url: Optional[str]
 
-        all_metrics: List[str] = []
+    def __init__(self, database_url: Optional[str] = None):
+        self.database_url = database_url
+
+    def get_all_data(self, recipes: List[str]) -> DataFrame:
+        frames: List[DataFrame] = []
+        all_metrics: Set[str] = set()
 
         for recipe in recipes:
-            tru = get_tru(recipe_name=recipe)
-
-            for app in tru.get_apps():
-                dataset = app["app_id"]
-                df, metrics = tru.get_records_and_feedback([dataset])
-                all_metrics.extend(metrics)
-
-                columns_to_keep = metrics + [
-                    "record_id",
-                    "latency",
-                    "total_tokens",
-                    "total_cost",
-                ]
-                columns_to_drop = [
-                    col for col in df.columns if col not in columns_to_keep
-                ]
-
-                df.drop(columns=columns_to_drop, inplace=True)
-                df["recipe"] = recipe
-                df["dataset"] = dataset
-
-                # set negative values to None
-                for metric in metrics:
-                    df.loc[df[metric] < 0, metric] = None
-
-                df_all = pd.concat([df_all, df], axis=0, ignore_index=True)
-
-            tru.delete_singleton()
-
-        df_all.reset_index(drop=True, inplace=True)
-
-        return df_all, list(set(all_metrics))
-
-    def calculate_statistics(self, df: pd.DataFrame, metrics: list):
-        stats = {}
-        for recipe in df["recipe"].unique():
-            stats[recipe] = {}
-            for metric in metrics:
-                stats[recipe][metric] = {}
-                for dataset in df["dataset"].unique():
-                    data = df[(df["recipe"] == recipe) & (df["dataset"] == dataset)][
-                        metric
-                    ]
-                    stats[recipe][metric][dataset] = {
-                        "high": data.max(),
-                        "low": data.min(),
-                        "median": data.median(),
-                        "mean": data.mean(),
-                        "1st_quartile": data.quantile(0.25),
-                        "3rd_quartile": data.quantile(0.75),
-                    }
-        return stats
-
-    def output_box_plots_by_dataset(self, df: DataFrame, metrics: List[str]):
+            store = ResultStore(recipe_name=recipe, database_url=self.database_url)
+            df, metrics = extract_results(store)
+            all_metrics.update(metrics)
+            frames.append(df)
+
+        df_all = pd.concat(frames, axis=0, ignore_index=True)
+
+        # set negative values to None
+        for metric in all_metrics:
+            df_all.loc[df_all[metric] < 0, metric] = None
+
+        return df_all, list(all_metrics)
+
+    def calculate_statistics(
+        self, df: DataFrame, metrics: List[str], confidence: float = 0.95
+    ) -> DataFrame:
+        """
+        computes the summary statistics of every metric for each recipe and
+        dataset in one pass. Returns a frame indexed by (recipe, dataset,
+        metric), including a `confidence` interval of the mean that uses the
+        normal approximation.
+        """
+        values = df.melt(
+            id_vars=["recipe", "dataset"],
+            value_vars=metrics,
+            var_name="metric",
+            value_name="value",
+        )
+        values["value"] = pd.to_numeric(values["value"], errors="coerce")
+        grouped = values.groupby(["recipe", "dataset", "metric"])["value"]
+
+        stats = grouped.agg(
+            high="max",
+            low="min",
+            median="median",
+            mean="mean",
+            std="std",
+            count="count",
+        )
+        quartiles = grouped.quantile([0.25, 0.75]).unstack()
+        stats["1st_quartile"] = quartiles[0.25]
+        stats["3rd_quartile"] = quartiles[0.75]
+
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        margin = z * stats["std"] / np.sqrt(stats["count"])
+        stats["ci_low"] = stats["mean"] - margin
+        stats["ci_high"] = stats["mean"] + margin
+
+        # recipes that are missing a dataset still get a row, as NaN
+        index = pd.MultiIndex.from_product(
+            [df["recipe"].unique(), df["dataset"].unique(), metrics],
+            names=["recipe", "dataset", "metric"],
+        )
+        return stats.reindex(index)
+
+    def output_box_plots_by_dataset(
+        self,
+        df: DataFrame,
+        metrics: List[str],
+        output_dir: str = ".",
+        workers: int = 1,
+    ):
         stats = self.calculate_statistics(df, metrics)
         recipes = sorted(df["recipe"].unique(), key=lambda x: x.lower())
         datasets = sorted(df["dataset"].unique(), key=lambda x: x.lower())
@@ -88,6 +218,7 @@ class Analysis:
 
         height = max((len(metrics) * len(recipes) * 20) + 150, 450)
 
+        tasks = []
         for dataset in datasets:
             fig = go.Figure()
             test_index = 0
@@ -101,7 +232,7 @@ class Analysis:
                 low = []
                 high = []
                 for metric in metrics:
-                    stat = stats[recipe][metric][dataset]
+                    stat = stats.loc[(recipe, dataset, metric)]
                     y.append(metric)
                     x.append(stat["mean"])
                     q1.append(stat["1st_quartile"])
@@ -146,104 +277,62 @@ class Analysis:
                 ),
             )
 
-            write_image(fig, f"./{dataset}_box_plot.png")
-
-    def output_histograms_by_dataset(self, df: pd.DataFrame, metrics: List[str]):
-        # Append "latency" to the metrics list
-        metrics.append("latency")
-
-        # Get unique datasets
-        datasets = df["dataset"].unique()
-
-        for dataset in datasets:
-            # Filter DataFrame for the current dataset
-            df_filtered = df[df["dataset"] == dataset]
-
-            # Melt the DataFrame to long format
-            df_melted = pd.melt(
-                df_filtered,
-                id_vars=["record_id", "recipe", "dataset"],
-                value_vars=metrics,
-                var_name="metric",
-                value_name="value",
+            tasks.append(
+                (
+                    write_image,
+                    dict(
+                        fig=fig,
+                        file=os.path.join(output_dir, f"{dataset}_box_plot.png"),
+                    ),
+                )
             )
-
-            # Set the theme for the plot
-            sns.set_theme(style="darkgrid")
-
-            # Custom function to set bin ranges and filter invalid values
-            def custom_hist(data, **kws):
-                metric = data["metric"].iloc[0]
-                data = data[
-                    np.isfinite(data["value"])
-                ]  # Remove NaN and infinite values
-                data = data[data["value"] >= 0]  # Ensure no negative values
-                if metric == "latency":
-                    bins = np.concatenate(
-                        [
-                            np.linspace(
-                                0,
-                                15,
-                            ),
-                            [np.inf],
-                        ]
-                    )  # 46 bins from 0 to 15 seconds, plus one for >15 seconds
-                    sns.histplot(data, x="value", bins=bins, stat="percent", **kws)
-                else:
-                    bin_range = (0, 1)
-                    sns.histplot(
-                        data,
-                        x="value",
-                        stat="percent",
-                        bins=10,
-                        binrange=bin_range,
-                        **kws,
-                    )
-
-            # Create the FacetGrid
-            g = sns.FacetGrid(
-                df_melted,
-                col="metric",
-                row="recipe",
-                margin_titles=True,
-                height=3.5,
-                aspect=1,
-                sharex="col",
-                legend_out=False,
+        _render(tasks=tasks, workers=workers)
+
+    def output_histograms_by_dataset(
+        self,
+        df: pd.DataFrame,
+        metrics: List[str],
+        output_dir: str = ".",
+        workers: int = 1,
+    ):
+        metrics = metrics + ["latency"]
+
+        tasks = []
+        for dataset in df["dataset"].unique():
+            # only the rows of the current dataset are sent to the worker
+            tasks.append(
+                (
+                    _write_histogram_grid,
+                    dict(
+                        df=df[df["dataset"] == dataset],
+                        metrics=metrics,
+                        dataset=dataset,
+                        output_path=os.path.join(
+                            output_dir, f"{dataset}_histogram_grid.png"
+                        ),
+                    ),
+                )
             )
-
-            g.set_titles(row_template="{row_name}", col_template="{col_name}")
-
-            # Map the custom histogram function to the FacetGrid
-            g.map_dataframe(custom_hist)
-
-            for ax, metric in zip(g.axes.flat, g.col_names * len(g.row_names)):
-                ax.set_ylim(0, 100)
-                # Set custom x-axis label
-                if metric == "latency":
-                    ax.set_xlabel("Seconds")
-                else:
-                    ax.set_xlabel("Score")
-
-            g.set_axis_labels(y_var="Percentage")
-
-            # Set the title for the entire figure
-            g.figure.suptitle(dataset, fontsize=16)
-
-            # Adjust the layout to make room for the title
-            g.figure.subplots_adjust(top=0.9)
-
-            # Save the plot as a PNG file
-            g.savefig(f"./{dataset}_histogram_grid.png")
-
-            # Close the plot to avoid displaying it
-            plt.close()
-
-    def compare(self, recipes: List[str], output: str):
+        _render(tasks=tasks, workers=workers)
+
+    def compare(
+        self,
+        recipes: List[str],
+        output: str = "box-plots",
+        output_dir: str = ".",
+        workers: Optional[int] = None,
+    ):
+        """writes a plot per dataset to `output_dir`, using `workers` processes"""
+        workers = DEFAULT_RENDER_WORKERS if workers is None else workers
         df, metrics = self.get_all_data(recipes=recipes)
+        os.makedirs(output_dir, exist_ok=True)
         if output == "box-plots":
-            self.output_box_plots_by_dataset(df=df, metrics=metrics)
+            self.output_box_plots_by_dataset(
+                df=df, metrics=metrics, output_dir=output_dir, workers=workers
+            )
         elif output == "histogram-grid":
-            self.output_histograms_by_dataset(df=df, metrics=metrics)
+            self.output_histograms_by_dataset(
+                df=df, metrics=metrics, output_dir=output_dir, workers=workers
+            )
         else:
             raise ValueError()
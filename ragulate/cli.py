@@ -1,5 +1,3 @@
-# this must be imported first for dynamic module loading to function properly
-import setuptools  # isort: skip
 import argparse
 
 from dotenv import load_dotenv
@@ -13,8 +11,15 @@ else:
     logger.info("Did not find .env file")
 
 
-def main() -> None:
+# commands that load ingest and query scripts dynamically
+SCRIPT_COMMANDS = {"ingest", "query", "run"}
+
 
+def build_parser() -> argparse.ArgumentParser:
+    """
+    sets up the commands. Their dependencies are imported only once a
+    command runs, so startup stays fast.
+    """
     parser = argparse.ArgumentParser(description="RAGu-late CLI tool.")
 
     # Subparsers for the main commands
@@ -24,10 +29,18 @@ def main() -> None:
     cli_commands.setup_ingest(subparsers=subparsers)
     cli_commands.setup_query(subparsers=subparsers)
     cli_commands.setup_compare(subparsers=subparsers)
+    cli_commands.setup_merge(subparsers=subparsers)
     cli_commands.setup_run(subparsers=subparsers)
+    return parser
+
 
+def main() -> None:
     # Parse the command-line arguments
-    args = parser.parse_args()
+    args = build_parser().parse_args()
+
+    if args.command in SCRIPT_COMMANDS:
+        # this must be imported before the pipelines for dynamic module loading to function properly
+        import setuptools  # noqa: F401
 
     # Call the appropriate function based on the command
     args.func(args)
@@ -1,6 +1,7 @@
 from .compare import setup_compare
 from .download import setup_download
 from .ingest import setup_ingest
+from .merge import setup_merge
 from .query import setup_query
 from .run import setup_run
 
@@ -8,6 +9,7 @@ __all__ = [
     "setup_compare",
     "setup_download",
     "setup_ingest",
+    "setup_merge",
     "setup_query",
     "setup_run",
 ]
@@ -1,7 +1,5 @@
 from typing import List, Optional
 
-from ..analysis import Analysis
-
 
 def setup_compare(subparsers):
     compare_parser = subparsers.add_parser(
@@ -22,6 +20,22 @@ def setup_compare(subparsers):
         help="The output method. Either box-plots (default) or histogram-grid",
         default="box-plots",
     )
+    compare_parser.add_argument(
+        "--output-dir",
+        type=str,
+        help="The folder to write the plot images to. Defaults to the current folder.",
+        default=".",
+    )
+    compare_parser.add_argument(
+        "--workers",
+        type=int,
+        help="The number of processes to render plots with, one plot per dataset at a time. Defaults to the number of CPUs.",
+    )
+    compare_parser.add_argument(
+        "--database-url",
+        type=str,
+        help="The SQLAlchemy url of a database to store results in, such as a shared Postgres server. Each recipe gets its own tables. Defaults to the RAGULATE_DATABASE_URL environment variable, or else a sqlite file per recipe.",
+    )
     compare_parser.set_defaults(func=lambda args: call_compare(**vars(args)))
 
 
@@ -34,10 +48,17 @@ def remove_sqlite_extension(s):
 def call_compare(
     recipe: List[str],
     output: Optional[str] = "box-plots",
+    output_dir: str = ".",
+    workers: Optional[int] = None,
+    database_url: Optional[str] = None,
     **kwargs,
 ):
-    analysis = Analysis()
+    from ..analysis import Analysis
+
+    analysis = Analysis(database_url=database_url)
 
     recipes = [remove_sqlite_extension(r) for r in recipe]
 
-    analysis.compare(recipes=recipes, output=output)
+    analysis.compare(
+        recipes=recipes, output=output, output_dir=output_dir, workers=workers
+    )
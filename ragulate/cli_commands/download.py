@@ -1,4 +1,8 @@
-from ragulate.datasets import get_dataset
+from ..datasets.defaults import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_DECOMPRESSION_WORKERS,
+    DEFAULT_SEGMENTS,
+)
 
 
 def setup_download(subparsers):
@@ -18,9 +22,46 @@ def setup_download(subparsers):
         help="The kind of dataset to download. Currently only `llama` is supported",
         required=True,
     )
+    download_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        help=f"The number of bytes to read at a time while downloading. Default is {DEFAULT_CHUNK_SIZE}.",
+        default=DEFAULT_CHUNK_SIZE,
+    )
+    download_parser.add_argument(
+        "--segments",
+        type=int,
+        help=f"The number of parallel range requests used to download large files with `--resumable`. Default is {DEFAULT_SEGMENTS}.",
+        default=DEFAULT_SEGMENTS,
+    )
+    download_parser.add_argument(
+        "--resumable",
+        help="Flag to download compressed files to disk in resumable segments before decompressing them, instead of decompressing them as they stream in.",
+        action="store_true",
+    )
+    download_parser.add_argument(
+        "--decompression-workers",
+        type=int,
+        help=f"The number of processes used to decompress multi-stream bz2 files, such as ones written by pbzip2. gzip, zstd and single-stream bz2 files are decompressed on one thread. Default is {DEFAULT_DECOMPRESSION_WORKERS}.",
+        default=DEFAULT_DECOMPRESSION_WORKERS,
+    )
     download_parser.set_defaults(func=lambda args: call_download(**vars(args)))
 
 
-def call_download(dataset_name: str, kind: str, **kwargs):
+def call_download(
+    dataset_name: str,
+    kind: str,
+    chunk_size: int,
+    segments: int,
+    resumable: bool,
+    decompression_workers: int,
+    **kwargs,
+):
+    from ragulate.datasets import get_dataset
+
     dataset = get_dataset(name=dataset_name, kind=kind)
+    dataset.download_chunk_size = chunk_size
+    dataset.download_segments = segments
+    dataset.download_resumable = resumable
+    dataset.decompression_workers = decompression_workers
     dataset.download_dataset()
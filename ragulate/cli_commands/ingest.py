@@ -1,8 +1,6 @@
 from typing import List
 
-from ragulate.datasets import find_dataset
-from ragulate.pipelines import IngestPipeline
-
+from ..pipelines.modes import EXECUTOR_KINDS
 from ..utils import convert_vars_to_ingredients
 
 
@@ -47,6 +45,30 @@ def setup_ingest(subparsers):
         help="The name of a dataset to ingest. This can be passed multiple times.",
         action="append",
     )
+    ingest_parser.add_argument(
+        "--workers",
+        type=int,
+        help="The number of source files (or document batches) to ingest concurrently. Default is 1.",
+        default=1,
+    )
+    ingest_parser.add_argument(
+        "--executor",
+        type=str,
+        help="The pool used to run a sync ingest method when `--workers` is greater than 1. Async ingest methods always share a single event loop.",
+        choices=EXECUTOR_KINDS,
+        default="thread",
+    )
+    ingest_parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="The number of source documents passed per call to an ingest method that takes a `documents` (parsed pages) or `html_documents` (raw html pages) param, for datasets like CRAG that stream their sources. Default is 100.",
+        default=100,
+    )
+    ingest_parser.add_argument(
+        "--force",
+        help="Flag to re-ingest every source file, including files that were already ingested unchanged by this pipeline.",
+        action="store_true",
+    )
     ingest_parser.set_defaults(func=lambda args: call_ingest(**vars(args)))
 
     def call_ingest(
@@ -56,8 +78,14 @@ def setup_ingest(subparsers):
         var_name: List[str],
         var_value: List[str],
         dataset: List[str],
+        workers: int,
+        executor: str,
+        force: bool,
+        batch_size: int,
         **kwargs,
     ):
+        from ragulate.datasets import find_dataset
+        from ragulate.pipelines import IngestPipeline
 
         datasets = [find_dataset(name=name) for name in dataset]
 
@@ -71,5 +99,9 @@ def setup_ingest(subparsers):
             method_name=method_name,
             ingredients=ingredients,
             datasets=datasets,
+            workers=workers,
+            executor=executor,
+            force=force,
+            batch_size=batch_size,
         )
         ingest_pipeline.ingest()
@@ -0,0 +1,28 @@
+from typing import List
+
+from ..logging_config import logger
+from ..sharding import merge_shards
+from ..utils import get_tru_db_path
+
+
+def setup_merge(subparsers):
+    merge_parser = subparsers.add_parser(
+        "merge", help="Merge the results of sharded query runs of recipes"
+    )
+    merge_parser.add_argument(
+        "-r",
+        "--recipe",
+        type=str,
+        help="A recipe to merge the shards of. This can be passed multiple times.",
+        required=True,
+        action="append",
+    )
+    merge_parser.set_defaults(func=lambda args: call_merge(**vars(args)))
+
+
+def call_merge(recipe: List[str], **kwargs):
+    for recipe_name in recipe:
+        shard_paths = merge_shards(recipe_name=recipe_name)
+        logger.info(
+            f"Merged {len(shard_paths)} shards of {recipe_name} into {get_tru_db_path(recipe_name)}"
+        )
@@ -1,8 +1,7 @@
 from typing import List
 
-from ragulate.datasets import find_dataset
-from ragulate.pipelines import QueryPipeline
-
+from ..pipelines.modes import EVALUATION_MODES
+from ..sharding import Shard, parse_shard
 from ..utils import convert_vars_to_ingredients
 
 
@@ -62,11 +61,11 @@ def setup_query(subparsers):
     query_parser.add_argument(
         "--seed",
         type=int,
-        help="Random seed to use for query sampling. Ensures reproducibility of tests.",
+        help="Random seed to use for query sampling. Ensures reproducibility of tests. Required to combine `--sample` with `--shard`.",
     )
     query_parser.add_argument(
         "--restart",
-        help="Flag to restart the query process instead of resuming. WARNING: this will delete all existing data for this query name, not just the data for the tagged datasets.",
+        help="Flag to restart the query process instead of resuming. WARNING: this will delete all existing results of this query name for the passed datasets.",
         action="store_true",
     )
     query_parser.add_argument(
@@ -88,6 +87,56 @@ def setup_query(subparsers):
         type=str,
         help="The name or id of the LLM model or deployment to use for Evaluation. Generally used in combination with the `--provider` param.",
     )
+    query_parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="The number of queries to run at once. Default is 1.",
+        default=1,
+    )
+    query_parser.add_argument(
+        "--query-rate-limit",
+        type=float,
+        help="The maximum number of queries to start per minute. Default is unlimited.",
+    )
+    query_parser.add_argument(
+        "--evaluation-mode",
+        type=str,
+        help="How feedbacks are evaluated. `deferred` (default) queues them for the TruLens evaluator. `batch` evaluates them concurrently as each query finishes, and queries with failed feedbacks run again when the recipe is queried again.",
+        choices=EVALUATION_MODES,
+        default="deferred",
+    )
+    query_parser.add_argument(
+        "--evaluation-parallelism",
+        type=int,
+        help="The number of feedback calls to run at once in `batch` evaluation mode. Default is 8.",
+        default=8,
+    )
+    query_parser.add_argument(
+        "--evaluation-rate-limit",
+        type=float,
+        help="The maximum number of requests to send to the evaluation LLM per minute in `batch` evaluation mode. Default is unlimited.",
+    )
+    query_parser.add_argument(
+        "--evaluation-token-limit",
+        type=float,
+        help="The maximum number of tokens to send to the evaluation LLM per minute in `batch` evaluation mode. Default is unlimited.",
+    )
+    query_parser.add_argument(
+        "--no-judge-cache",
+        dest="judge_cache",
+        help="Flag to disable the on-disk cache of judge LLM results used in `batch` evaluation mode.",
+        action="store_false",
+    )
+    query_parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        help="Run only one shard of the sampled queries, in the form `i/N` where `i` counts from 0. Sampled shards must pass the same `--seed`. Each shard stores its results in a separate sqlite file; combine them with `ragulate merge` before comparing. Shards using a shared `--database-url` write to it directly.",
+    )
+    query_parser.add_argument(
+        "--database-url",
+        type=str,
+        help="The SQLAlchemy url of a database to store results in, such as a shared Postgres server. Each recipe gets its own tables. Defaults to the RAGULATE_DATABASE_URL environment variable, or else a sqlite file per recipe.",
+    )
     query_parser.set_defaults(func=lambda args: call_query(**vars(args)))
 
     def call_query(
@@ -103,10 +152,29 @@ def setup_query(subparsers):
         restart: bool,
         provider: str,
         model: str,
+        concurrency: int,
+        query_rate_limit: float,
+        evaluation_mode: str,
+        evaluation_parallelism: int,
+        evaluation_rate_limit: float,
+        evaluation_token_limit: float,
+        judge_cache: bool,
+        shard: Shard,
+        database_url: str,
         **kwargs,
     ):
+        from ragulate.datasets import find_dataset
+        from ragulate.pipelines import QueryPipeline
+
         if sample <= 0.0 or sample > 1.0:
             raise ValueError("Sample percent must be between 0 and 1")
+        for flag, limit in [
+            ("--query-rate-limit", query_rate_limit),
+            ("--evaluation-rate-limit", evaluation_rate_limit),
+            ("--evaluation-token-limit", evaluation_token_limit),
+        ]:
+            if limit is not None and limit < 1:
+                raise ValueError(f"`{flag}` must be at least 1")
 
         datasets = [find_dataset(name=name) for name in dataset]
 
@@ -133,5 +201,14 @@ def setup_query(subparsers):
             restart_pipeline=restart,
             llm_provider=provider,
             model_name=model,
+            concurrency=concurrency,
+            query_rate_limit=query_rate_limit,
+            evaluation_mode=evaluation_mode,
+            evaluation_parallelism=evaluation_parallelism,
+            evaluation_rate_limit=evaluation_rate_limit,
+            evaluation_token_limit=evaluation_token_limit,
+            judge_cache=judge_cache,
+            shard=shard,
+            database_url=database_url,
         )
         query_pipeline.query()
@@ -1,11 +1,10 @@
-from typing import List
+import hashlib
+import os
+from typing import List, Optional
 
-from ragulate.config import ConfigParser
-from ragulate.datasets import BaseDataset, LlamaDataset
-from ragulate.pipelines import IngestPipeline, QueryPipeline
-
-from ..analysis import Analysis
 from ..logging_config import logger
+from ..sharding import Shard, parse_shard
+from ..utils import get_state_path
 
 
 def setup_run(subparsers):
@@ -19,69 +18,211 @@ def setup_run(subparsers):
             "The name of the yaml config_file that contains the recipes for your experiment "
         ),
     )
+    run_parser.add_argument(
+        "--force",
+        help="Flag to re-ingest every source file, including files that were already ingested unchanged by a pipeline.",
+        action="store_true",
+    )
+    run_parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        help="Run only one shard of the sampled queries of every recipe, in the form `i/N` where `i` counts from 0. Combine the shards with `ragulate merge` before comparing.",
+    )
+    run_parser.add_argument(
+        "--database-url",
+        type=str,
+        help="The SQLAlchemy url of a database to store results in, such as a shared Postgres server. Each recipe gets its own tables. Defaults to the RAGULATE_DATABASE_URL environment variable, or else a sqlite file per recipe.",
+    )
+    run_parser.add_argument(
+        "--parallel-recipes",
+        type=int,
+        help="The number of ingest and query pipelines to run at once, each in its own process. Recipes only wait on the ingest of their own store. Default is 1, which runs them one at a time.",
+        default=1,
+    )
+    run_parser.add_argument(
+        "--parallel-ingests",
+        type=int,
+        help="The maximum number of ingest pipelines to run at once, when `--parallel-recipes` is greater than 1. Default is no separate limit.",
+    )
+    run_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Run the queries and evaluations of every recipe as jobs, split by dataset and query shard, on this many worker processes that share a local job queue. Jobs of crashed workers are queued again. Evaluation always uses `batch` mode in worker mode. Default is 0, which runs each recipe's queries in a single pipeline.",
+        default=0,
+    )
+    run_parser.add_argument(
+        "--job-shards",
+        type=int,
+        help="The number of query shards each recipe and dataset is split into with `--workers`. Defaults to the number of workers.",
+    )
     run_parser.set_defaults(func=lambda args: call_run(**vars(args)))
 
 
-def call_run(config_file: str, **kwargs):
+def call_run(
+    config_file: str,
+    force: bool = False,
+    shard: Optional[Shard] = None,
+    database_url: Optional[str] = None,
+    parallel_recipes: int = 1,
+    parallel_ingests: Optional[int] = None,
+    workers: int = 0,
+    job_shards: Optional[int] = None,
+    **kwargs,
+):
+    from ragulate.config import ConfigParser
+    from ragulate.config.objects import Recipe
+    from ragulate.datasets import BaseDataset
+    from ragulate.pipelines import (
+        ExecutionPlan,
+        IngestPipeline,
+        QueryPipeline,
+        Scheduler,
+    )
+    from ragulate.pipelines.job_queue import JobQueue
+    from ragulate.pipelines.workers import WorkerPool
+
+    from ..analysis import Analysis
+    from ..result_store import ResultStore
+
+    if parallel_ingests is not None and parallel_ingests < 1:
+        raise ValueError("Parallel ingests must be at least 1")
+    if workers < 0:
+        raise ValueError("Workers must be at least 0")
+    if workers > 0 and shard is not None:
+        raise ValueError("`--shard` can't be combined with `--workers`")
+    if job_shards is not None and job_shards < 1:
+        raise ValueError("Job shards must be at least 1")
+
     config_parser = ConfigParser.from_file(file_path=config_file)
     config = config_parser.get_config()
 
-    ingest_pipelines: List[IngestPipeline] = []
-    query_pipelines: List[QueryPipeline] = []
-    cleanup_pipelines = []
-
-    for dataset in config.datasets.values():
-        dataset.download_dataset()
+    def get_query_pipeline(
+        name: str, recipe: Recipe, datasets: List[BaseDataset], **kwargs
+    ) -> QueryPipeline:
+        options = dict(
+            concurrency=config.query_options.concurrency,
+            query_rate_limit=config.query_options.rate_limit,
+            evaluation_mode=config.evaluation_options.mode,
+            evaluation_parallelism=config.evaluation_options.parallelism,
+            evaluation_rate_limit=config.evaluation_options.rate_limit,
+            evaluation_token_limit=config.evaluation_options.token_limit,
+            judge_cache=config.evaluation_options.judge_cache,
+            shard=shard,
+            database_url=database_url,
+        )
+        options.update(kwargs)
+        return QueryPipeline(
+            recipe_name=name,
+            script_path=recipe.query.script,
+            method_name=recipe.query.method,
+            ingredients=recipe.ingredients,
+            datasets=datasets,
+            **options,
+        )
+
+    plan = ExecutionPlan()
 
     for name, recipe in config.recipes.items():
+        ingest_pipeline = None
+        query_pipeline = None
         if recipe.ingest is not None:
-            ingest_pipelines.append(
-                IngestPipeline(
-                    recipe_name=name,
-                    script_path=recipe.ingest.script,
-                    method_name=recipe.ingest.method,
-                    ingredients=recipe.ingredients,
-                    datasets=config.datasets.values(),
-                )
+            ingest_pipeline = IngestPipeline(
+                recipe_name=name,
+                script_path=recipe.ingest.script,
+                method_name=recipe.ingest.method,
+                ingredients=recipe.ingredients,
+                datasets=config.datasets.values(),
+                workers=config.ingest_options.workers,
+                executor=config.ingest_options.executor,
+                batch_size=config.ingest_options.batch_size,
+                force=force,
             )
         if recipe.query is not None:
-            query_pipelines.append(
-                QueryPipeline(
-                    recipe_name=name,
-                    script_path=recipe.query.script,
-                    method_name=recipe.query.method,
-                    ingredients=recipe.ingredients,
-                    datasets=config.datasets.values(),
-                )
+            query_pipeline = get_query_pipeline(
+                name=name, recipe=recipe, datasets=list(config.datasets.values())
             )
+        plan.add_recipe(ingest_pipeline=ingest_pipeline, query_pipeline=query_pipeline)
 
-    logger.debug("Found these ingest pipelines:")
-    for ingest_pipeline in ingest_pipelines:
-        logger.debug(f"\t{ingest_pipeline._key()}")
-
-    ingest_pipelines = list(set(ingest_pipelines))
+    plan.log_plan()
 
-    logger.debug("Narrowed down to these ingest pipelines:")
-    for ingest_pipeline in ingest_pipelines:
-        logger.debug(f"\t{ingest_pipeline._key()}")
-
-    logger.debug("Found these query pipelines:")
-    for query_pipeline in query_pipelines:
-        logger.debug(f"\t{query_pipeline._key()}")
-
-    query_pipelines = list(set(query_pipelines))
-
-    logger.debug("Narrowed down to these query pipelines:")
-    for query_pipeline in query_pipelines:
-        logger.debug(f"\t{query_pipeline._key()}")
-
-    for ingest_pipeline in ingest_pipelines:
-        ingest_pipeline.ingest()
-
-    for query_pipeline in query_pipelines:
-        query_pipeline.query()
+    scheduler = Scheduler(
+        parallelism=parallel_recipes,
+        limits=None if parallel_ingests is None else {"ingest": parallel_ingests},
+    )
+    downloads = [
+        scheduler.add_task(
+            name=f"download {dataset.name}",
+            kind="download",
+            func=dataset.download_dataset,
+        )
+        for dataset in config.datasets.values()
+    ]
+    plan.add_tasks(scheduler=scheduler, dependencies=downloads, queries=workers == 0)
+
+    if workers > 0:
+        # one queue per config file, so separate runs don't share jobs
+        config_key = hashlib.blake2b(
+            os.path.abspath(config_file).encode(), digest_size=8
+        ).hexdigest()
+        jobs_path = get_state_path("jobs", f"{config_key}.sqlite")
+
+        def run_query_jobs() -> None:
+            if config.evaluation_options.mode != "batch":
+                logger.info(
+                    "Using `batch` evaluation, as each worker evaluates the feedbacks of its own jobs"
+                )
+            shard_count = job_shards or workers
+            queue = JobQueue(db_path=jobs_path)
+            try:
+                queue.clear()
+                for query_pipeline in plan.query_pipelines():
+                    recipe_name = query_pipeline.recipe_name
+                    # created here, so the workers don't race to create tables
+                    ResultStore(
+                        recipe_name=recipe_name, database_url=database_url
+                    ).prepare()
+                    for dataset in query_pipeline.datasets:
+                        for index in range(shard_count):
+                            job_pipeline = get_query_pipeline(
+                                name=recipe_name,
+                                recipe=config.recipes[recipe_name],
+                                datasets=[dataset],
+                                shard=(index, shard_count),
+                                shard_database=False,
+                                evaluation_mode="batch",
+                                show_progress=False,
+                            )
+                            queue.add(
+                                name=f"query {recipe_name} on {dataset.name} shard {index}/{shard_count}",
+                                func=job_pipeline.query,
+                            )
+                WorkerPool(queue=queue, workers=workers).run()
+            finally:
+                queue.close()
+
+        scheduler.add_task(
+            name="query jobs",
+            kind="query",
+            func=run_query_jobs,
+            dependencies=list(scheduler.tasks),
+            local=True,
+        )
 
     recipe_names = [n for n in config.recipes.keys()]
 
-    analysis = Analysis()
-    analysis.compare(recipes=recipe_names)
+    if shard is None:
+        analysis = Analysis(database_url=database_url)
+        scheduler.add_task(
+            name="compare",
+            kind="compare",
+            func=lambda: analysis.compare(recipes=recipe_names),
+            dependencies=list(scheduler.tasks),
+            local=True,
+        )
+
+    scheduler.run()
+
+    if shard is not None:
+        logger.info(
+            "Skipping comparison of a single shard. Run `ragulate merge` once every shard finishes."
+        )
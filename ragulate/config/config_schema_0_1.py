@@ -3,7 +3,14 @@ from typing import Any, Dict
 from ragulate.datasets import BaseDataset, find_dataset, get_dataset
 
 from .base_config_schema import BaseConfigSchema
-from .objects import Config, Recipe, Step
+from .objects import (
+    Config,
+    EvaluationOptions,
+    IngestOptions,
+    QueryOptions,
+    Recipe,
+    Step,
+)
 from .utils import dict_to_string
 
 
@@ -124,6 +131,34 @@ class ConfigSchema_0_1(BaseConfigSchema):
             ]
         }
 
+        ingest_options = {
+            "type": "dict",
+            "schema": {
+                "workers": {"type": "integer", "min": 1},
+                "executor": {"type": "string", "allowed": ["thread", "process"]},
+                "batch_size": {"type": "integer", "min": 1},
+            },
+        }
+
+        query_options = {
+            "type": "dict",
+            "schema": {
+                "concurrency": {"type": "integer", "min": 1},
+                "rate_limit": {"type": "number", "min": 1},
+            },
+        }
+
+        evaluation_options = {
+            "type": "dict",
+            "schema": {
+                "mode": {"type": "string", "allowed": ["deferred", "batch"]},
+                "parallelism": {"type": "integer", "min": 1},
+                "rate_limit": {"type": "number", "min": 1},
+                "token_limit": {"type": "number", "min": 1},
+                "judge_cache": {"type": "boolean"},
+            },
+        }
+
         schema = {
             "version": {"type": "float", "allowed": [0.1]},
             "steps": steps,
@@ -131,6 +166,9 @@ class ConfigSchema_0_1(BaseConfigSchema):
             "datasets": dataset_list,
             "eval_llms": llm_list,
             "metrics": metrics,
+            "ingest_options": ingest_options,
+            "query_options": query_options,
+            "evaluation_options": evaluation_options,
         }
 
         return schema
@@ -231,4 +269,14 @@ class ConfigSchema_0_1(BaseConfigSchema):
                         name=doc_dataset_name, kind=doc_dataset_kind
                     )
 
-        return Config(recipes=recipes, datasets=datasets)
+        ingest_options = IngestOptions(**document.get("ingest_options", {}))
+        query_options = QueryOptions(**document.get("query_options", {}))
+        evaluation_options = EvaluationOptions(**document.get("evaluation_options", {}))
+
+        return Config(
+            recipes=recipes,
+            datasets=datasets,
+            ingest_options=ingest_options,
+            query_options=query_options,
+            evaluation_options=evaluation_options,
+        )
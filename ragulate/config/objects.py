@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from pydantic import BaseModel
 
@@ -19,9 +19,31 @@ class Recipe(BaseModel):
     ingredients: Dict[str, Any]
 
 
+class IngestOptions(BaseModel):
+    workers: int = 1
+    executor: str = "thread"
+    batch_size: int = 100
+
+
+class QueryOptions(BaseModel):
+    concurrency: int = 1
+    rate_limit: Optional[float] = None
+
+
+class EvaluationOptions(BaseModel):
+    mode: str = "deferred"
+    parallelism: int = 8
+    rate_limit: Optional[float] = None
+    token_limit: Optional[float] = None
+    judge_cache: bool = True
+
+
 class Config(BaseModel):
     class Config:
         arbitrary_types_allowed = True
 
     recipes: Dict[str, Recipe] = {}
     datasets: Dict[str, BaseDataset] = {}
+    ingest_options: IngestOptions = IngestOptions()
+    query_options: QueryOptions = QueryOptions()
+    evaluation_options: EvaluationOptions = EvaluationOptions()
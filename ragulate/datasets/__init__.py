@@ -1,7 +1,12 @@
-from .base_dataset import BaseDataset
-from .crag_dataset import CragDataset
-from .llama_dataset import LlamaDataset
-from .utils import find_dataset, get_dataset
+from typing import TYPE_CHECKING
+
+from ..utils import lazy_exports
+
+if TYPE_CHECKING:
+    from .base_dataset import BaseDataset
+    from .crag_dataset import CragDataset
+    from .llama_dataset import LlamaDataset
+    from .utils import find_dataset, get_dataset
 
 __all__ = [
     "BaseDataset",
@@ -10,3 +15,14 @@ __all__ = [
     "find_dataset",
     "get_dataset",
 ]
+
+__getattr__ = lazy_exports(
+    __name__,
+    {
+        "BaseDataset": ".base_dataset",
+        "CragDataset": ".crag_dataset",
+        "LlamaDataset": ".llama_dataset",
+        "find_dataset": ".utils",
+        "get_dataset": ".utils",
+    },
+)
@@ -1,13 +1,22 @@
-import bz2
-import tempfile
+import asyncio
+import os
+import random
 from abc import ABC, abstractmethod
 from os import makedirs, path
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-import aiofiles
 import aiohttp
-from tqdm.asyncio import tqdm
+
+from .decompression import DEFAULT_DECOMPRESSION_WORKERS, decompress_file
+from .download import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_SEGMENTS,
+    download_and_decompress,
+    download_file,
+    has_partial_download,
+)
+from .query_cache import QueryCache, arrow_available, table_to_queries_and_golden_set
 
 
 class BaseDataset(ABC):
@@ -15,6 +24,13 @@ class BaseDataset(ABC):
     root_storage_path: str
     name: str
     _subsets: List[str] = []
+    download_chunk_size: int = DEFAULT_CHUNK_SIZE
+    download_segments: int = DEFAULT_SEGMENTS
+    download_resumable: bool = False
+    decompression_workers: int = DEFAULT_DECOMPRESSION_WORKERS
+    # the kinds of source documents a dataset streams, for datasets whose
+    # sources aren't individual files
+    source_document_kinds: List[str] = []
 
     def __init__(
         self, dataset_name: str, root_storage_path: Optional[str] = "datasets"
@@ -54,48 +70,109 @@ class BaseDataset(ABC):
     def get_source_file_paths(self) -> List[str]:
         """gets a list of source file paths for for a dataset"""
 
+    def iter_source_documents(self, kind: str) -> Iterator[Dict[str, Any]]:
+        """
+        streams source documents of one of the `source_document_kinds`, for
+        datasets whose sources aren't individual files. These are passed in
+        batches to ingest methods with a `documents` or `html_documents` param.
+        """
+        raise ValueError(f"Dataset {self.name} doesn't stream source documents")
+
     @abstractmethod
+    def _read_queries_and_golden_set(self) -> Tuple[List[str], List[Dict[str, str]]]:
+        """parses the queries and golden_truth answers from the dataset files"""
+
+    def _read_sampled_queries_and_golden_set(
+        self, sample_percent: float, seed: Optional[int]
+    ) -> Tuple[List[str], List[Dict[str, str]]]:
+        """parses a random sample of the queries from the dataset files"""
+        queries, golden_set = self._read_queries_and_golden_set()
+        if sample_percent < 1.0:
+            indices = self._sample_indices(
+                count=len(queries), sample_percent=sample_percent, seed=seed
+            )
+            queries = [queries[i] for i in indices]
+        return queries, golden_set
+
+    def _query_source_paths(self) -> List[str]:
+        """
+        the files queries and golden sets are parsed from. The query cache is
+        only used for datasets that list them.
+        """
+        return []
+
+    def _query_cache_dir(self) -> str:
+        return path.join(self.storage_path(), ".cache")
+
+    def _load_query_table(self) -> Optional[Any]:
+        """
+        loads the cached queries and golden set for the selected subsets,
+        building the cache first if needed. Returns None when the cache can't
+        be used, in which case the dataset files are parsed directly.
+        """
+        source_paths = self._query_source_paths()
+        if not arrow_available() or len(source_paths) == 0:
+            return None
+
+        subsets = "+".join(sorted(self.subsets)) or "all"
+        cache = QueryCache(
+            cache_path=path.join(self._query_cache_dir(), f"queries.{subsets}.arrow"),
+            source_paths=source_paths,
+        )
+        table = cache.load()
+        if table is None:
+            queries, golden_set = self._read_queries_and_golden_set()
+            table = cache.write(queries=queries, golden_set=golden_set)
+        return table
+
     def get_queries_and_golden_set(self) -> Tuple[List[str], List[Dict[str, str]]]:
         """gets a list of queries and golden_truth answers for a dataset"""
-
-    async def _download_file(
-        self, session: aiohttp.ClientSession, url: str, temp_file_path: str
-    ) -> None:
-        timeout = aiohttp.ClientTimeout(total=6000)
-        async with session.get(url, timeout=timeout) as response:
-            file_size = int(response.headers.get("Content-Length", 0))
-            chunk_size = 1024
-            with tqdm(
-                total=file_size,
-                unit="B",
-                unit_scale=True,
-                desc=f'Downloading {url.split("/")[-1]}',
-            ) as progress_bar:
-                async with aiofiles.open(temp_file_path, "wb") as temp_file:
-                    async for chunk in response.content.iter_chunked(chunk_size):
-                        await temp_file.write(chunk)
-                        progress_bar.update(len(chunk))
+        table = self._load_query_table()
+        if table is None:
+            return self._read_queries_and_golden_set()
+        return table_to_queries_and_golden_set(table)
+
+    def _sample_indices(
+        self, count: int, sample_percent: float, seed: Optional[int]
+    ) -> List[int]:
+        """
+        picks `sample_percent` of the indices in `range(count)`. A seeded
+        generator of its own keeps the sample the same in every process.
+        """
+        return random.Random(seed).sample(range(count), int(sample_percent * count))
+
+    def get_sampled_queries_and_golden_set(
+        self, sample_percent: float = 1.0, seed: Optional[int] = None
+    ) -> Tuple[List[str], List[Dict[str, str]]]:
+        """gets a random sample of the queries, with the golden_truth answers for them"""
+        table = self._load_query_table()
+        if table is None:
+            return self._read_sampled_queries_and_golden_set(
+                sample_percent=sample_percent, seed=seed
+            )
+
+        indices = None
+        if sample_percent < 1.0:
+            indices = self._sample_indices(
+                count=table.num_rows, sample_percent=sample_percent, seed=seed
+            )
+        return table_to_queries_and_golden_set(table, indices=indices)
 
     async def _decompress_file(
         self, temp_file_path: str, output_file_path: str
     ) -> None:
         makedirs(path.dirname(output_file_path), exist_ok=True)
-        with open(temp_file_path, "rb") as temp_file:
-            decompressed_size = 0
-            with bz2.BZ2File(temp_file, "rb") as bz2_file:
-                async with aiofiles.open(output_file_path, "wb") as output_file:
-                    with tqdm(
-                        unit="B",
-                        unit_scale=True,
-                        desc=f"Decompressing {output_file_path}",
-                    ) as progress_bar:
-                        while True:
-                            chunk = bz2_file.read(1024)
-                            if not chunk:
-                                break
-                            await output_file.write(chunk)
-                            decompressed_size += len(chunk)
-                            progress_bar.update(len(chunk))
+        # decompress next to the output, so an interrupted run doesn't leave a
+        # partial file that looks finished.
+        partial_output_path = f"{output_file_path}.part"
+        await asyncio.to_thread(
+            decompress_file,
+            input_file_path=temp_file_path,
+            output_file_path=partial_output_path,
+            workers=self.decompression_workers,
+            desc=f"Decompressing {output_file_path}",
+        )
+        os.replace(partial_output_path, output_file_path)
 
     async def _download_and_decompress(
         self, url: str, output_file_path: str, force: bool
@@ -104,9 +181,35 @@ class BaseDataset(ABC):
             print(f"File {output_file_path} already exists. Skipping download.")
             return
 
-        async with aiohttp.ClientSession() as session:
-            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                temp_file_path = temp_file.name
-
-                await self._download_file(session, url, temp_file_path)
-                await self._decompress_file(temp_file_path, output_file_path)
+        makedirs(path.dirname(output_file_path), exist_ok=True)
+        compressed_file_path = path.join(
+            path.dirname(output_file_path), url.split("/")[-1]
+        )
+        resume = has_partial_download(compressed_file_path) or path.exists(
+            compressed_file_path
+        )
+
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=300)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            if not self.download_resumable and not resume:
+                await download_and_decompress(
+                    session=session,
+                    url=url,
+                    output_file_path=output_file_path,
+                    chunk_size=self.download_chunk_size,
+                    workers=self.decompression_workers,
+                )
+                return
+
+            # a finished download is kept until it has been decompressed
+            if force or not path.exists(compressed_file_path):
+                await download_file(
+                    session=session,
+                    url=url,
+                    output_file_path=compressed_file_path,
+                    chunk_size=self.download_chunk_size,
+                    segments=self.download_segments,
+                )
+
+        await self._decompress_file(compressed_file_path, output_file_path)
+        os.remove(compressed_file_path)
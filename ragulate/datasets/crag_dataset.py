@@ -1,7 +1,11 @@
 import asyncio
 import json
+import mmap
+import os
 from os import path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
 
 from .base_dataset import BaseDataset
 
@@ -18,6 +22,7 @@ class CragDataset(BaseDataset):
         "simple_w_condition",
         "simple",
     ]
+    source_document_kinds: List[str] = ["parsed", "html"]
 
     def __init__(
         self, dataset_name: str, root_storage_path: Optional[str] = "datasets"
@@ -39,44 +44,157 @@ class CragDataset(BaseDataset):
                 path.join(self.storage_path(), "parsed_documents.jsonl"),
                 path.join(self.storage_path(), "questions.jsonl"),
             ]
-            tasks = [
-                self._download_and_decompress(
-                    url=url, output_file_path=output_file, force=False
+
+            async def download_all():
+                await asyncio.gather(
+                    *[
+                        self._download_and_decompress(
+                            url=url, output_file_path=output_file, force=False
+                        )
+                        for url, output_file in zip(urls, output_files)
+                    ]
                 )
-                for url, output_file in zip(urls, output_files)
-            ]
-            asyncio.run(asyncio.gather(*tasks))
+
+            asyncio.run(download_all())
+            self._load_question_index()
         else:
             raise NotImplementedError(f"Crag download not supported for {self.name}")
 
     def get_source_file_paths(self) -> List[str]:
-        raise NotImplementedError("Crag source files are not yet supported")
+        """crag sources are streamed with `iter_source_documents` instead"""
+        return []
 
-    def get_queries_and_golden_set(self) -> Tuple[List[str], List[Dict[str, str]]]:
-        """gets a list of queries and golden_truth answers for a dataset"""
-        queries: List[str] = []
-        golden_set: List[Dict[str, str]] = []
+    def iter_source_documents(self, kind: str) -> Iterator[Dict[str, Any]]:
+        """
+        streams the parsed or html documents one line at a time. The
+        `interaction_id` of the question each page was retrieved for is
+        dropped, so that pages shared by several questions are identical
+        documents.
+        """
+        if kind not in self.source_document_kinds:
+            raise ValueError(
+                f"Unsupported source document kind: {kind}. Choices are {self.source_document_kinds}"
+            )
+        documents_path = path.join(self.storage_path(), f"{kind}_documents.jsonl")
+        with open(documents_path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                document = json.loads(line)
+                document.pop("interaction_id", None)
+                yield document
+
+    def _questions_path(self) -> str:
+        return path.join(self.storage_path(), "questions.jsonl")
+
+    def _question_index_path(self) -> str:
+        return path.join(self.storage_path(), "questions.index.npz")
+
+    def _build_question_index(self) -> Dict[str, np.ndarray]:
+        """
+        scans questions.jsonl once, recording the byte offset, length and
+        `question_type` of every line that has both a query and an answer.
+        """
+        offsets: List[int] = []
+        lengths: List[int] = []
+        kind_codes: List[int] = []
+        kind_names: Dict[str, int] = {}
+
+        offset = 0
+        with open(self._questions_path(), "rb") as f:
+            for line in f:
+                data = json.loads(line)
+                if data.get("query") is not None and data.get("answer") is not None:
+                    kind = str(data.get("question_type"))
+                    offsets.append(offset)
+                    lengths.append(len(line))
+                    kind_codes.append(kind_names.setdefault(kind, len(kind_names)))
+                offset += len(line)
+
+        stat = os.stat(self._questions_path())
+        index = {
+            "source": np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64),
+            "offsets": np.array(offsets, dtype=np.int64),
+            "lengths": np.array(lengths, dtype=np.int64),
+            "kind_codes": np.array(kind_codes, dtype=np.int16),
+            "kind_names": np.array(list(kind_names), dtype=str),
+        }
+        with open(self._question_index_path(), "wb") as f:
+            np.savez(f, **index)
+        return index
+
+    def _load_question_index(self) -> Dict[str, np.ndarray]:
+        """loads the question index, re-building it if questions.jsonl changed"""
+        if path.exists(self._question_index_path()):
+            with np.load(self._question_index_path()) as npz:
+                index = {key: npz[key] for key in npz.files}
+            stat = os.stat(self._questions_path())
+            if index["source"].tolist() == [stat.st_size, stat.st_mtime_ns]:
+                return index
+        return self._build_question_index()
 
+    def _get_question_rows(self) -> Tuple[np.ndarray, np.ndarray]:
+        """returns the offsets and lengths of the questions in the subsets, in file order"""
         for subset in self.subsets:
             if subset not in self._subset_kinds:
                 raise ValueError(
                     f"Subset: {subset} doesn't exist in dataset {self.name}. Choices are {self._subset_kinds}"
                 )
 
-        json_path = path.join(self.storage_path(), f"questions.jsonl")
-        with open(json_path, "r") as f:
-            for line in f:
-                data = json.loads(line.strip())
-                kind = data.get("question_type")
+        index = self._load_question_index()
+        offsets, lengths = index["offsets"], index["lengths"]
+        if len(self.subsets) > 0:
+            selected_codes = [
+                code
+                for code, kind in enumerate(index["kind_names"])
+                if kind in self.subsets
+            ]
+            mask = np.isin(index["kind_codes"], selected_codes)
+            offsets, lengths = offsets[mask], lengths[mask]
+        return offsets, lengths
 
-                if len(self.subsets) > 0 and kind not in self.subsets:
-                    continue
+    def _read_questions(
+        self, offsets: np.ndarray, lengths: np.ndarray
+    ) -> Tuple[List[str], List[Dict[str, str]]]:
+        queries: List[str] = []
+        golden_set: List[Dict[str, str]] = []
+
+        if len(offsets) == 0:
+            return queries, golden_set
 
-                query = data.get("query")
-                answer = data.get("answer")
-                if query is not None and answer is not None:
+        with open(self._questions_path(), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset, length in zip(offsets.tolist(), lengths.tolist()):
+                    data = json.loads(mm[offset : offset + length])
+                    query = data["query"]
                     queries.append(query)
-                    golden_set.append({"query": query, "response": answer})
+                    golden_set.append({"query": query, "response": data["answer"]})
+
+        return queries, golden_set
+
+    def _query_source_paths(self) -> List[str]:
+        return [self._questions_path()]
+
+    def _read_queries_and_golden_set(self) -> Tuple[List[str], List[Dict[str, str]]]:
+        """reads the queries and golden_truth answers of the subsets through the index"""
+        offsets, lengths = self._get_question_rows()
+        queries, golden_set = self._read_questions(offsets=offsets, lengths=lengths)
+
+        print(f"found {len(queries)} for subsets: {self.subsets}")
+
+        return queries, golden_set
+
+    def _read_sampled_queries_and_golden_set(
+        self, sample_percent: float, seed: Optional[int]
+    ) -> Tuple[List[str], List[Dict[str, str]]]:
+        """reads a random sample of the queries, reading only the sampled rows"""
+        offsets, lengths = self._get_question_rows()
+        if sample_percent < 1.0:
+            indices = self._sample_indices(
+                count=len(offsets), sample_percent=sample_percent, seed=seed
+            )
+            offsets, lengths = offsets[indices], lengths[indices]
+        queries, golden_set = self._read_questions(offsets=offsets, lengths=lengths)
 
         print(f"found {len(queries)} for subsets: {self.subsets}")
 
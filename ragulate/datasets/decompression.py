@@ -0,0 +1,314 @@
+import asyncio
+import bz2
+import multiprocessing
+import os
+import re
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from queue import Queue
+from typing import Any, Deque, Optional
+
+from tqdm import tqdm
+
+from .defaults import DEFAULT_DECOMPRESSION_WORKERS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+READ_BUFFER_SIZE = 8 * 1024 * 1024
+WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+
+# compressed bytes handed to each process by the parallel bz2 decoder
+BZ2_PIECE_SIZE = 8 * 1024 * 1024
+# decode serially when this many pieces of data arrive without a stream boundary
+SERIAL_FALLBACK_PIECES = 4
+
+CODECS = ["bz2", "gzip", "zstd"]
+
+_MAGIC_BYTES = {
+    b"BZh": "bz2",
+    b"\x1f\x8b": "gzip",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+
+# a bz2 stream header followed by the magic number of its first block
+_BZ2_STREAM_START = re.compile(rb"BZh[1-9]\x31\x41\x59\x26\x53\x59")
+_BZ2_STREAM_START_LENGTH = 10
+
+
+def detect_codec(header: bytes) -> str:
+    """detects the compression codec from the first bytes of a file"""
+    for magic, codec in _MAGIC_BYTES.items():
+        if header.startswith(magic):
+            return codec
+    raise ValueError(f"Unrecognized compression format. Supported formats are {CODECS}")
+
+
+def _new_decompressor(codec: str) -> Any:
+    if codec == "bz2":
+        return bz2.BZ2Decompressor()
+    if codec == "gzip":
+        return zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    if zstandard is None:
+        raise ValueError(
+            "zstd archives require the `zstandard` package. Install it with `pip install ragulate[zstd]`."
+        )
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+class _Decoder:
+    """
+    decodes data incrementally, including files made of several concatenated
+    streams (gzip members, zstd frames or bz2 streams).
+    """
+
+    def __init__(self, codec: str):
+        self._codec = codec
+        self._decompressor = _new_decompressor(codec)
+
+    def decode(self, data: bytes) -> bytes:
+        output = []
+        while data:
+            if self._decompressor.eof:
+                self._decompressor = _new_decompressor(self._codec)
+            output.append(self._decompressor.decompress(data))
+            data = self._decompressor.unused_data if self._decompressor.eof else b""
+        return b"".join(output)
+
+    def finish(self) -> bytes:
+        if not self._decompressor.eof:
+            raise ValueError("Compressed data ended before the end of the stream")
+        return b""
+
+
+def _decompress_bz2_piece(data: bytes) -> bytes:
+    return bz2.decompress(data)
+
+
+class _ParallelBz2Decoder:
+    """
+    decodes multi-stream bz2 data (as written by pbzip2 and similar tools) by
+    cutting it at stream boundaries and decompressing the pieces in separate
+    processes. Output stays in order, with a bounded number of pieces in
+    flight. Data with no stream boundaries, such as files written by plain
+    bzip2, falls back to being decoded serially as it arrives.
+    """
+
+    _pieces: Deque[Future]
+    _serial: Optional[_Decoder]
+
+    def __init__(self, workers: int, piece_size: int = BZ2_PIECE_SIZE):
+        # spawned, as the decoder may run on a thread next to an event loop
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._max_in_flight = workers * 2
+        self._piece_size = piece_size
+        self._buffer = bytearray()
+        self._search_from = 0
+        self._pieces = deque()
+        self._serial = None
+
+    def _next_piece_end(self) -> Optional[int]:
+        """finds the first stream start after `piece_size` bytes of the buffer"""
+        start = max(self._search_from, self._piece_size)
+        match = _BZ2_STREAM_START.search(self._buffer, start)
+        if match is None:
+            # a header split across reads is found again on the next search
+            self._search_from = max(
+                start, len(self._buffer) - _BZ2_STREAM_START_LENGTH + 1
+            )
+            return None
+        return match.start()
+
+    def _collect(self, wait: bool) -> bytes:
+        output = []
+        while self._pieces and (wait or self._pieces[0].done()):
+            output.append(self._pieces.popleft().result())
+        return b"".join(output)
+
+    def _submit(self, piece: bytes) -> bytes:
+        output = b""
+        if len(self._pieces) >= self._max_in_flight:
+            output = self._pieces.popleft().result()
+        self._pieces.append(self._pool.submit(_decompress_bz2_piece, piece))
+        return output
+
+    def decode(self, data: bytes) -> bytes:
+        if self._serial is not None:
+            return self._serial.decode(data)
+
+        self._buffer += data
+        output = []
+        while len(self._buffer) >= self._piece_size:
+            end = self._next_piece_end()
+            if end is None:
+                break
+            output.append(self._submit(bytes(self._buffer[:end])))
+            del self._buffer[:end]
+            self._search_from = 0
+
+        if len(self._buffer) >= self._piece_size * SERIAL_FALLBACK_PIECES:
+            # the buffer always starts at a stream start, so it can be handed
+            # to a serial decoder once the pieces before it are written.
+            output.append(self._collect(wait=True))
+            self._serial = _Decoder("bz2")
+            output.append(self._serial.decode(bytes(self._buffer)))
+            self._buffer.clear()
+        else:
+            output.append(self._collect(wait=False))
+        return b"".join(output)
+
+    def finish(self) -> bytes:
+        try:
+            if self._serial is not None:
+                return self._serial.finish()
+            output = []
+            if self._buffer:
+                output.append(self._submit(bytes(self._buffer)))
+                self._buffer.clear()
+            output.append(self._collect(wait=True))
+            return b"".join(output)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _new_decoder(header: bytes, workers: int) -> Any:
+    codec = detect_codec(header)
+    if codec == "bz2" and workers > 1:
+        return _ParallelBz2Decoder(workers=workers)
+    return _Decoder(codec)
+
+
+def decompress_file(
+    input_file_path: str,
+    output_file_path: str,
+    workers: int = 1,
+    read_buffer_size: int = READ_BUFFER_SIZE,
+    desc: Optional[str] = None,
+) -> None:
+    """
+    decompresses a bz2, gzip or zstd file with large reads and writes. This
+    blocks, so run it in a thread from async code.
+    """
+    with open(input_file_path, "rb") as input_file, open(
+        output_file_path, "wb", buffering=WRITE_BUFFER_SIZE
+    ) as output_file, tqdm(
+        total=os.path.getsize(input_file_path), unit="B", unit_scale=True, desc=desc
+    ) as progress:
+        decoder = _new_decoder(input_file.peek(4)[:4], workers=workers)
+        try:
+            while True:
+                data = input_file.read(read_buffer_size)
+                if not data:
+                    break
+                output_file.write(decoder.decode(data))
+                progress.update(len(data))
+            output_file.write(decoder.finish())
+        finally:
+            if isinstance(decoder, _ParallelBz2Decoder):
+                decoder.close()
+
+
+class StreamingDecompressor:
+    """
+    decompresses data as it is downloaded, detecting the codec from the first
+    bytes. Compressed chunks are handed to a background thread that decodes
+    and writes them, so the CPU-bound work stays off the event loop. At most
+    `max_pending` chunks are queued before `feed` waits, which applies
+    backpressure to the download.
+    """
+
+    _queue: "Queue[Optional[bytes]]"
+    _pending: asyncio.Semaphore
+    _done: asyncio.Future
+    _thread: threading.Thread
+
+    def __init__(self, output_file_path: str, workers: int = 1, max_pending: int = 8):
+        self.output_file_path = output_file_path
+        self._workers = workers
+        self._loop = asyncio.get_running_loop()
+        self._queue = Queue()
+        self._pending = asyncio.Semaphore(max_pending)
+        self._done = self._loop.create_future()
+        self._aborted = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        error: Optional[BaseException] = None
+        decoder = None
+        header = b""
+        try:
+            with open(
+                self.output_file_path, "wb", buffering=WRITE_BUFFER_SIZE
+            ) as output_file:
+                while True:
+                    data = self._queue.get()
+                    if data is None:
+                        break
+                    if error is None and not self._aborted:
+                        try:
+                            if decoder is None:
+                                # wait for enough bytes to detect the codec
+                                header += data
+                                if len(header) < 4:
+                                    data = b""
+                                else:
+                                    decoder = _new_decoder(header, self._workers)
+                                    data = header
+                            if data:
+                                output_file.write(decoder.decode(data))
+                        except BaseException as e:
+                            # fail the download now, then drain what's queued
+                            error = e
+                            self._loop.call_soon_threadsafe(self._set_done, error)
+                    self._loop.call_soon_threadsafe(self._pending.release)
+                if error is None and not self._aborted:
+                    if decoder is None:
+                        decoder = _new_decoder(header, self._workers)
+                    output_file.write(decoder.finish())
+        except BaseException as e:
+            error = error or e
+        finally:
+            if isinstance(decoder, _ParallelBz2Decoder):
+                decoder.close()
+        self._loop.call_soon_threadsafe(self._set_done, error)
+
+    def _set_done(self, error: Optional[BaseException]) -> None:
+        if self._done.done():
+            return
+        if error is not None:
+            self._done.set_exception(error)
+        else:
+            self._done.set_result(None)
+
+    async def feed(self, data: bytes) -> None:
+        if self._done.done():
+            # the decoder failed, so surface its error to the downloader
+            self._done.result()
+        await self._pending.acquire()
+        self._queue.put(data)
+
+    async def finish(self) -> None:
+        """waits for all fed data to be written"""
+        self._queue.put(None)
+        await self._done
+
+    async def abort(self) -> None:
+        """stops decoding and removes the partial output"""
+        self._aborted = True
+        self._queue.put(None)
+        try:
+            await self._done
+        except BaseException:
+            pass
+        if os.path.exists(self.output_file_path):
+            os.remove(self.output_file_path)
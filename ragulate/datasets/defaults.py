@@ -0,0 +1,6 @@
+import os
+
+# kept apart from the downloads, so the CLI can show them without importing aiohttp
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_SEGMENTS = 4
+DEFAULT_DECOMPRESSION_WORKERS = os.cpu_count() or 1
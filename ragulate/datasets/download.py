@@ -0,0 +1,312 @@
+import asyncio
+import json
+import math
+import os
+from os import path
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import aiofiles
+import aiohttp
+from tqdm.asyncio import tqdm
+
+from .decompression import StreamingDecompressor
+from .defaults import DEFAULT_CHUNK_SIZE, DEFAULT_SEGMENTS
+
+MIN_SEGMENT_SIZE = 16 * 1024 * 1024
+
+# how many bytes a segment downloads between saves of the sidecar state
+STATE_SAVE_INTERVAL = 8 * 1024 * 1024
+
+
+def _state_path(part_path: str) -> str:
+    return f"{part_path}.json"
+
+
+def _save_state(part_path: str, state: Dict[str, Any]) -> None:
+    temp_path = f"{_state_path(part_path)}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_path, _state_path(part_path))
+
+
+def _load_state(
+    part_path: str, url: str, size: int, validator: Optional[str]
+) -> Optional[Dict[str, Any]]:
+    """loads the state of an interrupted download, if it is for the same file"""
+    if not path.exists(part_path) or not path.exists(_state_path(part_path)):
+        return None
+    try:
+        with open(_state_path(part_path)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (state.get("url"), state.get("size"), state.get("validator")) != (
+        url,
+        size,
+        validator,
+    ):
+        return None
+    return state
+
+
+def _new_state(
+    url: str, size: int, validator: Optional[str], segments: int, min_segment_size: int
+) -> Dict[str, Any]:
+    segments = max(1, min(segments, math.ceil(size / min_segment_size)))
+    segment_size = math.ceil(size / segments)
+    return {
+        "url": url,
+        "size": size,
+        "validator": validator,
+        "segments": [
+            {"start": start, "end": min(start + segment_size, size) - 1, "done": 0}
+            for start in range(0, size, segment_size)
+        ],
+    }
+
+
+def _remaining(segment: Dict[str, Any]) -> int:
+    return segment["end"] + 1 - segment["start"] - segment["done"]
+
+
+async def _iter_buffered(
+    response: aiohttp.ClientResponse, chunk_size: int
+) -> AsyncIterator[bytes]:
+    """
+    collects network reads into chunks of at least `chunk_size` bytes, so that
+    writes (which aiofiles hands to a thread pool) aren't made per packet.
+    """
+    buffer = bytearray()
+    async for data in response.content.iter_any():
+        buffer += data
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def _probe(
+    session: aiohttp.ClientSession, url: str
+) -> Tuple[Optional[int], bool, Optional[str]]:
+    """gets the size, range support and ETag (or Last-Modified) of a url"""
+    async with session.head(url, allow_redirects=True) as response:
+        response.raise_for_status()
+        content_length = response.headers.get("Content-Length")
+        size = int(content_length) if content_length is not None else None
+        accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        validator = response.headers.get("ETag") or response.headers.get(
+            "Last-Modified"
+        )
+    return size, accepts_ranges, validator
+
+
+async def _download_segment(
+    session: aiohttp.ClientSession,
+    url: str,
+    part_path: str,
+    state: Dict[str, Any],
+    segment: Dict[str, Any],
+    chunk_size: int,
+    progress: tqdm,
+) -> None:
+    start = segment["start"] + segment["done"]
+    headers = {"Range": f"bytes={start}-{segment['end']}"}
+    async with session.get(url, headers=headers) as response:
+        response.raise_for_status()
+        if response.status != 206:
+            raise ValueError(f"Server ignored the range request for {url}")
+        async with aiofiles.open(part_path, "r+b") as f:
+            await f.seek(start)
+            unsaved = 0
+            async for chunk in _iter_buffered(response, chunk_size):
+                chunk = chunk[: _remaining(segment)]
+                await f.write(chunk)
+                segment["done"] += len(chunk)
+                unsaved += len(chunk)
+                progress.update(len(chunk))
+                if unsaved >= STATE_SAVE_INTERVAL:
+                    # only record bytes once they've been handed to the OS
+                    await f.flush()
+                    _save_state(part_path, state)
+                    unsaved = 0
+
+
+async def _download_ranges(
+    session: aiohttp.ClientSession,
+    url: str,
+    part_path: str,
+    size: int,
+    validator: Optional[str],
+    chunk_size: int,
+    segments: int,
+    min_segment_size: int,
+    desc: str,
+) -> None:
+    """downloads in parallel range requests, resuming from the sidecar state"""
+    state = _load_state(part_path, url=url, size=size, validator=validator)
+    if state is None:
+        state = _new_state(
+            url=url,
+            size=size,
+            validator=validator,
+            segments=segments,
+            min_segment_size=min_segment_size,
+        )
+        with open(part_path, "wb") as f:
+            f.truncate(size)
+        _save_state(part_path, state)
+
+    remaining = sum(_remaining(s) for s in state["segments"])
+    with tqdm(
+        total=size, initial=size - remaining, unit="B", unit_scale=True, desc=desc
+    ) as progress:
+        tasks = [
+            asyncio.create_task(
+                _download_segment(
+                    session=session,
+                    url=url,
+                    part_path=part_path,
+                    state=state,
+                    segment=segment,
+                    chunk_size=chunk_size,
+                    progress=progress,
+                )
+            )
+            for segment in state["segments"]
+            if _remaining(segment) > 0
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            _save_state(part_path, state)
+
+    if any(_remaining(s) != 0 for s in state["segments"]):
+        raise ValueError(f"Download of {url} is incomplete")
+
+
+async def _download_stream(
+    session: aiohttp.ClientSession,
+    url: str,
+    part_path: str,
+    size: Optional[int],
+    chunk_size: int,
+    desc: str,
+) -> None:
+    """downloads in a single request, for servers without range support"""
+    async with session.get(url) as response:
+        response.raise_for_status()
+        with tqdm(total=size, unit="B", unit_scale=True, desc=desc) as progress:
+            async with aiofiles.open(part_path, "wb") as f:
+                async for chunk in _iter_buffered(response, chunk_size):
+                    await f.write(chunk)
+                    progress.update(len(chunk))
+
+
+async def download_file(
+    session: aiohttp.ClientSession,
+    url: str,
+    output_file_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    segments: int = DEFAULT_SEGMENTS,
+    min_segment_size: int = MIN_SEGMENT_SIZE,
+) -> None:
+    """
+    downloads a url to a `.part` file next to `output_file_path`, then moves
+    it into place once its size is verified. If the server supports range
+    requests, large files are fetched in parallel segments and an interrupted
+    download resumes from a sidecar file that tracks each segment's progress.
+    """
+    if chunk_size < 1 or segments < 1:
+        raise ValueError("Download chunk size and segments must be at least 1")
+
+    part_path = f"{output_file_path}.part"
+    desc = f'Downloading {url.split("/")[-1]}'
+
+    size, accepts_ranges, validator = await _probe(session, url)
+    if size is not None and size > 0 and accepts_ranges:
+        await _download_ranges(
+            session=session,
+            url=url,
+            part_path=part_path,
+            size=size,
+            validator=validator,
+            chunk_size=chunk_size,
+            segments=segments,
+            min_segment_size=min_segment_size,
+            desc=desc,
+        )
+    else:
+        await _download_stream(
+            session=session,
+            url=url,
+            part_path=part_path,
+            size=size,
+            chunk_size=chunk_size,
+            desc=desc,
+        )
+
+    downloaded_size = path.getsize(part_path)
+    if size is not None and downloaded_size != size:
+        os.remove(part_path)
+        raise ValueError(
+            f"Downloaded {downloaded_size} bytes from {url}, expected {size}"
+        )
+
+    os.replace(part_path, output_file_path)
+    if path.exists(_state_path(part_path)):
+        os.remove(_state_path(part_path))
+
+
+def has_partial_download(output_file_path: str) -> bool:
+    """checks if an interrupted resumable download of the file can be continued"""
+    return path.exists(_state_path(f"{output_file_path}.part"))
+
+
+async def download_and_decompress(
+    session: aiohttp.ClientSession,
+    url: str,
+    output_file_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+) -> None:
+    """
+    streams a bz2, gzip or zstd url straight into its decompressed output,
+    decoding on a background thread (and `workers` processes for multi-stream
+    bz2) as the bytes arrive. Nothing compressed is written to disk, so an
+    interrupted download starts over.
+    """
+    if chunk_size < 1:
+        raise ValueError("Download chunk size must be at least 1")
+
+    part_path = f"{output_file_path}.part"
+    decompressor = StreamingDecompressor(part_path, workers=workers)
+    try:
+        async with session.get(url) as response:
+            response.raise_for_status()
+            content_length = response.headers.get("Content-Length")
+            size = int(content_length) if content_length is not None else None
+            downloaded_size = 0
+            with tqdm(
+                total=size,
+                unit="B",
+                unit_scale=True,
+                desc=f'Downloading {url.split("/")[-1]}',
+            ) as progress:
+                async for chunk in _iter_buffered(response, chunk_size):
+                    await decompressor.feed(chunk)
+                    downloaded_size += len(chunk)
+                    progress.update(len(chunk))
+        if size is not None and downloaded_size != size:
+            raise ValueError(
+                f"Downloaded {downloaded_size} bytes from {url}, expected {size}"
+            )
+        await decompressor.finish()
+    except BaseException:
+        await decompressor.abort()
+        raise
+
+    os.replace(part_path, output_file_path)
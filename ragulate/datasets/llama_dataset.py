@@ -3,11 +3,6 @@ from os import path
 from typing import Dict, List, Optional, Tuple
 
 import inflection
-from llama_index.core.llama_dataset import download
-from llama_index.core.llama_dataset.download import (
-    LLAMA_DATASETS_LFS_URL,
-    LLAMA_DATASETS_SOURCE_FILES_GITHUB_TREE_URL,
-)
 
 from ..logging_config import logger
 from .base_dataset import BaseDataset
@@ -15,17 +10,16 @@ from .base_dataset import BaseDataset
 
 class LlamaDataset(BaseDataset):
 
-    _llama_datasets_lfs_url: str
-    _llama_datasets_source_files_tree_url: str
+    # default to the llama_index urls when None
+    _llama_datasets_lfs_url: Optional[str]
+    _llama_datasets_source_files_tree_url: Optional[str]
 
     def __init__(
         self, dataset_name: str, root_storage_path: Optional[str] = "datasets"
     ):
         super().__init__(dataset_name=dataset_name, root_storage_path=root_storage_path)
-        self._llama_datasets_lfs_url: str = LLAMA_DATASETS_LFS_URL
-        self._llama_datasets_source_files_tree_url: str = (
-            LLAMA_DATASETS_SOURCE_FILES_GITHUB_TREE_URL
-        )
+        self._llama_datasets_lfs_url = None
+        self._llama_datasets_source_files_tree_url = None
 
     def sub_storage_path(self) -> str:
         return "llama"
@@ -37,14 +31,22 @@ class LlamaDataset(BaseDataset):
 
     def download_dataset(self) -> None:
         """downloads a dataset locally"""
+        # llama_index is slow to import, and only needed for downloads
+        from llama_index.core.llama_dataset import download
+
         download_dir = self._get_dataset_path()
+        lfs_url = self._llama_datasets_lfs_url or download.LLAMA_DATASETS_LFS_URL
+        source_files_tree_url = (
+            self._llama_datasets_source_files_tree_url
+            or download.LLAMA_DATASETS_SOURCE_FILES_GITHUB_TREE_URL
+        )
 
         def download_by_name(name):
             download.download_llama_dataset(
                 llama_dataset_class=name,
                 download_dir=download_dir,
-                llama_datasets_lfs_url=self._llama_datasets_lfs_url,
-                llama_datasets_source_files_tree_url=self._llama_datasets_source_files_tree_url,
+                llama_datasets_lfs_url=lfs_url,
+                llama_datasets_source_files_tree_url=source_files_tree_url,
                 show_progress=True,
                 load_documents=False,
             )
@@ -69,10 +71,18 @@ class LlamaDataset(BaseDataset):
         source_path = path.join(self._get_dataset_path(), "source_files")
         return self.list_files_at_path(path=source_path)
 
-    def get_queries_and_golden_set(self) -> Tuple[List[str], List[Dict[str, str]]]:
-        """gets a list of queries and golden_truth answers for a dataset"""
-        json_path = path.join(self._get_dataset_path(), "rag_dataset.json")
-        with open(json_path, "r") as f:
+    def _rag_dataset_path(self) -> str:
+        return path.join(self._get_dataset_path(), "rag_dataset.json")
+
+    def _query_source_paths(self) -> List[str]:
+        return [self._rag_dataset_path()]
+
+    def _query_cache_dir(self) -> str:
+        return path.join(self._get_dataset_path(), ".cache")
+
+    def _read_queries_and_golden_set(self) -> Tuple[List[str], List[Dict[str, str]]]:
+        """parses the queries and golden_truth answers from rag_dataset.json"""
+        with open(self._rag_dataset_path(), "r") as f:
             examples = json.load(f)["examples"]
             queries = [e["query"] for e in examples]
             golden_set = [
@@ -0,0 +1,98 @@
+import json
+import os
+from os import makedirs, path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow as pa
+    from pyarrow import ipc
+except ImportError:
+    pa = None
+
+# bump when the layout of the cached table changes
+_CACHE_VERSION = 1
+
+
+def arrow_available() -> bool:
+    """checks if pyarrow is installed, which the query cache requires"""
+    return pa is not None
+
+
+class QueryCache:
+    """
+    an Arrow IPC file holding the queries and golden set answers of a dataset
+    (and subset selection). It's written on the first load and memory-mapped
+    after that, so later processes skip parsing the dataset's JSON. The cache
+    is rebuilt when any of its source files change.
+    """
+
+    def __init__(self, cache_path: str, source_paths: List[str]):
+        self.cache_path = cache_path
+        self.source_paths = source_paths
+
+    def _fingerprint(self) -> bytes:
+        sources = []
+        for source_path in self.source_paths:
+            stat = os.stat(source_path)
+            sources.append([path.basename(source_path), stat.st_size, stat.st_mtime_ns])
+        return json.dumps({"version": _CACHE_VERSION, "sources": sources}).encode()
+
+    def load(self) -> Optional[Any]:
+        """returns the memory-mapped table, or None if it is missing or stale"""
+        if pa is None or not path.exists(self.cache_path):
+            return None
+        try:
+            with pa.memory_map(self.cache_path) as source:
+                table = ipc.open_file(source).read_all()
+        except (OSError, pa.ArrowInvalid):
+            return None
+        metadata = table.schema.metadata or {}
+        if metadata.get(b"source") != self._fingerprint():
+            return None
+        return table
+
+    def write(
+        self, queries: List[str], golden_set: List[Dict[str, str]]
+    ) -> Optional[Any]:
+        """
+        writes the queries and their answers to the cache. Returns None, and
+        writes nothing, if the golden set isn't aligned with the queries or
+        the answers can't be stored in a single column.
+        """
+        if pa is None or len(queries) != len(golden_set):
+            return None
+        if any(q != g["query"] for q, g in zip(queries, golden_set)):
+            return None
+        try:
+            table = pa.table(
+                {
+                    "query": pa.array(queries, type=pa.string()),
+                    "response": [g["response"] for g in golden_set],
+                }
+            )
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return None
+        table = table.replace_schema_metadata({"source": self._fingerprint()})
+
+        makedirs(path.dirname(self.cache_path), exist_ok=True)
+        temp_path = f"{self.cache_path}.tmp"
+        with pa.OSFile(temp_path, "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temp_path, self.cache_path)
+        return table
+
+
+def table_to_queries_and_golden_set(
+    table: Any, indices: Optional[Sequence[int]] = None
+) -> Tuple[List[str], List[Dict[str, str]]]:
+    """converts (the rows at `indices` of) a cached table to queries and a golden set"""
+    if indices is not None:
+        table = table.take(pa.array(indices, type=pa.int64()))
+    queries = table.column("query").to_pylist()
+    responses = table.column("response").to_pylist()
+    golden_set = [
+        {"query": query, "response": response}
+        for query, response in zip(queries, responses)
+    ]
+    return queries, golden_set
@@ -1,9 +1,33 @@
-from .base_pipeline import BasePipeline
-from .ingest_pipeline import IngestPipeline
-from .query_pipeline import QueryPipeline
+from typing import TYPE_CHECKING
+
+from ..utils import lazy_exports
+
+if TYPE_CHECKING:
+    from .base_pipeline import BasePipeline
+    from .execution_plan import ExecutionPlan, ExecutionStep
+    from .ingest_pipeline import IngestPipeline
+    from .query_pipeline import QueryPipeline
+    from .scheduler import Scheduler, Task
 
 __all__ = [
     "BasePipeline",
+    "ExecutionPlan",
+    "ExecutionStep",
     "IngestPipeline",
     "QueryPipeline",
+    "Scheduler",
+    "Task",
 ]
+
+__getattr__ = lazy_exports(
+    __name__,
+    {
+        "BasePipeline": ".base_pipeline",
+        "ExecutionPlan": ".execution_plan",
+        "ExecutionStep": ".execution_plan",
+        "IngestPipeline": ".ingest_pipeline",
+        "QueryPipeline": ".query_pipeline",
+        "Scheduler": ".scheduler",
+        "Task": ".scheduler",
+    },
+)
@@ -1,20 +1,37 @@
 import importlib.util
 import inspect
+import os
+import threading
 import traceback
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Tuple
 
 from ragulate.datasets import BaseDataset
 
 from ..logging_config import logger
 
+# scripts loaded so far, by path and modification time
+_module_cache: Dict[Tuple[str, int], ModuleType] = {}
+_module_cache_lock = threading.Lock()
+
 
 # Function to dynamically load a module
 def load_module(file_path, name):
-    spec = importlib.util.spec_from_file_location(name, file_path)
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-    return module
+    """
+    loads a script as a module. Each script is executed only once per process,
+    unless the file changes, so pipelines using the same script share it.
+    """
+    file_path = os.path.realpath(file_path)
+    key = (file_path, os.stat(file_path).st_mtime_ns)
+    with _module_cache_lock:
+        module = _module_cache.get(key)
+        if module is None:
+            spec = importlib.util.spec_from_file_location(name, file_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _module_cache[key] = module
+        return module
 
 
 def get_method(script_path: str, pipeline_type: str, method_name: str):
@@ -23,20 +40,44 @@ def get_method(script_path: str, pipeline_type: str, method_name: str):
 
 
 def get_method_params(method: Any) -> List[str]:
+    """gets the named params of a method, ignoring `*args` and `**kwargs` style params"""
     signature = inspect.signature(method)
-    return signature.parameters.keys()
+    return [
+        name
+        for name, param in signature.parameters.items()
+        if param.kind
+        not in [inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD]
+    ]
+
+
+def get_optional_method_params(method: Any) -> List[str]:
+    """gets the params of a method that have a default value"""
+    signature = inspect.signature(method)
+    return [
+        name
+        for name, param in signature.parameters.items()
+        if param.default is not inspect.Parameter.empty
+    ]
 
 
 def get_ingredients(
     method_params: List[str],
     reserved_params: List[str],
     passed_ingredients: Dict[str, Any],
+    optional_params: Optional[List[str]] = None,
 ) -> Dict[str, Any]:
+    """
+    gets the subset of the passed ingredients that the method actually consumes.
+    Optional params that weren't passed are left to their default value.
+    """
+    optional_params = optional_params or []
     ingredients = {}
     for method_param in method_params:
-        if method_param in reserved_params or method_param in ["kwargs"]:
+        if method_param in reserved_params:
             continue
         if method_param not in passed_ingredients:
+            if method_param in optional_params:
+                continue
             raise ValueError(
                 f"method param '{method_param}' doesn't exist in the ingredients"
             )
@@ -92,6 +133,7 @@ class BasePipeline(ABC):
                 method_params=self._method_params,
                 reserved_params=self.get_reserved_params,
                 passed_ingredients=self._passed_ingredients,
+                optional_params=get_optional_method_params(method=self._method),
             )
         except BaseException as e:
             logger.fatal(
@@ -103,6 +145,21 @@ class BasePipeline(ABC):
     def get_method(self):
         return self._method
 
+    def __getstate__(self) -> Dict[str, Any]:
+        # the method of a dynamically loaded script can't be pickled, so
+        # it's loaded again when a pipeline is sent to another process
+        state = self.__dict__.copy()
+        state.pop("_method", None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._method = get_method(
+            script_path=self.script_path,
+            pipeline_type=self.PIPELINE_TYPE,
+            method_name=self.method_name,
+        )
+
     def dataset_names(self) -> List[str]:
         return [d.name for d in self.datasets]
 
@@ -112,7 +169,7 @@ class BasePipeline(ABC):
             self.script_path,
             self.method_name,
         ]
-        for name, value in self.ingredients.items():
+        for name, value in sorted(self.ingredients.items()):
             key_parts.append(f"{name}_{value}")
         return "_".join(key_parts)
 
@@ -0,0 +1,133 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set
+
+from trulens_eval import Tru
+from trulens_eval.app import App
+from trulens_eval.feedback import Feedback
+from trulens_eval.schema.feedback import FeedbackResult, FeedbackResultStatus
+from trulens_eval.schema.record import Record
+from trulens_eval.utils.json import jsonify
+
+from ..logging_config import logger
+from .progress_tracker import ProgressTracker
+
+
+class BatchEvaluator:
+    """
+    evaluates feedback functions for finished records on a bounded thread pool
+    and writes the results straight to the database, instead of queueing them
+    for the TruLens deferred evaluator.
+    """
+
+    _tru: Tru
+    _pool: ThreadPoolExecutor
+    _app_json: Dict[int, Dict]
+    _futures: Set[Future]
+    _tracker: ProgressTracker
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        tru: Tru,
+        parallelism: int,
+        tracker: Optional[ProgressTracker] = None,
+    ):
+        if parallelism < 1:
+            raise ValueError("Evaluation parallelism must be at least 1")
+
+        self._tru = tru
+        self._pool = ThreadPoolExecutor(max_workers=parallelism)
+        self._app_json = {}
+        self._futures = set()
+        self._tracker = tracker if tracker is not None else ProgressTracker()
+        self._lock = threading.Lock()
+
+    def add_app(self, app: App) -> None:
+        """registers a recorder whose records will be evaluated"""
+        # the app was created with FeedbackMode.NONE, so its feedback
+        # definitions still need to be stored for the results to reference.
+        for feedback in app.feedbacks:
+            self._tru.db.insert_feedback_definition(feedback)
+        self._app_json[id(app)] = jsonify(app)
+
+    def submit(
+        self,
+        app: App,
+        record: Record,
+        on_evaluated: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        queues every feedback function of the app on the record. `on_evaluated`
+        is called once all of them have run and their results are stored. It
+        isn't called if any were cancelled, failed or couldn't be stored.
+        """
+        app_json = self._app_json[id(app)]
+        futures: List[Future] = []
+        for feedback in app.feedbacks:
+            self._tracker.feedbacks_queued(1)
+            future = self._pool.submit(self._evaluate, feedback, app_json, record)
+            with self._lock:
+                self._futures.add(future)
+            future.add_done_callback(self._on_done)
+            futures.append(future)
+
+        if on_evaluated is None:
+            return
+        if len(futures) == 0:
+            on_evaluated()
+            return
+
+        remaining = [len(futures)]
+
+        def on_feedback_done(future: Future) -> None:
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            # feedback functions catch the errors of their implementations, and
+            # return a failed result instead
+            if any(
+                f.cancelled()
+                or f.exception() is not None
+                or f.result().status == FeedbackResultStatus.FAILED
+                for f in futures
+            ):
+                return
+            try:
+                on_evaluated()
+            except Exception as e:
+                logger.error(f"issue recording evaluated record: {e}")
+
+        for future in futures:
+            future.add_done_callback(on_feedback_done)
+
+    def _evaluate(
+        self, feedback: Feedback, app_json: Dict, record: Record
+    ) -> FeedbackResult:
+        self._tracker.feedback_started()
+        status = FeedbackResultStatus.FAILED
+        try:
+            result = feedback.run(app=app_json, record=record)
+            self._tru.add_feedback(result)
+            status = result.status
+            return result
+        finally:
+            self._tracker.feedback_finished(status)
+
+    def _on_done(self, future: Future) -> None:
+        with self._lock:
+            self._futures.discard(future)
+        if future.cancelled():
+            self._tracker.feedback_cancelled()
+
+    def get_feedback_count_by_status(self) -> Dict[FeedbackResultStatus, int]:
+        """same shape as `tru.db.get_feedback_count_by_status()`"""
+        return self._tracker.get_feedback_count_by_status()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._futures)
+
+    def shutdown(self, cancel: bool = False) -> None:
+        self._pool.shutdown(wait=not cancel, cancel_futures=cancel)
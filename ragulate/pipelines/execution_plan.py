@@ -0,0 +1,115 @@
+from typing import Dict, List, Optional, Set
+
+from ..logging_config import logger
+from .ingest_pipeline import IngestPipeline
+from .query_pipeline import QueryPipeline
+from .scheduler import Scheduler, Task
+
+
+class ExecutionStep:
+    """a distinct ingest, followed by every query that depends on its store"""
+
+    ingest_pipeline: Optional[IngestPipeline]
+    query_pipelines: List[QueryPipeline]
+
+    def __init__(self, ingest_pipeline: Optional[IngestPipeline]):
+        self.ingest_pipeline = ingest_pipeline
+        self.query_pipelines = []
+
+    def execute(self) -> None:
+        if self.ingest_pipeline is not None:
+            self.ingest_pipeline.ingest()
+
+        for query_pipeline in self.query_pipelines:
+            query_pipeline.query()
+
+
+class ExecutionPlan:
+    """
+    groups recipes by their ingest pipeline, so that each distinct store is
+    ingested once and then fans out to all of the query pipelines built on it.
+    Ingest pipelines are compared by `_key()`, which only contains the
+    ingredients that the ingest method consumes.
+    """
+
+    steps: List[ExecutionStep]
+
+    def __init__(self):
+        self.steps = []
+        self._steps_by_ingest_key: Dict[Optional[str], ExecutionStep] = {}
+        self._query_keys: Set[str] = set()
+
+    def add_recipe(
+        self,
+        ingest_pipeline: Optional[IngestPipeline],
+        query_pipeline: Optional[QueryPipeline],
+    ) -> None:
+        ingest_key = None if ingest_pipeline is None else ingest_pipeline._key()
+
+        step = self._steps_by_ingest_key.get(ingest_key)
+        if step is None:
+            step = ExecutionStep(ingest_pipeline=ingest_pipeline)
+            self._steps_by_ingest_key[ingest_key] = step
+            self.steps.append(step)
+
+        if query_pipeline is not None:
+            if query_pipeline._key() in self._query_keys:
+                logger.debug(f"Skipping duplicate query {query_pipeline._key()}")
+            else:
+                self._query_keys.add(query_pipeline._key())
+                step.query_pipelines.append(query_pipeline)
+
+    def log_plan(self) -> None:
+        logger.debug("Execution plan:")
+        for step in self.steps:
+            if step.ingest_pipeline is None:
+                logger.debug("\tno ingest")
+            else:
+                logger.debug(f"\tingest {step.ingest_pipeline._key()}")
+            for query_pipeline in step.query_pipelines:
+                logger.debug(f"\t\tquery {query_pipeline._key()}")
+
+    def execute(self) -> None:
+        for step in self.steps:
+            step.execute()
+
+    def query_pipelines(self) -> List[QueryPipeline]:
+        return [q for step in self.steps for q in step.query_pipelines]
+
+    def add_tasks(
+        self,
+        scheduler: Scheduler,
+        dependencies: Optional[List[Task]] = None,
+        queries: bool = True,
+    ) -> List[Task]:
+        """
+        adds a task for each ingest, and unless `queries` is False, one for each
+        query that depends on the ingest of its store, so recipes on different
+        stores can run concurrently. Returns the query tasks.
+        """
+        query_tasks = []
+        for step in self.steps:
+            step_dependencies = list(dependencies or [])
+            if step.ingest_pipeline is not None:
+                ingest_pipeline = step.ingest_pipeline
+                step_dependencies = [
+                    scheduler.add_task(
+                        name=f"ingest {ingest_pipeline.recipe_name}",
+                        kind="ingest",
+                        func=ingest_pipeline.ingest,
+                        dependencies=step_dependencies,
+                    )
+                ]
+            if not queries:
+                continue
+            for query_pipeline in step.query_pipelines:
+                # evaluation finishes within the query task, in the same process
+                query_tasks.append(
+                    scheduler.add_task(
+                        name=f"query {query_pipeline.recipe_name}",
+                        kind="query",
+                        func=query_pipeline.query,
+                        dependencies=step_dependencies,
+                    )
+                )
+        return query_tasks
@@ -1,25 +1,54 @@
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 
 import numpy as np
 from trulens_eval import Feedback
 from trulens_eval.app import App
-from trulens_eval.feedback import GroundTruthAgreement
 from trulens_eval.feedback.provider.base import LLMProvider
 from trulens_eval.utils.serial import Lens
 
+from .golden_set import GoldenSetIndex, IndexedGroundTruthAgreement
+from .judge_cache import JudgeCache
+
 
 class Feedbacks:
     _context: Lens
     _llm_provider: LLMProvider
+    _cache: Optional[JudgeCache]
 
-    def __init__(self, llm_provider: LLMProvider, pipeline: Any) -> None:
+    def __init__(
+        self,
+        llm_provider: LLMProvider,
+        pipeline: Any,
+        cache: Optional[JudgeCache] = None,
+    ) -> None:
         self._context = App.select_context(pipeline)
         self._llm_provider = llm_provider
+        self._cache = cache
+
+    def _cached(
+        self,
+        func: Callable,
+        name: str,
+        extra_key: Optional[Callable[..., Any]] = None,
+    ) -> Callable:
+        # cached implementations can't be re-loaded by the deferred evaluator,
+        # so the cache is only passed in for in-process evaluation.
+        if self._cache is None:
+            return func
+        return self._cache.wrap(
+            func,
+            provider=self._llm_provider,
+            feedback_name=name,
+            extra_key=extra_key,
+        )
 
     def groundedness(self) -> Feedback:
         return (
             Feedback(
-                self._llm_provider.groundedness_measure_with_cot_reasons,
+                self._cached(
+                    self._llm_provider.groundedness_measure_with_cot_reasons,
+                    name="groundedness",
+                ),
                 name="groundedness",
             )
             .on(self._context.collect())  # collect context chunks into a list
@@ -28,13 +57,20 @@ class Feedbacks:
 
     def answer_relevance(self) -> Feedback:
         return Feedback(
-            self._llm_provider.relevance_with_cot_reasons, name="answer_relevance"
+            self._cached(
+                self._llm_provider.relevance_with_cot_reasons,
+                name="answer_relevance",
+            ),
+            name="answer_relevance",
         ).on_input_output()
 
     def context_relevance(self) -> Feedback:
         return (
             Feedback(
-                self._llm_provider.qs_relevance_with_cot_reasons,
+                self._cached(
+                    self._llm_provider.qs_relevance_with_cot_reasons,
+                    name="context_relevance",
+                ),
                 name="context_relevance",
             )
             .on_input()
@@ -42,11 +78,35 @@ class Feedbacks:
             .aggregate(np.mean)
         )
 
-    def answer_correctness(self, golden_set: List[Dict[str, str]]) -> Feedback:
+    def answer_correctness(
+        self,
+        golden_set: List[Dict[str, str]],
+        index: Optional[GoldenSetIndex] = None,
+        namespace: str = "",
+    ) -> Feedback:
+        # a shared index may already hold the golden set under `namespace`
+        if index is None:
+            index = GoldenSetIndex()
+            index.add(golden_set, namespace=namespace)
+
         # GroundTruth for comparing the Answer to the Ground-Truth Answer
-        ground_truth_collection = GroundTruthAgreement(
-            ground_truth=golden_set, provider=self._llm_provider
+        ground_truth_collection = IndexedGroundTruthAgreement(
+            ground_truth=golden_set,
+            provider=self._llm_provider,
+            index=index,
+            namespace=namespace,
         )
+
+        # the expected answer is part of the cache key, so edits to the
+        # golden set don't return stale scores.
+        def expected_answer(prompt: str, response: str) -> Optional[str]:
+            return index.lookup(prompt, namespace=namespace)
+
         return Feedback(
-            ground_truth_collection.agreement_measure, name="answer_correctness"
+            self._cached(
+                ground_truth_collection.agreement_measure,
+                name="answer_correctness",
+                extra_key=expected_answer,
+            ),
+            name="answer_correctness",
         ).on_input_output()
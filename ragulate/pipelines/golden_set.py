@@ -0,0 +1,93 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+import pydantic
+from trulens_eval.feedback import GroundTruthAgreement
+from trulens_eval.feedback.provider.base import Provider
+
+_WORDS = re.compile(r"\w+")
+
+# marks a near-duplicate key shared by queries with different answers
+_AMBIGUOUS = object()
+
+
+def normalize_query(query: str) -> str:
+    """normalizes unicode, case and whitespace in query text"""
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+def _near_duplicate_key(query: str) -> str:
+    """keeps only the words of a normalized query, dropping punctuation"""
+    return " ".join(_WORDS.findall(query))
+
+
+class GoldenSetIndex:
+    """
+    hashed lookup of golden set answers, keyed by normalized query text. When
+    a query isn't found, a second key that ignores punctuation matches near
+    duplicates, unless that key is shared by queries with different answers.
+    Golden sets are added under a namespace (usually the dataset name), so
+    one index can be shared by every dataset in a run.
+    """
+
+    _answers: Dict[Tuple[str, str], str]
+    _near_duplicates: Dict[Tuple[str, str], object]
+
+    def __init__(self) -> None:
+        self._answers = {}
+        self._near_duplicates = {}
+
+    def add(self, golden_set: List[Dict[str, str]], namespace: str = "") -> None:
+        """adds a golden set. The first answer for a query wins."""
+        for item in golden_set:
+            key = normalize_query(item["query"])
+            response = item["response"]
+            self._answers.setdefault((namespace, key), response)
+
+            near_key = (namespace, _near_duplicate_key(key))
+            existing = self._near_duplicates.setdefault(near_key, response)
+            if existing is not _AMBIGUOUS and existing != response:
+                self._near_duplicates[near_key] = _AMBIGUOUS
+
+    def lookup(self, query: str, namespace: str = "") -> Optional[str]:
+        """finds the answer for a query, or None if it isn't in the golden set"""
+        key = normalize_query(query)
+        answer = self._answers.get((namespace, key))
+        if answer is not None:
+            return answer
+        answer = self._near_duplicates.get((namespace, _near_duplicate_key(key)))
+        return None if answer is _AMBIGUOUS else answer
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+
+class IndexedGroundTruthAgreement(GroundTruthAgreement):
+    """
+    GroundTruthAgreement that finds reference answers through a GoldenSetIndex
+    rather than a linear search of the golden set. The golden set is still
+    serialized with the feedback, so when the deferred evaluator re-creates
+    it, the index is rebuilt from that list on first use.
+    """
+
+    _index: Optional[GoldenSetIndex] = pydantic.PrivateAttr(None)
+    _namespace: str = pydantic.PrivateAttr("")
+
+    def __init__(
+        self,
+        ground_truth: List[Dict[str, str]],
+        provider: Optional[Provider] = None,
+        index: Optional[GoldenSetIndex] = None,
+        namespace: str = "",
+        **kwargs,
+    ):
+        super().__init__(ground_truth=ground_truth, provider=provider, **kwargs)
+        self._index = index
+        self._namespace = namespace
+
+    def _find_response(self, prompt: str) -> Optional[str]:
+        if self._index is None:
+            self._index = GoldenSetIndex()
+            self._index.add(self.ground_truth, namespace=self._namespace)
+        return self._index.lookup(prompt, namespace=self._namespace)
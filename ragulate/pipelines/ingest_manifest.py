@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+import time
+from os import path, stat
+from typing import List, Optional, Set
+
+from ..utils import file_sha256, get_state_path
+
+
+class IngestManifest:
+    """
+    persistent record of the source files that were successfully ingested,
+    keyed by the ingest pipeline key plus the file path and content hash.
+    Streamed source documents are recorded by their content hash alone.
+    """
+
+    _connection: sqlite3.Connection
+    _lock: threading.Lock
+
+    def __init__(self, db_path: Optional[str] = None):
+        if db_path is None:
+            db_path = get_state_path("ingest_manifest.sqlite")
+        self._lock = threading.Lock()
+        # recipes ingesting at once in other processes may hold the lock
+        self._connection = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingested_files (
+                    pipeline_key TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    ingested_at REAL NOT NULL,
+                    PRIMARY KEY (pipeline_key, file_path, content_hash)
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingested_documents (
+                    pipeline_key TEXT NOT NULL,
+                    document_hash TEXT NOT NULL,
+                    ingested_at REAL NOT NULL,
+                    PRIMARY KEY (pipeline_key, document_hash)
+                )
+                """
+            )
+            # avoids re-hashing files whose size and mtime haven't changed
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS file_hashes (
+                    file_path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL
+                )
+                """
+            )
+
+    def content_hash(self, file_path: str) -> str:
+        file_path = path.abspath(file_path)
+        file_stat = stat(file_path)
+        size_and_mtime = file_stat.st_size, file_stat.st_mtime_ns
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT size, mtime_ns, content_hash FROM file_hashes WHERE file_path = ?",
+                (file_path,),
+            ).fetchone()
+        if row is not None and (row[0], row[1]) == size_and_mtime:
+            return row[2]
+
+        content_hash = file_sha256(file_path)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                (file_path, *size_and_mtime, content_hash),
+            )
+        return content_hash
+
+    def is_ingested(self, pipeline_key: str, file_path: str) -> bool:
+        content_hash = self.content_hash(file_path)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM ingested_files WHERE pipeline_key = ? AND file_path = ? AND content_hash = ?",
+                (pipeline_key, str(file_path), content_hash),
+            ).fetchone()
+        return row is not None
+
+    def mark_ingested(self, pipeline_key: str, file_path: str) -> None:
+        content_hash = self.content_hash(file_path)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO ingested_files VALUES (?, ?, ?, ?)",
+                (pipeline_key, str(file_path), content_hash, time.time()),
+            )
+
+    def ingested_documents(self, pipeline_key: str) -> Set[str]:
+        """gets the hashes of all documents already ingested by the pipeline"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT document_hash FROM ingested_documents WHERE pipeline_key = ?",
+                (pipeline_key,),
+            )
+            return {row[0] for row in rows}
+
+    def mark_documents_ingested(
+        self, pipeline_key: str, document_hashes: List[str]
+    ) -> None:
+        ingested_at = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO ingested_documents VALUES (?, ?, ?)",
+                [(pipeline_key, h, ingested_at) for h in document_hashes],
+            )
+
+    def close(self) -> None:
+        self._connection.close()
@@ -1,10 +1,56 @@
 import asyncio
-from typing import List
+import hashlib
+import json
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from tqdm import tqdm
 
+from ragulate.datasets import BaseDataset
+
 from ..logging_config import logger
-from .base_pipeline import BasePipeline
+from ..utils import file_sha256
+from .base_pipeline import BasePipeline, get_method
+from .ingest_manifest import IngestManifest
+from .modes import EXECUTOR_KINDS
+
+
+@lru_cache(maxsize=None)
+def _get_worker_method(script_path: str, method_name: str) -> Callable:
+    """loads the ingest method once per worker process"""
+    return get_method(
+        script_path=script_path, pipeline_type="ingest", method_name=method_name
+    )
+
+
+def _ingest_in_worker(
+    script_path: str, method_name: str, ingredients: Dict[str, Any], **source: Any
+) -> None:
+    """runs a sync ingest method inside a process pool worker"""
+    ingest_method = _get_worker_method(script_path=script_path, method_name=method_name)
+    ingest_method(**source, **ingredients)
+
+
+def document_hash(document: Dict[str, Any]) -> str:
+    """hashes a source document's content, independent of key order"""
+    document_json = json.dumps(document, sort_keys=True, default=str)
+    return hashlib.blake2b(document_json.encode("utf-8"), digest_size=16).hexdigest()
+
+
+DocumentBatch = Tuple[List[Dict[str, Any]], List[str]]
+
+# the ingest method params that take batches of streamed source documents,
+# and the kind of documents each one gets
+DOCUMENT_PARAMS = {"documents": "parsed", "html_documents": "html"}
 
 
 class IngestPipeline(BasePipeline):
@@ -15,23 +61,349 @@ class IngestPipeline(BasePipeline):
 
     @property
     def get_reserved_params(self) -> List[str]:
-        return ["file_path"]
+        return ["file_path", *DOCUMENT_PARAMS]
+
+    def __init__(
+        self,
+        recipe_name: str,
+        script_path: str,
+        method_name: str,
+        ingredients: Dict[str, Any],
+        datasets: List[BaseDataset],
+        workers: Optional[int] = 1,
+        executor: Optional[str] = "thread",
+        force: Optional[bool] = False,
+        batch_size: Optional[int] = 100,
+        **kwargs,
+    ):
+        super().__init__(
+            recipe_name=recipe_name,
+            script_path=script_path,
+            method_name=method_name,
+            ingredients=ingredients,
+            datasets=datasets,
+        )
+
+        if workers < 1:
+            raise ValueError("Ingest workers must be at least 1")
+        if executor not in EXECUTOR_KINDS:
+            raise ValueError(
+                f"Unsupported ingest executor: {executor}. Choices are {EXECUTOR_KINDS}"
+            )
+        if batch_size < 1:
+            raise ValueError("Ingest batch size must be at least 1")
+
+        self.workers = workers
+        self.executor = executor
+        self.force = force
+        self.batch_size = batch_size
+        self.source_param = self._get_source_param()
+
+    def _get_source_param(self) -> str:
+        """
+        the param the ingest method takes its sources by, which every dataset
+        must be able to provide
+        """
+        document_params = [p for p in DOCUMENT_PARAMS if p in self._method_params]
+        if len(document_params) > 1:
+            raise ValueError(
+                f"Ingest method {self.method_name} can only take one of {list(DOCUMENT_PARAMS)}"
+            )
+
+        if len(document_params) == 0:
+            for dataset in self.datasets:
+                if len(dataset.source_document_kinds) > 0:
+                    raise ValueError(
+                        f"Dataset {dataset.name} streams its source documents instead of files, so ingest method {self.method_name} needs one of the params {list(DOCUMENT_PARAMS)} rather than `file_path`"
+                    )
+            return "file_path"
+
+        param = document_params[0]
+        for dataset in self.datasets:
+            if DOCUMENT_PARAMS[param] not in dataset.source_document_kinds:
+                raise ValueError(
+                    f"Dataset {dataset.name} doesn't stream {DOCUMENT_PARAMS[param]} source documents, so ingest method {self.method_name} needs a `file_path` param rather than `{param}`"
+                )
+        return param
+
+    def manifest_key(self) -> str:
+        """the pipeline key plus a hash of the script, so script edits re-ingest"""
+        return f"{self._key()}_{file_sha256(self.script_path)}"
 
     def ingest(self):
 
         logger.info(
-            f"Starting ingest {self.recipe_name} on {self.script_path}/{self.method_name} with ingredients: {self.ingredients}  on datasets: {self.dataset_names()}"
+            f"Starting ingest {self.recipe_name} on {self.script_path}/{self.method_name} with ingredients: {self.ingredients}  on datasets: {self.dataset_names()} using {self.workers} worker(s)"
         )
 
+        if self.source_param == "file_path":
+            self._ingest_files()
+        else:
+            self._ingest_documents()
+
+    def _ingest_files(self):
         source_files = []
         for dataset in self.datasets:
             source_files.extend(dataset.get_source_file_paths())
 
         source_files = list(set(source_files))
 
-        ingest_method = self.get_method()
-        for source_file in tqdm(source_files):
+        manifest = IngestManifest()
+        manifest_key = self.manifest_key()
+        if not self.force:
+            ingested_count = len(source_files)
+            source_files = [
+                f for f in source_files if not manifest.is_ingested(manifest_key, f)
+            ]
+            ingested_count -= len(source_files)
+            if ingested_count > 0:
+                logger.info(
+                    f"Skipping {ingested_count} unchanged source files that were already ingested. Use `--force` to re-ingest them."
+                )
+
+        def on_ingested(source_file: str) -> None:
+            manifest.mark_ingested(manifest_key, source_file)
+
+        try:
+            ingest_method = self.get_method()
             if asyncio.iscoroutinefunction(ingest_method):
-                asyncio.run(ingest_method(file_path=source_file, **self.ingredients))
+                asyncio.run(
+                    self._ingest_async(
+                        ingest_method=ingest_method,
+                        source_files=source_files,
+                        on_ingested=on_ingested,
+                    )
+                )
             else:
+                self._ingest_sync(
+                    ingest_method=ingest_method,
+                    source_files=source_files,
+                    on_ingested=on_ingested,
+                )
+        finally:
+            manifest.close()
+
+    async def _ingest_async(
+        self,
+        ingest_method: Any,
+        source_files: List[str],
+        on_ingested: Callable[[str], None],
+    ):
+        """schedules all files on one event loop, bounded by a semaphore"""
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def ingest_file(source_file: str) -> str:
+            async with semaphore:
+                await ingest_method(file_path=source_file, **self.ingredients)
+            return source_file
+
+        tasks = [asyncio.create_task(ingest_file(f)) for f in source_files]
+        try:
+            for task in tqdm(asyncio.as_completed(tasks), total=len(tasks)):
+                on_ingested(await task)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _ingest_sync(
+        self,
+        ingest_method: Any,
+        source_files: List[str],
+        on_ingested: Callable[[str], None],
+    ):
+        """runs files serially, or on a thread or process pool"""
+        if self.workers == 1:
+            for source_file in tqdm(source_files):
                 ingest_method(file_path=source_file, **self.ingredients)
+                on_ingested(source_file)
+            return
+
+        pool: Executor
+        if self.executor == "process":
+            pool = ProcessPoolExecutor(max_workers=self.workers)
+            futures = {
+                pool.submit(
+                    _ingest_in_worker,
+                    self.script_path,
+                    self.method_name,
+                    self.ingredients,
+                    file_path=source_file,
+                ): source_file
+                for source_file in source_files
+            }
+        else:
+            pool = ThreadPoolExecutor(max_workers=self.workers)
+            futures = {
+                pool.submit(
+                    ingest_method, file_path=source_file, **self.ingredients
+                ): source_file
+                for source_file in source_files
+            }
+
+        try:
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                future.result()
+                on_ingested(futures[future])
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def _ingest_documents(self):
+        manifest = IngestManifest()
+        manifest_key = self.manifest_key()
+
+        def on_ingested(document_hashes: List[str]) -> None:
+            manifest.mark_documents_ingested(manifest_key, document_hashes)
+
+        try:
+            batches = self._iter_document_batches(
+                manifest=manifest, manifest_key=manifest_key
+            )
+            ingest_method = self.get_method()
+            if asyncio.iscoroutinefunction(ingest_method):
+                asyncio.run(
+                    self._ingest_documents_async(
+                        ingest_method=ingest_method,
+                        batches=batches,
+                        on_ingested=on_ingested,
+                    )
+                )
+            else:
+                self._ingest_documents_sync(
+                    ingest_method=ingest_method,
+                    batches=batches,
+                    on_ingested=on_ingested,
+                )
+        finally:
+            manifest.close()
+
+    def _iter_document_batches(
+        self, manifest: IngestManifest, manifest_key: str
+    ) -> Iterator[DocumentBatch]:
+        """
+        streams `batch_size` batches of documents from the datasets, skipping
+        duplicate documents and ones that were already ingested.
+        """
+        ingested_hashes = (
+            set() if self.force else manifest.ingested_documents(manifest_key)
+        )
+        seen_hashes = set()
+        ingested_count = 0
+        duplicate_count = 0
+
+        documents: List[Dict[str, Any]] = []
+        hashes: List[str] = []
+        for dataset in self.datasets:
+            for document in dataset.iter_source_documents(
+                kind=DOCUMENT_PARAMS[self.source_param]
+            ):
+                doc_hash = document_hash(document)
+                if doc_hash in seen_hashes:
+                    duplicate_count += 1
+                    continue
+                seen_hashes.add(doc_hash)
+                if doc_hash in ingested_hashes:
+                    ingested_count += 1
+                    continue
+                documents.append(document)
+                hashes.append(doc_hash)
+                if len(documents) >= self.batch_size:
+                    yield documents, hashes
+                    documents, hashes = [], []
+        if len(documents) > 0:
+            yield documents, hashes
+
+        if duplicate_count > 0:
+            logger.info(f"Skipped {duplicate_count} duplicate source documents.")
+        if ingested_count > 0:
+            logger.info(
+                f"Skipped {ingested_count} unchanged source documents that were already ingested. Use `--force` to re-ingest them."
+            )
+
+    async def _ingest_documents_async(
+        self,
+        ingest_method: Any,
+        batches: Iterator[DocumentBatch],
+        on_ingested: Callable[[List[str]], None],
+    ):
+        """runs up to `workers` batches at once, reading batches only as needed"""
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def ingest_batch(
+            documents: List[Dict[str, Any]], hashes: List[str]
+        ) -> List[str]:
+            try:
+                await ingest_method(
+                    **{self.source_param: documents}, **self.ingredients
+                )
+            finally:
+                semaphore.release()
+            return hashes
+
+        tasks = set()
+        try:
+            with tqdm(unit="batch") as progress:
+                for documents, hashes in batches:
+                    await semaphore.acquire()
+                    for task in [t for t in tasks if t.done()]:
+                        tasks.discard(task)
+                        on_ingested(task.result())
+                        progress.update()
+                    tasks.add(asyncio.create_task(ingest_batch(documents, hashes)))
+                for task in asyncio.as_completed(tasks):
+                    on_ingested(await task)
+                    progress.update()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _ingest_documents_sync(
+        self,
+        ingest_method: Any,
+        batches: Iterator[DocumentBatch],
+        on_ingested: Callable[[List[str]], None],
+    ):
+        """runs batches serially, or on a thread or process pool"""
+        if self.workers == 1:
+            for documents, hashes in tqdm(batches, unit="batch"):
+                ingest_method(**{self.source_param: documents}, **self.ingredients)
+                on_ingested(hashes)
+            return
+
+        pool: Executor
+        if self.executor == "process":
+            pool = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            pool = ThreadPoolExecutor(max_workers=self.workers)
+
+        def submit(documents: List[Dict[str, Any]]) -> Future:
+            if self.executor == "process":
+                return pool.submit(
+                    _ingest_in_worker,
+                    self.script_path,
+                    self.method_name,
+                    self.ingredients,
+                    **{self.source_param: documents},
+                )
+            return pool.submit(
+                ingest_method, **{self.source_param: documents}, **self.ingredients
+            )
+
+        # only a couple of batches per worker are read ahead of the pool, so the
+        # source documents are never all held in memory.
+        futures: Dict[Future, List[str]] = {}
+        try:
+            with tqdm(unit="batch") as progress:
+                for documents, hashes in batches:
+                    if len(futures) >= self.workers * 2:
+                        done, _pending = wait(futures, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                            on_ingested(futures.pop(future))
+                            progress.update()
+                    futures[submit(documents)] = hashes
+                for future in as_completed(futures):
+                    future.result()
+                    on_ingested(futures[future])
+                    progress.update()
+        finally:
+            pool.shutdown(cancel_futures=True)
@@ -0,0 +1,217 @@
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# how long a claimed job stays with its worker without a heartbeat
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class Job:
+    """a job claimed from the queue. `func` is the unpickled payload"""
+
+    job_id: int
+    name: str
+    func: Callable[[], Any]
+    attempts: int
+
+    def __init__(self, job_id: int, name: str, func: Callable[[], Any], attempts: int):
+        self.job_id = job_id
+        self.name = name
+        self.func = func
+        self.attempts = attempts
+
+
+class JobQueue:
+    """
+    a queue of jobs in a local sqlite file, shared by worker processes. A
+    job's payload is a pickled callable, such as a pipeline method. Workers
+    claim a job with a lease that they renew with heartbeats while it runs.
+    Jobs of a worker that crashed are queued again once their lease expires,
+    or straight away with `release_worker`. Failed jobs are retried up to
+    `max_attempts` times.
+    """
+
+    _connection: sqlite3.Connection
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        db_path: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        if max_attempts < 1:
+            raise ValueError("Job attempts must be at least 1")
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            db_path, timeout=60, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                status TEXT NOT NULL,
+                worker_id TEXT,
+                lease_expires_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )
+            """
+        )
+
+    def _transaction(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        # IMMEDIATE takes the write lock up front, so two workers can't
+        # claim the same job
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._connection)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return result
+
+    def clear(self) -> None:
+        self._transaction(lambda c: c.execute("DELETE FROM jobs"))
+
+    def add(self, name: str, func: Callable[[], Any]) -> int:
+        """queues a picklable callable. Returns the job id"""
+        payload = pickle.dumps(func)
+        return self._transaction(
+            lambda c: c.execute(
+                "INSERT INTO jobs (name, payload, status) VALUES (?, ?, ?)",
+                (name, payload, PENDING),
+            ).lastrowid
+        )
+
+    def _requeue(self, connection: sqlite3.Connection, where: str, params) -> None:
+        # jobs out of attempts fail, rather than crashing workers forever
+        connection.execute(
+            f"""
+            UPDATE jobs SET
+                status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+                error = CASE WHEN attempts >= ? THEN ? ELSE error END,
+                worker_id = NULL,
+                lease_expires_at = NULL
+            WHERE status = ? AND {where}
+            """,
+            (
+                self.max_attempts,
+                FAILED,
+                PENDING,
+                self.max_attempts,
+                "worker stopped while running the job",
+                RUNNING,
+                *params,
+            ),
+        )
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        """takes the next pending job, or returns None if there isn't one"""
+
+        def claim(connection: sqlite3.Connection) -> Optional[Tuple]:
+            now = time.time()
+            self._requeue(connection, "lease_expires_at < ?", (now,))
+            row = connection.execute(
+                "SELECT job_id, name, payload, attempts FROM jobs WHERE status = ? ORDER BY job_id LIMIT 1",
+                (PENDING,),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, worker_id = ?, lease_expires_at = ?, attempts = attempts + 1 WHERE job_id = ?",
+                (RUNNING, worker_id, now + self.lease_seconds, row[0]),
+            )
+            return row
+
+        row = self._transaction(claim)
+        if row is None:
+            return None
+        job_id, name, payload, attempts = row
+        return Job(
+            job_id=job_id, name=name, func=pickle.loads(payload), attempts=attempts + 1
+        )
+
+    def heartbeat(self, job_id: int, worker_id: str) -> None:
+        """extends the lease on a running job"""
+        self._transaction(
+            lambda c: c.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE job_id = ? AND worker_id = ? AND status = ?",
+                (time.time() + self.lease_seconds, job_id, worker_id, RUNNING),
+            )
+        )
+
+    def complete(self, job_id: int, worker_id: str) -> None:
+        self._transaction(
+            lambda c: c.execute(
+                "UPDATE jobs SET status = ?, lease_expires_at = NULL WHERE job_id = ? AND worker_id = ?",
+                (DONE, job_id, worker_id),
+            )
+        )
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> None:
+        """records a failed attempt, queueing the job again if it has attempts left"""
+        self._transaction(
+            lambda c: c.execute(
+                """
+                UPDATE jobs SET
+                    status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+                    error = ?,
+                    worker_id = NULL,
+                    lease_expires_at = NULL
+                WHERE job_id = ? AND worker_id = ?
+                """,
+                (self.max_attempts, FAILED, PENDING, error, job_id, worker_id),
+            )
+        )
+
+    def release(self, job_id: int, worker_id: str) -> None:
+        """gives a job back unfinished, without counting the attempt"""
+        self._transaction(
+            lambda c: c.execute(
+                "UPDATE jobs SET status = ?, worker_id = NULL, lease_expires_at = NULL, attempts = attempts - 1 WHERE job_id = ? AND worker_id = ?",
+                (PENDING, job_id, worker_id),
+            )
+        )
+
+    def release_worker(self, worker_id: str) -> None:
+        """queues the running jobs of a worker that stopped again"""
+        self._transaction(lambda c: self._requeue(c, "worker_id = ?", (worker_id,)))
+
+    def counts(self) -> Dict[str, int]:
+        """the number of jobs by status"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    def unfinished(self) -> int:
+        counts = self.counts()
+        return counts.get(PENDING, 0) + counts.get(RUNNING, 0)
+
+    def failures(self) -> Dict[str, str]:
+        """the error of each failed job, by job name"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT name, error FROM jobs WHERE status = ?", (FAILED,)
+            ).fetchall()
+        return {name: error for name, error in rows}
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,170 @@
+import functools
+import hashlib
+import inspect
+import json
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import trulens_eval
+from trulens_eval.feedback.provider.base import LLMProvider
+
+from ..utils import get_state_path
+
+_MISSING = object()
+
+
+def normalize_input(value: Any) -> Any:
+    """collapses whitespace in strings so formatting differences share a cache entry"""
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip()
+    if isinstance(value, (list, tuple)):
+        return [normalize_input(v) for v in value]
+    if isinstance(value, dict):
+        return {k: normalize_input(v) for k, v in value.items()}
+    return value
+
+
+class JudgeCache:
+    """
+    on-disk cache of judge LLM feedback results, keyed by provider, model,
+    feedback name and the normalized feedback inputs. Least recently used
+    entries are evicted once the cache grows past its size limits.
+    """
+
+    _connection: sqlite3.Connection
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_entries: int = 500_000,
+        max_bytes: int = 512 * 1024 * 1024,
+        eviction_interval: int = 100,
+    ):
+        if db_path is None:
+            db_path = get_state_path("judge_cache.sqlite")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._eviction_interval = eviction_interval
+        self._puts_since_eviction = 0
+        self._lock = threading.Lock()
+        # shared by recipes evaluating at once in other processes
+        self._connection = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS judge_results (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS judge_results_last_access ON judge_results (last_access)"
+            )
+
+    def make_key(self, provider: LLMProvider, feedback_name: str, inputs: Any) -> str:
+        key_parts = [
+            trulens_eval.__version__,
+            type(provider).__name__,
+            getattr(provider, "model_engine", None),
+            feedback_name,
+            normalize_input(inputs),
+        ]
+        key_json = json.dumps(key_parts, sort_keys=True, default=str)
+        return hashlib.sha256(key_json.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM judge_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return _MISSING
+            with self._connection:
+                self._connection.execute(
+                    "UPDATE judge_results SET last_access = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+        return pickle.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        data = pickle.dumps(value)
+        with self._lock:
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO judge_results VALUES (?, ?, ?, ?)",
+                    (key, data, len(data), time.time()),
+                )
+            self._puts_since_eviction += 1
+            if self._puts_since_eviction >= self._eviction_interval:
+                self._puts_since_eviction = 0
+                self._evict()
+
+    def _evict(self) -> None:
+        """removes least recently used entries until within the size limits"""
+        count, size = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM judge_results"
+        ).fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+
+        # trim to 90% of the limits, so eviction doesn't run on every put
+        excess_count = count - int(self.max_entries * 0.9)
+        excess_bytes = size - int(self.max_bytes * 0.9)
+        rows = self._connection.execute(
+            "SELECT key, size FROM judge_results ORDER BY last_access"
+        )
+        evict_keys = []
+        for key, entry_size in rows:
+            if excess_count <= 0 and excess_bytes <= 0:
+                break
+            evict_keys.append((key,))
+            excess_count -= 1
+            excess_bytes -= entry_size
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM judge_results WHERE key = ?", evict_keys
+            )
+
+    def wrap(
+        self,
+        func: Callable,
+        provider: LLMProvider,
+        feedback_name: str,
+        extra_key: Optional[Callable[..., Any]] = None,
+    ) -> Callable:
+        """
+        wraps a feedback implementation so that repeated calls with the same
+        inputs are served from the cache. `extra_key` can add values that
+        affect the result but aren't inputs, such as a ground-truth answer.
+        """
+
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def cached(*args, **kwargs):
+            # bind to the signature so positional and keyword calls share a key
+            inputs = [signature.bind(*args, **kwargs).arguments]
+            if extra_key is not None:
+                inputs.append(extra_key(*args, **kwargs))
+            key = self.make_key(
+                provider=provider, feedback_name=feedback_name, inputs=inputs
+            )
+            value = self.get(key)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                self.put(key, value)
+            return value
+
+        return cached
+
+    def close(self) -> None:
+        self._connection.close()
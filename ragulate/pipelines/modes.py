@@ -0,0 +1,3 @@
+# kept apart from the pipelines, so the CLI can list the choices without importing them
+EXECUTOR_KINDS = ["thread", "process"]
+EVALUATION_MODES = ["deferred", "batch"]
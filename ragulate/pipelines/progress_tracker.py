@@ -0,0 +1,81 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from trulens_eval.schema.feedback import FeedbackResultStatus
+
+StatusCounts = Dict[FeedbackResultStatus, int]
+
+DEFAULT_RECONCILE_INTERVAL = 10.0
+
+
+class ProgressTracker:
+    """
+    counts feedback results by status as they are queued, started and
+    finished, so progress can be shown without querying the database.
+    Feedbacks evaluated elsewhere, such as by the TruLens deferred evaluator,
+    are reconciled with the `reconcile` callback at most once every
+    `reconcile_interval` seconds. Its counts are taken relative to the ones
+    at startup, so results from earlier runs aren't included.
+    """
+
+    _counts: StatusCounts
+    _baseline: StatusCounts
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        reconcile: Optional[Callable[[], StatusCounts]] = None,
+        reconcile_interval: float = DEFAULT_RECONCILE_INTERVAL,
+    ):
+        self._reconcile = reconcile
+        self._reconcile_interval = reconcile_interval
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._baseline = dict(reconcile()) if reconcile is not None else {}
+        self._last_reconcile = time.monotonic()
+
+    def _increment(self, status: FeedbackResultStatus, count: int) -> None:
+        self._counts[status] = self._counts.get(status, 0) + count
+
+    def feedbacks_queued(self, count: int) -> None:
+        with self._lock:
+            self._increment(FeedbackResultStatus.NONE, count)
+
+    def feedback_started(self) -> None:
+        with self._lock:
+            self._increment(FeedbackResultStatus.NONE, -1)
+            self._increment(FeedbackResultStatus.RUNNING, 1)
+
+    def feedback_finished(self, status: FeedbackResultStatus) -> None:
+        """records the result of a started feedback"""
+        with self._lock:
+            self._increment(FeedbackResultStatus.RUNNING, -1)
+            self._increment(status, 1)
+
+    def feedback_cancelled(self) -> None:
+        """records that a queued feedback won't be started"""
+        with self._lock:
+            self._increment(FeedbackResultStatus.NONE, -1)
+
+    def reconcile(self) -> None:
+        """replaces the counts with the ones from the `reconcile` callback"""
+        if self._reconcile is None:
+            return
+        counts = self._reconcile()
+        with self._lock:
+            self._counts = {
+                status: max(0, counts.get(status, 0) - self._baseline.get(status, 0))
+                for status in set(counts) | set(self._baseline)
+            }
+            self._last_reconcile = time.monotonic()
+
+    def get_feedback_count_by_status(self) -> StatusCounts:
+        """same shape as `tru.db.get_feedback_count_by_status()`"""
+        if (
+            self._reconcile is not None
+            and time.monotonic() - self._last_reconcile >= self._reconcile_interval
+        ):
+            self.reconcile()
+        with self._lock:
+            return dict(self._counts)
@@ -1,10 +1,11 @@
-import random
 import signal
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from typing import Any, Dict, List, Optional
 
 from tqdm import tqdm
-from trulens_eval import Tru, TruChain
+from trulens_eval import Feedback, Tru, TruChain
 from trulens_eval.feedback.provider import (
     AzureOpenAI,
     Bedrock,
@@ -19,24 +20,40 @@ from trulens_eval.schema.feedback import FeedbackMode, FeedbackResultStatus
 from ragulate.datasets import BaseDataset
 
 from ..logging_config import logger
-from ..utils import get_tru
+from ..rate_limit import RateLimiter, get_rate_limiter, rate_limit_provider
+from ..result_store import ResultStore
+from ..sharding import Shard, in_shard, shard_recipe_name
+from ..utils import query_id
 from .base_pipeline import BasePipeline
+from .batch_evaluator import BatchEvaluator
 from .feedbacks import Feedbacks
+from .golden_set import GoldenSetIndex
+from .judge_cache import JudgeCache
+from .modes import EVALUATION_MODES
+from .progress_tracker import ProgressTracker
+from .query_progress import QueryProgress
 
 
 class QueryPipeline(BasePipeline):
     _sigint_received = False
 
     _tru: Tru
+    _result_store: ResultStore
     _name: str
     _progress: tqdm
-    _queries: Dict[str, List[str]] = {}
-    _golden_sets: Dict[str, List[Dict[str, str]]] = {}
+    _queries: Dict[str, List[str]]
+    _golden_sets: Dict[str, List[Dict[str, str]]]
+    _golden_set_index: GoldenSetIndex
     _total_queries: int = 0
     _total_feedbacks: int = 0
     _finished_feedbacks: int = 0
     _finished_queries: int = 0
     _evaluation_running = False
+    _evaluator: Optional[BatchEvaluator] = None
+    _tracker: Optional[ProgressTracker] = None
+    _judge_cache: Optional[JudgeCache] = None
+    _query_rate_limiter: Optional[RateLimiter] = None
+    _query_progress: Optional[QueryProgress] = None
 
     @property
     def PIPELINE_TYPE(self):
@@ -58,6 +75,17 @@ class QueryPipeline(BasePipeline):
         restart_pipeline: Optional[bool] = False,
         llm_provider: Optional[str] = "OpenAI",
         model_name: Optional[str] = None,
+        concurrency: Optional[int] = 1,
+        query_rate_limit: Optional[float] = None,
+        evaluation_mode: Optional[str] = "deferred",
+        evaluation_parallelism: Optional[int] = 8,
+        evaluation_rate_limit: Optional[float] = None,
+        evaluation_token_limit: Optional[float] = None,
+        judge_cache: Optional[bool] = True,
+        shard: Optional[Shard] = None,
+        database_url: Optional[str] = None,
+        shard_database: Optional[bool] = True,
+        show_progress: Optional[bool] = True,
         **kwargs,
     ):
         super().__init__(
@@ -68,41 +96,122 @@ class QueryPipeline(BasePipeline):
             datasets=datasets,
         )
 
+        if shard is not None and sample_percent < 1.0 and random_seed is None:
+            # each shard process would draw a different sample, so the shards
+            # would overlap and leave gaps
+            raise ValueError(
+                "Sharded queries can only be sampled with a random seed, so that every shard samples the same queries"
+            )
         self.sample_percent = sample_percent
         self.random_seed = random_seed
         self.restart_pipeline = restart_pipeline
         self.llm_provider = llm_provider
         self.model_name = model_name
 
-        # Set up the signal handler for SIGINT (Ctrl-C)
-        signal.signal(signal.SIGINT, self.signal_handler)
+        if concurrency < 1:
+            raise ValueError("Query concurrency must be at least 1")
+        self.concurrency = concurrency
+        for name, limit in [
+            ("Query rate limit", query_rate_limit),
+            ("Evaluation rate limit", evaluation_rate_limit),
+            ("Evaluation token limit", evaluation_token_limit),
+        ]:
+            if limit is not None and limit < 1:
+                raise ValueError(f"{name} must be at least 1 per minute")
+        self.query_rate_limit = query_rate_limit
+
+        if evaluation_mode not in EVALUATION_MODES:
+            raise ValueError(
+                f"Unsupported evaluation mode: {evaluation_mode}. Choices are {EVALUATION_MODES}"
+            )
+        self.evaluation_mode = evaluation_mode
+        self.evaluation_parallelism = evaluation_parallelism
+        self.evaluation_rate_limit = evaluation_rate_limit
+        self.evaluation_token_limit = evaluation_token_limit
+        self.judge_cache = judge_cache
+        self.shard = shard
+        self.database_url = database_url
+        self.shard_database = shard_database
+        self.show_progress = show_progress
+
+        self._queries = {}
+        self._golden_sets = {}
+        self._golden_set_index = GoldenSetIndex()
+
+    def load_queries(self):
+        """
+        connects to the recipe's database and loads the queries that still need
+        to run. This is deferred until query time because Tru is a singleton,
+        so only one recipe's database can be open at a time.
+        """
+        self._result_store = ResultStore(
+            recipe_name=self.recipe_name, database_url=self.database_url
+        )
+        if (
+            self.shard is not None
+            and self.shard_database
+            and not self._result_store.shared
+        ):
+            # each shard writes to its own sqlite file, which `ragulate merge`
+            # combines. Shards of a shared database write to it directly.
+            self._result_store = ResultStore(
+                recipe_name=shard_recipe_name(self.recipe_name, shard=self.shard)
+            )
+        self._tru = self._result_store.tru()
+        self._query_progress = QueryProgress(
+            engine=self._tru.db.engine,
+            table_name=self._result_store.progress_table,
+        )
 
-        self._tru = get_tru(recipe_name=self.recipe_name)
-        if self.restart_pipeline:
-            # TODO: Work with TruLens to get a new method added
-            # so we can just delete a single "app" instead of the whole
-            # database.
-            self._tru.reset_database()
-
-        for dataset in datasets:
-            queries, golden_set = dataset.get_queries_and_golden_set()
-            if self.sample_percent < 1.0:
-                if self.random_seed is not None:
-                    random.seed(self.random_seed)
-                sampled_indices = random.sample(
-                    range(len(queries)), int(self.sample_percent * len(queries))
+        records_table = self._tru.db.orm.Record.__table__
+        for dataset in self.datasets:
+            if self.restart_pipeline:
+                # only the results of the datasets being queried are deleted
+                self._result_store.reset_app(tru=self._tru, app_id=dataset.name)
+                self._query_progress.reset(app_id=dataset.name)
+
+            queries, golden_set = dataset.get_sampled_queries_and_golden_set(
+                sample_percent=self.sample_percent, seed=self.random_seed
+            )
+
+            queries = [query for query in queries if in_shard(query, self.shard)]
+
+            # queries of an earlier run that stopped before their feedbacks
+            # were stored, or whose feedbacks failed in batch mode, run again
+            # without the records they left behind.
+            # Only this pipeline's queries are checked, as other shards may
+            # be running them right now.
+            unfinished = self._query_progress.unfinished(
+                app_id=dataset.name, query_ids=[query_id(query) for query in queries]
+            )
+            if len(unfinished) > 0:
+                record_ids = self._query_progress.record_ids(
+                    app_id=dataset.name,
+                    records_table=records_table,
+                    query_ids=unfinished,
+                )
+                logger.info(
+                    f"Querying {len(unfinished)} unfinished queries for {dataset.name} again"
+                )
+                self._result_store.delete_records(tru=self._tru, record_ids=record_ids)
+                self._query_progress.forget_started(
+                    app_id=dataset.name, query_ids=unfinished
                 )
-                queries = [queries[i] for i in sampled_indices]
 
-            # Check for existing records and filter queries
-            existing_records, _feedbacks = self._tru.get_records_and_feedback(
-                app_ids=[dataset.name]
+            # skip queries that completed in an earlier run
+            backfilled = self._query_progress.backfill(
+                app_id=dataset.name, records_table=records_table
             )
-            existing_queries = existing_records["input"].dropna().tolist()
-            queries = [query for query in queries if query not in existing_queries]
+            if backfilled > 0:
+                logger.info(
+                    f"Recorded progress of {backfilled} existing queries for {dataset.name}"
+                )
+            completed = self._query_progress.completed(app_id=dataset.name)
+            queries = [query for query in queries if query_id(query) not in completed]
 
             self._queries[dataset.name] = queries
             self._golden_sets[dataset.name] = golden_set
+            self._golden_set_index.add(golden_set, namespace=dataset.name)
             self._total_queries += len(self._queries[dataset.name])
 
         metric_count = 4
@@ -113,25 +222,52 @@ class QueryPipeline(BasePipeline):
         self.stop_evaluation("sigint")
 
     def start_evaluation(self):
-        self._tru.start_evaluator(disable_tqdm=True)
+        if self.evaluation_mode == "batch":
+            # feedbacks run in this process, so the counts are exact
+            self._tracker = ProgressTracker()
+            self._evaluator = BatchEvaluator(
+                tru=self._tru,
+                parallelism=self.evaluation_parallelism,
+                tracker=self._tracker,
+            )
+        else:
+            # the deferred evaluator's results are only seen in the database
+            self._tracker = ProgressTracker(
+                reconcile=self._tru.db.get_feedback_count_by_status
+            )
+            self._tru.start_evaluator(disable_tqdm=True)
         self._evaluation_running = True
 
     def stop_evaluation(self, loc: str):
         if self._evaluation_running:
             try:
                 logger.debug(f"Stopping evaluation from: {loc}")
-                self._tru.stop_evaluator()
+                if self._evaluator is not None:
+                    self._evaluator.shutdown(cancel=self._sigint_received)
+                else:
+                    self._tru.stop_evaluator()
                 self._evaluation_running = False
                 self._tru.delete_singleton()
+                if self._judge_cache is not None:
+                    self._judge_cache.close()
+                    self._judge_cache = None
             except Exception as e:
                 logger.error(f"issue stopping evaluator: {e}")
             finally:
                 self._progress.close()
 
+    def _evaluation_pending(self) -> bool:
+        if self._evaluator is not None:
+            # failed batch evaluations only run again when the queries are
+            # resumed, so wait for the queue to empty rather than for every
+            # feedback to be done.
+            return self._evaluator.pending() > 0
+        return self._finished_feedbacks < self._total_feedbacks
+
     def update_progress(self, query_change: int = 0):
         self._finished_queries += query_change
 
-        status = self._tru.db.get_feedback_count_by_status()
+        status = self._tracker.get_feedback_count_by_status()
         done = status.get(FeedbackResultStatus.DONE, 0)
 
         postfix = {
@@ -169,62 +305,195 @@ class QueryPipeline(BasePipeline):
         else:
             raise ValueError(f"Unsupported provider: {llm_provider}")
 
+    def get_feedback_functions(
+        self, feedbacks: Feedbacks, dataset_name: str
+    ) -> List[Feedback]:
+        return [
+            feedbacks.answer_correctness(
+                golden_set=self._golden_sets[dataset_name],
+                index=self._golden_set_index,
+                namespace=dataset_name,
+            ),
+            feedbacks.answer_relevance(),
+            feedbacks.context_relevance(),
+            feedbacks.groundedness(),
+        ]
+
+    def _log_query_error(self, query: str, e: Exception):
+        # TODO: figure out why the logger isn't working after tru-lens starts. For now use print()
+        print(f"ERROR: Query: '{query}' caused exception, skipping. Exception {e}")
+        logger.error(f"Query: '{query}' caused exception: {e}, skipping.")
+
+    def _invoke_query(self, pipeline: Any, recorder: TruChain, query: str) -> bool:
+        """runs a single query under the recorder. returns False if it was skipped"""
+        if self._sigint_received:
+            return False
+
+        query_ids = [query_id(query)]
+        try:
+            self._query_progress.mark_started(
+                app_id=recorder.app_id, query_ids=query_ids
+            )
+            # only the app call is retried, within a single recording. TruLens
+            # keeps the records of failed calls in the recording without
+            # storing them, so the last record is the query's.
+            with recorder as recording:
+                self._query_rate_limiter.call(pipeline.invoke, query)
+            record = recording[-1]
+            if self._evaluator is not None:
+                # the feedbacks are only in memory until they're evaluated, so
+                # the query completes once they're stored. Otherwise a resumed
+                # run would skip a query whose evaluations were lost.
+                self._evaluator.submit(
+                    app=recorder,
+                    record=record,
+                    on_evaluated=partial(
+                        self._query_progress.mark_completed,
+                        app_id=recorder.app_id,
+                        query_ids=query_ids,
+                    ),
+                )
+            else:
+                # the deferred evaluator picks up feedbacks queued in the
+                # database, including those of earlier runs
+                self._query_progress.mark_completed(
+                    app_id=recorder.app_id, query_ids=query_ids
+                )
+                self._tracker.feedbacks_queued(len(recorder.feedbacks))
+        except Exception as e:
+            self._log_query_error(query=query, e=e)
+        return True
+
+    def query_dataset(self, pipeline: Any, recorder: TruChain, queries: List[str]):
+        """runs the queries for a single dataset, `concurrency` at a time"""
+        if self.concurrency == 1:
+            for query in queries:
+                if not self._invoke_query(
+                    pipeline=pipeline, recorder=recorder, query=query
+                ):
+                    break
+                self.update_progress(query_change=1)
+        else:
+            # Queries run on threads rather than via `ainvoke`/`abatch`: TruLens
+            # loses the recording stack across the tasks that LCEL spawns for
+            # async calls, which splits a single query into several records.
+            pool = ThreadPoolExecutor(max_workers=self.concurrency)
+            futures = [
+                pool.submit(
+                    self._invoke_query,
+                    pipeline=pipeline,
+                    recorder=recorder,
+                    query=query,
+                )
+                for query in queries
+            ]
+            try:
+                # progress is only updated from this thread
+                for future in as_completed(futures):
+                    if future.result():
+                        self.update_progress(query_change=1)
+            finally:
+                pool.shutdown(cancel_futures=True)
+
     def query(self):
-        query_method = self.get_method()
+        # Set up the signal handler for SIGINT (Ctrl-C)
+        signal.signal(signal.SIGINT, self.signal_handler)
 
-        pipeline = query_method(**self.ingredients)
-        llm_provider = self.get_provider()
+        self.load_queries()
 
-        feedbacks = Feedbacks(llm_provider=llm_provider, pipeline=pipeline)
+        try:
+            query_method = self.get_method()
 
-        self.start_evaluation()
+            pipeline = query_method(**self.ingredients)
+            llm_provider = self.get_provider()
 
-        time.sleep(0.1)
-        logger.info(
-            f"Starting query {self.recipe_name} on {self.script_path}/{self.method_name} with ingredients: {self.ingredients} on datasets: {self.dataset_names()}"
-        )
-        logger.info(
-            "Progress postfix legend: (q)ueries completed; Evaluations (d)one, (r)unning, (w)aiting, (f)ailed, (s)kipped"
-        )
+            # shared with other pipelines that use the same chain script, so that
+            # rate limited queries back off together.
+            self._query_rate_limiter = get_rate_limiter(
+                provider="query",
+                model=self.script_path,
+                requests_per_minute=self.query_rate_limit,
+                max_concurrency=self.concurrency,
+            )
+            if self.evaluation_mode == "batch":
+                # the deferred evaluator re-creates feedback implementations from
+                # their serialized form, so the rate limiter and judge cache are
+                # only applied in batch mode.
+                llm_provider = rate_limit_provider(
+                    llm_provider,
+                    get_rate_limiter(
+                        provider=self.llm_provider,
+                        model=getattr(llm_provider, "model_engine", self.model_name),
+                        requests_per_minute=self.evaluation_rate_limit,
+                        tokens_per_minute=self.evaluation_token_limit,
+                        max_concurrency=self.evaluation_parallelism,
+                    ),
+                )
+                if self.judge_cache:
+                    self._judge_cache = JudgeCache()
 
-        self._progress = tqdm(total=(self._total_queries + self._total_feedbacks))
+            feedbacks = Feedbacks(
+                llm_provider=llm_provider, pipeline=pipeline, cache=self._judge_cache
+            )
 
-        for dataset_name in self._queries:
-            feedback_functions = [
-                feedbacks.answer_correctness(
-                    golden_set=self._golden_sets[dataset_name]
-                ),
-                feedbacks.answer_relevance(),
-                feedbacks.context_relevance(),
-                feedbacks.groundedness(),
-            ]
+            self.start_evaluation()
 
-            recorder = TruChain(
-                pipeline,
-                app_id=dataset_name,
-                feedbacks=feedback_functions,
-                feedback_mode=FeedbackMode.DEFERRED,
+            time.sleep(0.1)
+            logger.info(
+                f"Starting query {self.recipe_name} on {self.script_path}/{self.method_name} with ingredients: {self.ingredients} on datasets: {self.dataset_names()}"
+            )
+            logger.info(
+                "Progress postfix legend: (q)ueries completed; Evaluations (d)one, (r)unning, (w)aiting, (f)ailed, (s)kipped"
             )
 
-            for query in self._queries[dataset_name]:
-                if self._sigint_received:
-                    break
-                try:
-                    with recorder:
-                        pipeline.invoke(query)
-                except Exception as e:
-                    # TODO: figure out why the logger isn't working after tru-lens starts. For now use print()
-                    print(
-                        f"ERROR: Query: '{query}' caused exception, skipping. Exception {e}"
+            self._progress = tqdm(
+                total=(self._total_queries + self._total_feedbacks),
+                desc=self.recipe_name,
+                disable=not self.show_progress,
+            )
+
+            for dataset_name in self._queries:
+                feedback_functions = self.get_feedback_functions(
+                    feedbacks=feedbacks, dataset_name=dataset_name
+                )
+
+                if self._evaluator is not None:
+                    # records are still written by the recorder, but feedbacks are
+                    # evaluated by the BatchEvaluator as each record finishes.
+                    recorder = TruChain(
+                        pipeline,
+                        app_id=dataset_name,
+                        feedbacks=feedback_functions,
+                        feedback_mode=FeedbackMode.NONE,
+                        tru=self._tru,
+                    )
+                    self._evaluator.add_app(recorder)
+                else:
+                    recorder = TruChain(
+                        pipeline,
+                        app_id=dataset_name,
+                        feedbacks=feedback_functions,
+                        feedback_mode=FeedbackMode.DEFERRED,
                     )
-                    logger.error(f"Query: '{query}' caused exception: {e}, skipping.")
-                finally:
-                    self.update_progress(query_change=1)
 
-        while self._finished_feedbacks < self._total_feedbacks:
-            if self._sigint_received:
-                break
-            self.update_progress()
-            time.sleep(1)
+                self.query_dataset(
+                    pipeline=pipeline,
+                    recorder=recorder,
+                    queries=self._queries[dataset_name],
+                )
 
-        self.stop_evaluation(loc="end")
+            while self._evaluation_pending():
+                if self._sigint_received:
+                    break
+                self.update_progress()
+                time.sleep(1)
+
+            self.stop_evaluation(loc="end")
+        except BaseException:
+            # workers run more jobs in this process after a failed one, which
+            # each need to open their own recipe's database
+            if self._evaluation_running:
+                self.stop_evaluation(loc="error")
+            else:
+                self._tru.delete_singleton()
+            raise
@@ -0,0 +1,195 @@
+import json
+import time
+from typing import Iterable, List, Set, Tuple
+
+from sqlalchemy import Column, Float, MetaData, String, Table, delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+
+from ..utils import query_id
+
+
+class QueryProgress:
+    """
+    ragulate's record of the queries that completed for each app, stored by
+    query id next to the TruLens tables. Resuming a run reads only these ids,
+    rather than loading every record and feedback through TruLens. A query is
+    started before it runs, and only completes once its record is written and
+    its feedbacks are evaluated or queued in the database. Queries that were
+    started but never completed left a partial record behind, which has to be
+    deleted before they run again.
+    """
+
+    _engine: Engine
+    _table: Table
+    _started: Table
+
+    def __init__(self, engine: Engine, table_name: str = "ragulate_progress"):
+        self._engine = engine
+        self._table = Table(
+            table_name,
+            MetaData(),
+            Column("app_id", String(256), primary_key=True),
+            Column("query_id", String(32), primary_key=True),
+            Column("completed_at", Float, nullable=False),
+        )
+        self._started = Table(
+            f"{table_name}_started",
+            MetaData(),
+            Column("app_id", String(256), primary_key=True),
+            Column("query_id", String(32), primary_key=True),
+            Column("started_at", Float, nullable=False),
+        )
+        self._table.create(engine, checkfirst=True)
+        self._started.create(engine, checkfirst=True)
+
+    def completed(self, app_id: str) -> Set[str]:
+        """gets the ids of the queries that completed for the app"""
+        with self._engine.connect() as connection:
+            rows = connection.execute(
+                select(self._table.c.query_id).where(self._table.c.app_id == app_id)
+            )
+            return {row[0] for row in rows}
+
+    def started(self, app_id: str) -> Set[str]:
+        """gets the ids of the queries that were started but never completed"""
+        with self._engine.connect() as connection:
+            rows = connection.execute(
+                select(self._started.c.query_id).where(self._started.c.app_id == app_id)
+            )
+            return {row[0] for row in rows}
+
+    def _insert_ignoring_duplicates(self, table: Table):
+        dialect = self._engine.dialect.name
+        if dialect == "sqlite":
+            return sqlite.insert(table).on_conflict_do_nothing()
+        if dialect == "postgresql":
+            return postgresql.insert(table).on_conflict_do_nothing()
+        return None
+
+    def _insert(
+        self, connection: Connection, table: Table, app_id: str, rows: List[dict]
+    ) -> None:
+        if len(rows) == 0:
+            return
+        statement = self._insert_ignoring_duplicates(table)
+        if statement is None:
+            # other databases skip ids that are already recorded up front
+            existing = {
+                row[0]
+                for row in connection.execute(
+                    select(table.c.query_id).where(table.c.app_id == app_id)
+                )
+            }
+            rows = [row for row in rows if row["query_id"] not in existing]
+            statement = insert(table)
+        if len(rows) > 0:
+            connection.execute(statement, rows)
+
+    def _forget_started(
+        self, connection: Connection, app_id: str, query_ids: Set[str]
+    ) -> None:
+        connection.execute(
+            delete(self._started).where(
+                self._started.c.app_id == app_id,
+                self._started.c.query_id.in_(query_ids),
+            )
+        )
+
+    def mark_started(self, app_id: str, query_ids: Iterable[str]) -> None:
+        started_at = time.time()
+        rows = [
+            {"app_id": app_id, "query_id": q, "started_at": started_at}
+            for q in set(query_ids)
+        ]
+        with self._engine.begin() as connection:
+            self._insert(connection, self._started, app_id=app_id, rows=rows)
+
+    def mark_completed(self, app_id: str, query_ids: Iterable[str]) -> None:
+        query_ids = set(query_ids)
+        completed_at = time.time()
+        rows = [
+            {"app_id": app_id, "query_id": q, "completed_at": completed_at}
+            for q in query_ids
+        ]
+        if len(rows) == 0:
+            return
+
+        with self._engine.begin() as connection:
+            self._insert(connection, self._table, app_id=app_id, rows=rows)
+            self._forget_started(connection, app_id=app_id, query_ids=query_ids)
+
+    def _record_query_ids(
+        self, app_id: str, records_table: Table
+    ) -> List[Tuple[str, str]]:
+        """the record id and query id of each record of an app"""
+        with self._engine.connect() as connection:
+            rows = connection.execute(
+                select(records_table.c.record_id, records_table.c.input).where(
+                    records_table.c.app_id == app_id,
+                    records_table.c.input.is_not(None),
+                )
+            ).fetchall()
+
+        record_query_ids: List[Tuple[str, str]] = []
+        for record_id, record_input in rows:
+            # TruLens stores the main input JSON encoded
+            try:
+                query = json.loads(record_input)
+            except ValueError:
+                query = record_input
+            if isinstance(query, str):
+                record_query_ids.append((record_id, query_id(query)))
+        return record_query_ids
+
+    def unfinished(self, app_id: str, query_ids: Iterable[str]) -> Set[str]:
+        """gets which of the queries were started but never completed"""
+        return self.started(app_id) & set(query_ids)
+
+    def record_ids(
+        self, app_id: str, records_table: Table, query_ids: Iterable[str]
+    ) -> List[str]:
+        """gets the ids of the app's records for the queries"""
+        query_ids = set(query_ids)
+        return [
+            record_id
+            for record_id, record_query_id in self._record_query_ids(
+                app_id=app_id, records_table=records_table
+            )
+            if record_query_id in query_ids
+        ]
+
+    def forget_started(self, app_id: str, query_ids: Iterable[str]) -> None:
+        """forgets that queries were started, once their records are deleted"""
+        with self._engine.begin() as connection:
+            self._forget_started(connection, app_id=app_id, query_ids=set(query_ids))
+
+    def backfill(self, app_id: str, records_table: Table) -> int:
+        """
+        fills in the progress of an app from the inputs of its TruLens records,
+        for databases written before ragulate tracked progress. Only runs when
+        the app has no progress yet, and skips queries that were started but
+        never completed. Returns the number of queries added.
+        """
+        with self._engine.connect() as connection:
+            for table in [self._table, self._started]:
+                row = connection.execute(
+                    select(table.c.query_id).where(table.c.app_id == app_id).limit(1)
+                ).first()
+                if row is not None:
+                    return 0
+
+        query_ids = {
+            q
+            for _, q in self._record_query_ids(
+                app_id=app_id, records_table=records_table
+            )
+        }
+        self.mark_completed(app_id=app_id, query_ids=query_ids)
+        return len(query_ids)
+
+    def reset(self, app_id: str) -> None:
+        """forgets the progress of an app"""
+        with self._engine.begin() as connection:
+            for table in [self._table, self._started]:
+                connection.execute(delete(table).where(table.c.app_id == app_id))
@@ -0,0 +1,205 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+from ..logging_config import logger
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class Task:
+    """a step of a run, which starts once all of its dependencies are done"""
+
+    name: str
+    kind: str
+    func: Callable[[], None]
+    dependencies: List["Task"]
+    local: bool
+    status: str
+    started_at: Optional[float]
+    duration: Optional[float]
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        func: Callable[[], None],
+        dependencies: List["Task"],
+        local: bool,
+    ):
+        self.name = name
+        self.kind = kind
+        self.func = func
+        self.dependencies = dependencies
+        self.local = local
+        self.status = PENDING
+        self.started_at = None
+        self.duration = None
+
+    def is_ready(self) -> bool:
+        return self.status == PENDING and all(
+            d.status == DONE for d in self.dependencies
+        )
+
+    def is_blocked(self) -> bool:
+        """a dependency failed or was skipped, so this task can't run"""
+        return self.status == PENDING and any(
+            d.status in [FAILED, SKIPPED] for d in self.dependencies
+        )
+
+
+class Scheduler:
+    """
+    runs the tasks of a run as a DAG. With a `parallelism` of 1, tasks run one
+    at a time in this process, in the order they were added. Otherwise ready
+    tasks run concurrently on a pool of `parallelism` processes, as TruLens
+    only allows one open results database per process. `limits` caps how many
+    tasks of a kind run at once, such as `{"ingest": 1}`. Local tasks always
+    run in this process, and must not be slow unless nothing else can run.
+    A failed task skips the tasks that depend on it, but independent tasks
+    still run. Failures are raised once every other task has finished.
+    """
+
+    tasks: List[Task]
+
+    def __init__(self, parallelism: int = 1, limits: Optional[Dict[str, int]] = None):
+        if parallelism < 1:
+            raise ValueError("Run parallelism must be at least 1")
+        for kind, limit in (limits or {}).items():
+            if limit < 1:
+                raise ValueError(f"The limit of {kind} tasks must be at least 1")
+        self.parallelism = parallelism
+        self.limits = limits or {}
+        self.tasks = []
+
+    def add_task(
+        self,
+        name: str,
+        kind: str,
+        func: Callable[[], None],
+        dependencies: Optional[List[Task]] = None,
+        local: bool = False,
+    ) -> Task:
+        """
+        adds a task. Unless it's local, `func` is sent to a worker process when
+        running in parallel, so it must be picklable, such as a pipeline method.
+        """
+        task = Task(
+            name=name,
+            kind=kind,
+            func=func,
+            dependencies=dependencies or [],
+            local=local,
+        )
+        self.tasks.append(task)
+        return task
+
+    def _running(self, kind: str) -> int:
+        return len([t for t in self.tasks if t.status == RUNNING and t.kind == kind])
+
+    def _can_start(self, task: Task) -> bool:
+        limit = self.limits.get(task.kind)
+        return limit is None or self._running(task.kind) < limit
+
+    def _skip_blocked(self) -> None:
+        # skipping a task can block the tasks that depend on it in turn
+        blocked = [t for t in self.tasks if t.is_blocked()]
+        while len(blocked) > 0:
+            for task in blocked:
+                task.status = SKIPPED
+                logger.warning(f"Skipping {task.name}, as a task it depends on failed")
+            blocked = [t for t in self.tasks if t.is_blocked()]
+
+    def _started(self, task: Task) -> None:
+        task.status = RUNNING
+        task.started_at = time.monotonic()
+        logger.info(f"Started {task.name} ({self._progress()})")
+
+    def _finished(self, task: Task, error: Optional[BaseException]) -> None:
+        task.duration = time.monotonic() - task.started_at
+        if error is None:
+            task.status = DONE
+            logger.info(
+                f"Finished {task.name} in {task.duration:.1f}s ({self._progress()})"
+            )
+        else:
+            task.status = FAILED
+            logger.error(f"{task.name} failed after {task.duration:.1f}s: {error}")
+        self._skip_blocked()
+
+    def _progress(self) -> str:
+        counts = {
+            status: len([t for t in self.tasks if t.status == status])
+            for status in [DONE, RUNNING, PENDING, FAILED, SKIPPED]
+        }
+        return f"{counts[DONE]}/{len(self.tasks)} done, " + ", ".join(
+            f"{count} {status}"
+            for status, count in counts.items()
+            if status != DONE and count > 0
+        )
+
+    def _run_local(self, task: Task) -> None:
+        self._started(task)
+        try:
+            task.func()
+        except Exception as e:
+            self._finished(task, error=e)
+        else:
+            self._finished(task, error=None)
+
+    def _run_serial(self) -> None:
+        for task in self.tasks:
+            if task.is_ready():
+                self._run_local(task)
+
+    def _run_parallel(self) -> None:
+        running: Dict[Future, Task] = {}
+        # spawned, as forking a process with running threads isn't safe
+        pool = ProcessPoolExecutor(
+            max_workers=self.parallelism,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        try:
+            while True:
+                for task in self.tasks:
+                    if not task.is_ready() or not self._can_start(task):
+                        continue
+                    if task.local:
+                        self._run_local(task)
+                    elif len(running) < self.parallelism:
+                        self._started(task)
+                        running[pool.submit(task.func)] = task
+
+                if len(running) == 0:
+                    # nothing else became ready while the local tasks ran
+                    if not any(t.is_ready() for t in self.tasks):
+                        break
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finished(running.pop(future), error=future.exception())
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def run(self) -> None:
+        if self.parallelism == 1:
+            self._run_serial()
+        else:
+            self._run_parallel()
+
+        self.log_summary()
+        failed = [t.name for t in self.tasks if t.status == FAILED]
+        if len(failed) > 0:
+            raise ValueError(f"Failed tasks: {', '.join(failed)}")
+
+    def log_summary(self) -> None:
+        logger.info("Run summary:")
+        for task in self.tasks:
+            duration = "" if task.duration is None else f" in {task.duration:.1f}s"
+            logger.info(f"\t{task.name}: {task.status}{duration}")
@@ -0,0 +1,161 @@
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from multiprocessing.process import BaseProcess
+from typing import Dict
+
+from ..logging_config import logger
+from .job_queue import DONE, FAILED, PENDING, RUNNING, JobQueue
+
+# how often the supervisor checks on its workers, and logs progress
+POLL_SECONDS = 1.0
+PROGRESS_SECONDS = 30.0
+
+
+def _worker_id(pid: int) -> str:
+    return f"{socket.gethostname()}:{pid}"
+
+
+def _heartbeat(
+    queue: JobQueue, job_id: int, worker_id: str, stop: threading.Event
+) -> None:
+    while not stop.wait(queue.lease_seconds / 4):
+        queue.heartbeat(job_id=job_id, worker_id=worker_id)
+
+
+def run_worker(db_path: str, lease_seconds: float, max_attempts: int) -> None:
+    """
+    the loop of a worker process: claims jobs from the queue and runs them
+    until every job is finished.
+    """
+    queue = JobQueue(
+        db_path=db_path, lease_seconds=lease_seconds, max_attempts=max_attempts
+    )
+    worker_id = _worker_id(os.getpid())
+    try:
+        while True:
+            job = queue.claim(worker_id=worker_id)
+            if job is None:
+                if queue.unfinished() == 0:
+                    return
+                # jobs of a crashed worker may still be queued again
+                time.sleep(POLL_SECONDS)
+                continue
+
+            logger.info(f"Worker {worker_id} started {job.name} (try {job.attempts})")
+            stop = threading.Event()
+            heartbeat = threading.Thread(
+                target=_heartbeat,
+                args=(queue, job.job_id, worker_id, stop),
+                daemon=True,
+            )
+            heartbeat.start()
+            try:
+                job.func()
+            except Exception as e:
+                logger.error(f"Worker {worker_id} failed {job.name}: {e}")
+                queue.fail(
+                    job_id=job.job_id,
+                    worker_id=worker_id,
+                    error=traceback.format_exc(),
+                )
+                continue
+            finally:
+                stop.set()
+                heartbeat.join()
+
+            pipeline = getattr(job.func, "__self__", None)
+            if getattr(pipeline, "_sigint_received", False):
+                # a pipeline stopped by Ctrl-C returns without finishing
+                queue.release(job_id=job.job_id, worker_id=worker_id)
+                return
+            queue.complete(job_id=job.job_id, worker_id=worker_id)
+    finally:
+        queue.close()
+
+
+class WorkerPool:
+    """
+    runs the jobs of a queue on `workers` processes. A worker that exits
+    while jobs remain has its running jobs queued again right away, and is
+    replaced. Progress is logged as jobs finish.
+    """
+
+    _processes: Dict[str, BaseProcess]
+
+    def __init__(self, queue: JobQueue, workers: int):
+        if workers < 1:
+            raise ValueError("Workers must be at least 1")
+        self.queue = queue
+        self.workers = workers
+        self._processes = {}
+        # spawned, as forking a process with running threads isn't safe
+        self._context = multiprocessing.get_context("spawn")
+
+    def _start_worker(self) -> None:
+        process = self._context.Process(
+            target=run_worker,
+            args=(
+                self.queue.db_path,
+                self.queue.lease_seconds,
+                self.queue.max_attempts,
+            ),
+        )
+        process.start()
+        self._processes[_worker_id(process.pid)] = process
+
+    def _check_workers(self) -> None:
+        for worker_id, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del self._processes[worker_id]
+            if process.exitcode != 0:
+                logger.warning(
+                    f"Worker {worker_id} exited with code {process.exitcode}, queueing its jobs again"
+                )
+            self.queue.release_worker(worker_id=worker_id)
+
+        # workers exit on their own once no jobs are left
+        unfinished = self.queue.unfinished()
+        while len(self._processes) < min(self.workers, unfinished):
+            self._start_worker()
+
+    def _log_progress(self) -> None:
+        counts = self.queue.counts()
+        logger.info(
+            f"Jobs: {counts.get(DONE, 0)} done, {counts.get(RUNNING, 0)} running, "
+            f"{counts.get(PENDING, 0)} waiting, {counts.get(FAILED, 0)} failed"
+        )
+
+    def run(self) -> None:
+        """runs until every job is done or failed. Raises if any failed"""
+        last_counts = None
+        last_log = 0.0
+        try:
+            while True:
+                self._check_workers()
+                counts = self.queue.counts()
+                if (
+                    counts != last_counts
+                    or time.monotonic() - last_log > PROGRESS_SECONDS
+                ):
+                    self._log_progress()
+                    last_counts = counts
+                    last_log = time.monotonic()
+                if len(self._processes) == 0 and self.queue.unfinished() == 0:
+                    break
+                time.sleep(POLL_SECONDS)
+        finally:
+            # on Ctrl-C the workers stop their pipelines, and give their jobs back
+            for process in self._processes.values():
+                process.join()
+
+        failures = self.queue.failures()
+        if len(failures) > 0:
+            for name, error in failures.items():
+                logger.error(f"Job {name} failed: {error}")
+            raise ValueError(f"Failed jobs: {', '.join(failures)}")
@@ -0,0 +1,265 @@
+import functools
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .logging_config import logger
+
+# only matched for errors without an HTTP status, as ids and token counts
+# can contain "429"
+_RATE_LIMIT_MESSAGE = re.compile(
+    r"rate limit|too many requests|throttl|\b(?:error|status)(?: code)?:? *429\b",
+    re.IGNORECASE,
+)
+
+
+def _status_code(e: BaseException) -> Optional[int]:
+    status_code = getattr(e, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(e, "response", None), "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def is_rate_limit_error(e: BaseException) -> bool:
+    """checks if an exception (or its cause) is a provider rate limit / 429 error"""
+    seen = set()
+    while e is not None and id(e) not in seen:
+        seen.add(id(e))
+        status_code = _status_code(e)
+        if status_code == 429:
+            return True
+        class_name = type(e).__name__.lower()
+        if "ratelimit" in class_name or "throttl" in class_name:
+            return True
+        if status_code is None and _RATE_LIMIT_MESSAGE.search(str(e)):
+            return True
+        e = e.__cause__ or e.__context__
+    return False
+
+
+def _retry_after(e: BaseException) -> Optional[float]:
+    """returns the `retry-after` seconds sent with a 429 response, if any"""
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if headers is None:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(value: Any) -> int:
+    """roughly estimates the number of LLM tokens in the strings within a value"""
+    if isinstance(value, str):
+        return len(value) // 4 + 1
+    if isinstance(value, dict):
+        return sum(estimate_tokens(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_tokens(v) for v in value)
+    return 0
+
+
+class TokenBucket:
+    """
+    a budget of `per_minute` units that refills continuously, allowing bursts
+    of up to `burst_seconds` worth of units.
+    """
+
+    _rate: float
+    _capacity: float
+    _level: float
+    _updated: float
+    _lock: threading.Lock
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        if per_minute <= 0:
+            raise ValueError("Rate limit must be greater than 0 per minute")
+        self._rate = per_minute / 60.0
+        self._capacity = max(self._rate * burst_seconds, 1.0)
+        self._level = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(
+            self._capacity, self._level + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0) -> None:
+        """blocks until `amount` units are available, then takes them"""
+        # requests larger than the burst wait for a full bucket, then go into
+        # debt so that later callers make up the difference.
+        required = min(amount, self._capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._level >= required:
+                    self._level -= amount
+                    return
+                wait = (required - self._level) / self._rate
+            time.sleep(wait)
+
+    def consume(self, amount: float) -> None:
+        """takes units without waiting, such as for response tokens"""
+        with self._lock:
+            self._refill()
+            self._level -= amount
+
+
+class AdaptiveConcurrency:
+    """
+    limits the number of calls in flight, using AIMD: the limit grows by one
+    per window of successful calls and is halved when a call is rate limited.
+    """
+
+    _limit: float
+    _in_flight: int
+    _generation: int
+    _condition: threading.Condition
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        decrease_factor: float = 0.5,
+    ):
+        if max_concurrency < min_concurrency or min_concurrency < 1:
+            raise ValueError(
+                "Concurrency limits must satisfy 1 <= min_concurrency <= max_concurrency"
+            )
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self._decrease_factor = decrease_factor
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._generation = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self) -> int:
+        """blocks until a call can start. returns a ticket to pass to `release`"""
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+            return self._generation
+
+    def release(self, ticket: int, rate_limited: bool = False) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if rate_limited:
+                # calls started before the last decrease were sent at the old
+                # limit, so their failures don't decrease it again.
+                if ticket == self._generation:
+                    self._limit = max(
+                        self.min_concurrency, self._limit * self._decrease_factor
+                    )
+                    self._generation += 1
+                    logger.debug(f"Rate limited, concurrency reduced to {self.limit}")
+            else:
+                self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+
+class RateLimiter:
+    """
+    keeps calls to an LLM provider within its requests/min and tokens/min
+    quotas, adapting concurrency and retrying calls that are rate limited.
+    """
+
+    _requests: Optional[TokenBucket]
+    _tokens: Optional[TokenBucket]
+    _concurrency: AdaptiveConcurrency
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = 16,
+        max_retries: int = 6,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self._requests = (
+            None if requests_per_minute is None else TokenBucket(requests_per_minute)
+        )
+        self._tokens = (
+            None if tokens_per_minute is None else TokenBucket(tokens_per_minute)
+        )
+        self._concurrency = AdaptiveConcurrency(max_concurrency=max_concurrency)
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+    @property
+    def concurrency_limit(self) -> int:
+        return self._concurrency.limit
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """calls `func` within the limits, retrying it if it is rate limited"""
+        backoff = self.initial_backoff
+        prompt_tokens = estimate_tokens([args, kwargs])
+        for attempt in range(self.max_retries + 1):
+            ticket = self._concurrency.acquire()
+            if self._requests is not None:
+                self._requests.acquire()
+            if self._tokens is not None:
+                self._tokens.acquire(prompt_tokens)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                self._concurrency.release(ticket, rate_limited=rate_limited)
+                if not rate_limited or attempt == self.max_retries:
+                    raise
+                delay = _retry_after(e) or backoff
+                logger.debug(f"Rate limited, retrying in {delay:.1f} seconds: {e}")
+                time.sleep(delay)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            self._concurrency.release(ticket)
+            if self._tokens is not None:
+                self._tokens.consume(estimate_tokens(result))
+            return result
+
+    def wrap(self, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def limited(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+
+        return limited
+
+
+_rate_limiters: Dict[Tuple[str, Optional[str]], RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model: Optional[str], **kwargs) -> RateLimiter:
+    """
+    returns the rate limiter shared by all calls to the provider and model.
+    `kwargs` are passed to the `RateLimiter` when it is first created.
+    """
+    key = (provider.lower(), model)
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = RateLimiter(**kwargs)
+        return _rate_limiters[key]
+
+
+def rate_limit_provider(provider: Any, rate_limiter: RateLimiter) -> Any:
+    """routes the chat completions of a TruLens LLM provider through the limiter"""
+    if hasattr(provider, "_create_chat_completion"):
+        # providers are pydantic models, so bypass validation to override the
+        # method on this instance only. It isn't serialized with the provider.
+        object.__setattr__(
+            provider,
+            "_create_chat_completion",
+            rate_limiter.wrap(provider._create_chat_completion),
+        )
+    return provider
@@ -0,0 +1,64 @@
+import functools
+import inspect
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+_resources: Dict[Hashable, Any] = {}
+_build_locks: Dict[Hashable, threading.Lock] = {}
+_lock = threading.Lock()
+
+
+def cached_resource(func: Callable) -> Callable:
+    """
+    decorator for functions in recipe scripts that build expensive objects,
+    like embedding models or database sessions. The object is built once per
+    set of arguments and shared by every recipe and dataset in the process.
+    Arguments must be hashable.
+    """
+    # keyed by where the function is defined, so a script loaded again still
+    # finds the objects it built before
+    func_key = (func.__code__.co_filename, func.__qualname__)
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        # the same call gets the same key, whether arguments are passed by
+        # position, by name or left to their defaults
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = []
+        for name, value in bound.arguments.items():
+            if signature.parameters[name].kind == inspect.Parameter.VAR_KEYWORD:
+                value = tuple(sorted(value.items()))
+            arguments.append((name, value))
+        key: Tuple = (func_key, tuple(arguments))
+        try:
+            hash(key)
+        except TypeError:
+            raise ValueError(
+                f"Arguments to cached resource {func.__qualname__} must be hashable"
+            )
+
+        with _lock:
+            if key in _resources:
+                return _resources[key]
+            build_lock = _build_locks.setdefault(key, threading.Lock())
+
+        # other resources can be built meanwhile, but each is built only once
+        with build_lock:
+            with _lock:
+                if key in _resources:
+                    return _resources[key]
+            resource = func(*args, **kwargs)
+            with _lock:
+                _resources[key] = resource
+                _build_locks.pop(key, None)
+            return resource
+
+    return wrapper
+
+
+def clear_resources() -> None:
+    """forgets every cached resource, so they're built again on next use"""
+    with _lock:
+        _resources.clear()
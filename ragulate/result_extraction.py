@@ -0,0 +1,291 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from sqlalchemy import func, inspect, select
+from sqlalchemy.engine import Connection
+from trulens_eval.database.orm import make_orm_for_prefix
+
+from .logging_config import logger
+from .result_store import ResultStore
+from .utils import get_state_path
+
+try:
+    import pyarrow  # noqa: F401 - required by pandas to read and write parquet
+except ImportError:
+    pyarrow = None
+
+# bump when the layout of the cached snapshots changes
+_SNAPSHOT_VERSION = 2
+
+# feedback results that are no longer updated in place
+_FINAL_STATUS = "done"
+
+# how many ids to read by in a single statement
+_READ_BATCH_SIZE = 500
+
+RECORD_COLUMNS = ["record_id", "dataset", "ts", "latency", "total_tokens", "total_cost"]
+FEEDBACK_COLUMNS = [
+    "feedback_result_id",
+    "record_id",
+    "name",
+    "result",
+    "status",
+    "last_ts",
+]
+
+
+def _latency(perf_json: Optional[str]) -> float:
+    """the record latency in whole seconds, as TruLens reports it"""
+    try:
+        perf = json.loads(perf_json)
+        start = pd.Timestamp(perf["start_time"])
+        end = pd.Timestamp(perf["end_time"])
+    except (TypeError, ValueError, KeyError):
+        return np.nan
+    return float((end - start).seconds)
+
+
+def _tokens_and_cost(cost_json: Optional[str]) -> Tuple[int, float]:
+    try:
+        cost = json.loads(cost_json) or {}
+    except (TypeError, ValueError):
+        cost = {}
+    return cost.get("n_tokens", 0), cost.get("cost", 0.0)
+
+
+def _read_records(
+    connection: Connection, orm: Any, since_ts: Optional[float]
+) -> DataFrame:
+    """reads the few record columns needed for analysis, parsing their JSON"""
+    record = orm.Record
+    statement = select(
+        record.record_id, record.app_id, record.ts, record.perf_json, record.cost_json
+    )
+    if since_ts is not None:
+        statement = statement.where(record.ts >= since_ts)
+    rows = connection.execute(statement).fetchall()
+
+    costs = [_tokens_and_cost(row.cost_json) for row in rows]
+    return pd.DataFrame(
+        {
+            "record_id": [row.record_id for row in rows],
+            "dataset": [row.app_id for row in rows],
+            "ts": np.array([row.ts for row in rows], dtype=float),
+            "latency": np.array([_latency(row.perf_json) for row in rows], dtype=float),
+            "total_tokens": np.array([c[0] for c in costs], dtype=np.int64),
+            "total_cost": np.array([c[1] for c in costs], dtype=float),
+        },
+        columns=RECORD_COLUMNS,
+    )
+
+
+def _read_feedbacks(
+    connection: Connection,
+    orm: Any,
+    since_ts: Optional[float],
+    feedback_result_ids: Optional[List[str]] = None,
+) -> DataFrame:
+    """
+    reads feedback results, either all of them, those last updated since a
+    timestamp, or those with the given ids
+    """
+    feedback = orm.FeedbackResult
+    statement = select(
+        feedback.feedback_result_id,
+        feedback.record_id,
+        feedback.name,
+        feedback.result,
+        feedback.status,
+        feedback.last_ts,
+    )
+    if feedback_result_ids is not None:
+        rows = []
+        for i in range(0, len(feedback_result_ids), _READ_BATCH_SIZE):
+            batch = feedback_result_ids[i : i + _READ_BATCH_SIZE]
+            rows.extend(
+                connection.execute(
+                    statement.where(feedback.feedback_result_id.in_(batch))
+                ).fetchall()
+            )
+    else:
+        if since_ts is not None:
+            statement = statement.where(feedback.last_ts >= since_ts)
+        rows = connection.execute(statement).fetchall()
+    return pd.DataFrame([tuple(row) for row in rows], columns=FEEDBACK_COLUMNS).astype(
+        {"result": float, "status": str, "last_ts": float}
+    )
+
+
+def _summary(connection: Connection, orm: Any) -> Dict[str, Any]:
+    """
+    row counts and latest timestamps, which change whenever results are added.
+    Feedback results finish in place without a newer timestamp, so they're
+    also counted by status.
+    """
+    records = connection.execute(select(func.count(), func.max(orm.Record.ts))).one()
+    feedbacks = connection.execute(
+        select(func.count(), func.max(orm.FeedbackResult.last_ts))
+    ).one()
+    status_counts = connection.execute(
+        select(orm.FeedbackResult.status, func.count()).group_by(
+            orm.FeedbackResult.status
+        )
+    ).fetchall()
+    return {
+        "version": _SNAPSHOT_VERSION,
+        "record_count": records[0],
+        "max_record_ts": records[1],
+        "feedback_count": feedbacks[0],
+        "max_feedback_ts": feedbacks[1],
+        "feedback_status_counts": {
+            str(status): count for status, count in sorted(status_counts)
+        },
+    }
+
+
+class ResultSnapshot:
+    """
+    a compact parquet copy of the records and feedback results of a recipe,
+    kept in ragulate's state folder. It's refreshed by reading only the rows
+    written since the latest timestamps it holds, along with the feedback
+    results it holds that weren't done yet, and rebuilt from scratch when rows
+    were deleted. Without pyarrow installed, results are read from the
+    database every time.
+    """
+
+    def __init__(self, store: ResultStore):
+        self.store = store
+        self.orm = make_orm_for_prefix(table_prefix=store.table_prefix)
+        key = hashlib.blake2b(
+            f"{store.database_url}|{store.table_prefix}".encode(), digest_size=8
+        ).hexdigest()
+        self._base_path = get_state_path("results", f"{key}")
+
+    def _paths(self) -> Tuple[str, str, str]:
+        return (
+            f"{self._base_path}.records.parquet",
+            f"{self._base_path}.feedbacks.parquet",
+            f"{self._base_path}.json",
+        )
+
+    def _load(self) -> Optional[Tuple[Dict[str, Any], DataFrame, DataFrame]]:
+        records_path, feedbacks_path, summary_path = self._paths()
+        if pyarrow is None or not os.path.exists(summary_path):
+            return None
+        try:
+            with open(summary_path) as f:
+                summary = json.load(f)
+            records = pd.read_parquet(records_path)
+            feedbacks = pd.read_parquet(feedbacks_path)
+        except (OSError, ValueError):
+            return None
+        if summary.get("version") != _SNAPSHOT_VERSION:
+            return None
+        return summary, records, feedbacks
+
+    def _save(
+        self, summary: Dict[str, Any], records: DataFrame, feedbacks: DataFrame
+    ) -> None:
+        if pyarrow is None:
+            return
+        records_path, feedbacks_path, summary_path = self._paths()
+        records.to_parquet(records_path, index=False)
+        feedbacks.to_parquet(feedbacks_path, index=False)
+        # written last, so a partial save is never treated as valid
+        with open(f"{summary_path}.tmp", "w") as f:
+            json.dump(summary, f)
+        os.replace(f"{summary_path}.tmp", summary_path)
+
+    def read(self) -> Tuple[DataFrame, DataFrame]:
+        """returns the records and feedback results, refreshing the snapshot"""
+        engine = self.store.engine()
+        try:
+            if not inspect(engine).has_table(self.orm.Record.__tablename__):
+                return (
+                    pd.DataFrame(columns=RECORD_COLUMNS),
+                    pd.DataFrame(columns=FEEDBACK_COLUMNS),
+                )
+
+            with engine.connect() as connection:
+                summary = _summary(connection, self.orm)
+                cached = self._load()
+                if cached is not None and cached[0] == summary:
+                    return cached[1], cached[2]
+
+                records = feedbacks = None
+                if cached is not None:
+                    old_summary, old_records, old_feedbacks = cached
+                    records = pd.concat(
+                        [
+                            old_records,
+                            _read_records(
+                                connection, self.orm, old_summary["max_record_ts"]
+                            ),
+                        ],
+                        ignore_index=True,
+                    ).drop_duplicates("record_id", keep="last")
+                    # feedback results are updated in place as they finish,
+                    # keeping the timestamp of when they started. A slow one
+                    # can finish with an older timestamp than the latest.
+                    unfinished = old_feedbacks.loc[
+                        old_feedbacks["status"] != _FINAL_STATUS, "feedback_result_id"
+                    ].tolist()
+                    feedbacks = pd.concat(
+                        [
+                            old_feedbacks,
+                            _read_feedbacks(
+                                connection, self.orm, old_summary["max_feedback_ts"]
+                            ),
+                            _read_feedbacks(
+                                connection,
+                                self.orm,
+                                since_ts=None,
+                                feedback_result_ids=unfinished,
+                            ),
+                        ],
+                        ignore_index=True,
+                    ).drop_duplicates("feedback_result_id", keep="last")
+                    if (len(records), len(feedbacks)) != (
+                        summary["record_count"],
+                        summary["feedback_count"],
+                    ):
+                        logger.debug(
+                            f"Rebuilding the result snapshot of {self.store.recipe_name}"
+                        )
+                        records = feedbacks = None
+
+                if records is None:
+                    records = _read_records(connection, self.orm, since_ts=None)
+                    feedbacks = _read_feedbacks(connection, self.orm, since_ts=None)
+        finally:
+            engine.dispose()
+
+        records.reset_index(drop=True, inplace=True)
+        feedbacks.reset_index(drop=True, inplace=True)
+        self._save(summary=summary, records=records, feedbacks=feedbacks)
+        return records, feedbacks
+
+
+def extract_results(store: ResultStore) -> Tuple[DataFrame, List[str]]:
+    """
+    gets one row per record of a recipe, with the mean result of each
+    feedback as a metric column. Returns the frame and the metric names.
+    """
+    records, feedbacks = ResultSnapshot(store).read()
+
+    feedbacks = feedbacks.dropna(subset=["result"])
+    metric_values = feedbacks.pivot_table(
+        index="record_id", columns="name", values="result", aggfunc="mean"
+    )
+    metrics = [str(m) for m in metric_values.columns]
+
+    df = records.drop(columns=["ts"]).merge(
+        metric_values, how="left", left_on="record_id", right_index=True
+    )
+    df["recipe"] = store.recipe_name
+    return df, metrics
@@ -0,0 +1,132 @@
+import os
+import re
+from typing import Any, List, Optional
+
+from sqlalchemy import create_engine, delete, event, select
+from sqlalchemy.engine import Engine
+from trulens_eval import Tru
+
+from .utils import get_tru_db_path
+
+DATABASE_URL_ENV = "RAGULATE_DATABASE_URL"
+
+# how long sqlite connections wait on another writer's lock
+SQLITE_BUSY_TIMEOUT_MS = 60_000
+
+
+def _set_sqlite_pragmas(dbapi_connection: Any, _connection_record: Any) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL lets readers and a writer work at once, and the busy timeout
+        # makes concurrent writers wait instead of failing with "database is locked"
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    finally:
+        cursor.close()
+
+
+def configure_engine(engine: Engine) -> None:
+    """applies ragulate's connection settings to a database engine"""
+    if engine.dialect.name != "sqlite":
+        return
+    if not event.contains(engine, "connect", _set_sqlite_pragmas):
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+        # connections opened before the listener was added are re-created
+        engine.dispose()
+
+
+class ResultStore:
+    """
+    where the query results of a recipe are stored. By default each recipe
+    has its own sqlite file. A database url (passed in, or set with the
+    RAGULATE_DATABASE_URL environment variable) points every recipe at a
+    single shared database, such as a Postgres server, where each recipe's
+    tables get their own prefix. Within a recipe, results are scoped by app,
+    which is the dataset name.
+    """
+
+    recipe_name: str
+    database_url: str
+    table_prefix: str
+    shared: bool
+
+    def __init__(self, recipe_name: str, database_url: Optional[str] = None):
+        self.recipe_name = recipe_name
+        database_url = database_url or os.getenv(DATABASE_URL_ENV)
+        self.shared = database_url is not None
+        if self.shared:
+            self.database_url = database_url
+            slug = re.sub(r"[^0-9a-zA-Z]+", "_", recipe_name).strip("_").lower()
+            self.table_prefix = f"ragulate_{slug}_"
+        else:
+            self.database_url = f"sqlite:///{get_tru_db_path(recipe_name)}"
+            self.table_prefix = "trulens_"
+
+    @property
+    def progress_table(self) -> str:
+        """the name of the table ragulate tracks completed queries in"""
+        if self.shared:
+            return f"{self.table_prefix}progress"
+        return "ragulate_progress"
+
+    def tru(self) -> Tru:
+        Tru.RETRY_FAILED_SECONDS = 60
+        Tru.RETRY_RUNNING_SECONDS = 30
+        tru = Tru(
+            database_url=self.database_url,
+            database_prefix=self.table_prefix,
+            database_redact_keys=True,
+        )
+        configure_engine(tru.db.engine)
+        return tru
+
+    def engine(self) -> Engine:
+        """
+        creates an engine for reading the results directly, without starting
+        TruLens. Dispose of it when done.
+        """
+        engine = create_engine(self.database_url)
+        configure_engine(engine)
+        return engine
+
+    def prepare(self) -> None:
+        """
+        creates the TruLens and progress tables up front, so processes that
+        write results at the same time don't race to create them
+        """
+        from .pipelines.query_progress import QueryProgress
+
+        tru = self.tru()
+        try:
+            QueryProgress(engine=tru.db.engine, table_name=self.progress_table)
+        finally:
+            tru.delete_singleton()
+
+    def delete_records(self, tru: Tru, record_ids: List[str]) -> None:
+        """deletes records and their feedback results"""
+        orm = tru.db.orm
+        with tru.db.session.begin() as session:
+            session.execute(
+                delete(orm.FeedbackResult).where(
+                    orm.FeedbackResult.record_id.in_(record_ids)
+                )
+            )
+            session.execute(
+                delete(orm.Record).where(orm.Record.record_id.in_(record_ids))
+            )
+
+    def reset_app(self, tru: Tru, app_id: str) -> None:
+        """deletes the records, feedback results and definition of a single app"""
+        orm = tru.db.orm
+        record_ids = select(orm.Record.record_id).where(orm.Record.app_id == app_id)
+        with tru.db.session.begin() as session:
+            session.execute(
+                delete(orm.FeedbackResult).where(
+                    orm.FeedbackResult.record_id.in_(record_ids)
+                )
+            )
+            session.execute(delete(orm.Record).where(orm.Record.app_id == app_id))
+            session.execute(
+                delete(orm.AppDefinition).where(orm.AppDefinition.app_id == app_id)
+            )
@@ -0,0 +1,141 @@
+import glob
+import re
+import sqlite3
+from os import path
+from typing import List, Optional, Tuple
+
+from .logging_config import logger
+from .utils import get_tru_db_path, query_id
+
+Shard = Tuple[int, int]
+
+_SHARD_SUFFIX = re.compile(r"\.shard-(\d+)-of-(\d+)$")
+
+
+def parse_shard(value: str) -> Shard:
+    """parses a shard in `i/N` form, where `i` counts from 0"""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", value)
+    if match is None:
+        raise ValueError(f"Shard must be in the form `i/N`, got: {value}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or index >= count:
+        raise ValueError(f"Shard index must be between 0 and {count - 1}, got: {value}")
+    return index, count
+
+
+def in_shard(query: str, shard: Optional[Shard]) -> bool:
+    """checks if a query belongs to the shard, based on its stable query id"""
+    if shard is None:
+        return True
+    index, count = shard
+    return int(query_id(query), 16) % count == index
+
+
+def shard_recipe_name(recipe_name: str, shard: Optional[Shard]) -> str:
+    """the name a shard of a recipe stores its results under"""
+    if shard is None:
+        return recipe_name
+    index, count = shard
+    return f"{recipe_name}.shard-{index}-of-{count}"
+
+
+def find_shard_databases(recipe_name: str) -> List[str]:
+    """finds the databases written by shards of a recipe, ordered by shard"""
+    shards = []
+    pattern = get_tru_db_path(f"{glob.escape(recipe_name)}.shard-*-of-*")
+    for db_path in glob.glob(pattern):
+        name = path.basename(db_path)[: -len(".sqlite")]
+        match = _SHARD_SUFFIX.search(name)
+        if match is not None:
+            shards.append((int(match.group(2)), int(match.group(1)), db_path))
+    return [db_path for _count, _index, db_path in sorted(shards)]
+
+
+def _tables(connection: sqlite3.Connection, schema: str) -> List[str]:
+    rows = connection.execute(
+        f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    )
+    return [row[0] for row in rows if row[0] != "alembic_version"]
+
+
+def _columns(connection: sqlite3.Connection, schema: str, table: str) -> List[str]:
+    return [
+        row[1] for row in connection.execute(f'PRAGMA {schema}.table_info("{table}")')
+    ]
+
+
+def merge_databases(output_path: str, input_paths: List[str]) -> None:
+    """
+    merges the rows of sqlite databases with the same schema into
+    `output_path`, which is created from the first input if it doesn't exist.
+    Rows with the same primary key are replaced, so merging again after the
+    shards make more progress picks up their latest results.
+    """
+    if len(input_paths) == 0:
+        raise ValueError("No databases to merge")
+
+    if not path.exists(output_path):
+        # the backup API also copies data still in the shard's write-ahead log
+        source = sqlite3.connect(input_paths[0])
+        output = sqlite3.connect(output_path)
+        try:
+            source.backup(output)
+        finally:
+            source.close()
+            output.close()
+        input_paths = input_paths[1:]
+
+    connection = sqlite3.connect(output_path)
+    try:
+        output_tables = set(_tables(connection, "main"))
+        for input_path in input_paths:
+            connection.execute("ATTACH DATABASE ? AS shard", (input_path,))
+            try:
+                with connection:
+                    for table in _tables(connection, "shard"):
+                        if table not in output_tables:
+                            logger.warning(
+                                f"Skipping table {table} from {input_path}, which isn't in {output_path}"
+                            )
+                            continue
+                        output_columns = _columns(connection, "main", table)
+                        columns = ", ".join(
+                            f'"{c}"'
+                            for c in _columns(connection, "shard", table)
+                            if c in output_columns
+                        )
+                        connection.execute(
+                            f'INSERT OR REPLACE INTO main."{table}" ({columns}) SELECT {columns} FROM shard."{table}"'
+                        )
+            finally:
+                connection.execute("DETACH DATABASE shard")
+    finally:
+        connection.close()
+
+
+def merge_shards(recipe_name: str) -> List[str]:
+    """
+    merges the results of every shard of a recipe into the recipe's own
+    database, so they can be compared like an unsharded run. Returns the
+    merged shard databases.
+    """
+    shard_paths = find_shard_databases(recipe_name)
+    if len(shard_paths) == 0:
+        raise ValueError(f"Found no shard databases for recipe: {recipe_name}")
+
+    counts = set()
+    indexes = set()
+    for shard_path in shard_paths:
+        match = _SHARD_SUFFIX.search(path.basename(shard_path)[: -len(".sqlite")])
+        indexes.add(int(match.group(1)))
+        counts.add(int(match.group(2)))
+    if len(counts) > 1:
+        raise ValueError(
+            f"Shards of recipe {recipe_name} were split different ways: {sorted(counts)}"
+        )
+    missing = set(range(counts.pop())) - indexes
+    if len(missing) > 0:
+        logger.warning(f"Missing shards {sorted(missing)} of recipe {recipe_name}")
+
+    merge_databases(output_path=get_tru_db_path(recipe_name), input_paths=shard_paths)
+    return shard_paths
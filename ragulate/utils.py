@@ -1,15 +1,34 @@
+import hashlib
+import importlib
+import os
 import re
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List
 
-from trulens_eval import Tru
 
+def get_tru_db_path(recipe_name: str) -> str:
+    """returns the path of the recipe's TruLens database"""
+    return f"{recipe_name}.sqlite"
 
-def get_tru(recipe_name: str) -> Tru:
-    Tru.RETRY_FAILED_SECONDS = 60
-    Tru.RETRY_RUNNING_SECONDS = 30
-    return Tru(
-        database_url=f"sqlite:///{recipe_name}.sqlite", database_redact_keys=True
-    )  # , name=name)
+
+def get_state_path(*parts: str) -> str:
+    """returns a path inside ragulate's local state folder, creating its parent folders"""
+    state_path = os.path.join(os.getenv("RAGULATE_STATE_DIR", ".ragulate"), *parts)
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    return state_path
+
+
+def file_sha256(file_path: str) -> str:
+    """returns the sha256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def query_id(query: str) -> str:
+    """returns a stable id for a query's text"""
+    return hashlib.blake2b(query.encode("utf-8"), digest_size=16).hexdigest()
 
 
 def convert_vars_to_ingredients(
@@ -29,3 +48,19 @@ def convert_string(s):
         return float(s)
     else:
         return s
+
+
+def lazy_exports(package: str, exports: Dict[str, str]) -> Callable[[str], Any]:
+    """
+    returns a module `__getattr__` for a package, which imports each exported
+    name from its submodule on first use. Keeps importing the package cheap
+    when its submodules pull in heavy dependencies.
+    """
+
+    def __getattr__(name: str) -> Any:
+        if name not in exports:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        module = importlib.import_module(exports[name], package)
+        return getattr(module, name)
+
+    return __getattr__
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ragulate.analysis import Analysis
+
+
+class TestAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        rows = []
+        for recipe in ["a", "b"]:
+            for dataset in ["x", "y"]:
+                if (recipe, dataset) == ("b", "y"):
+                    continue
+                for _ in range(50):
+                    rows.append(
+                        {
+                            "recipe": recipe,
+                            "dataset": dataset,
+                            "groundedness": rng.random(),
+                            "answer_relevance": rng.random(),
+                        }
+                    )
+        self.df = pd.DataFrame(rows)
+        self.df.loc[3, "groundedness"] = None
+
+    def test_statistics_match_per_group_calculation(self):
+        metrics = ["groundedness", "answer_relevance"]
+        stats = Analysis().calculate_statistics(self.df, metrics)
+
+        self.assertEqual(len(stats), 2 * 2 * 2)
+        for (recipe, dataset), group in self.df.groupby(["recipe", "dataset"]):
+            for metric in metrics:
+                data = group[metric]
+                stat = stats.loc[(recipe, dataset, metric)]
+                self.assertAlmostEqual(stat["mean"], data.mean())
+                self.assertAlmostEqual(stat["median"], data.median())
+                self.assertAlmostEqual(stat["1st_quartile"], data.quantile(0.25))
+                self.assertAlmostEqual(stat["3rd_quartile"], data.quantile(0.75))
+                self.assertEqual(stat["count"], data.count())
+                self.assertLess(stat["ci_low"], stat["mean"])
+                self.assertGreater(stat["ci_high"], stat["mean"])
+
+        self.assertTrue(stats.loc[("b", "y", "groundedness")].isna().all())
+
+    def test_parallel_histograms_match_serial(self):
+        df = self.df.copy()
+        df["record_id"] = [str(i) for i in range(len(df))]
+        df["latency"] = 1.0
+        metrics = ["groundedness", "answer_relevance"]
+
+        images = []
+        for workers in [1, 2]:
+            with tempfile.TemporaryDirectory() as output_dir:
+                Analysis().output_histograms_by_dataset(
+                    df=df, metrics=metrics, output_dir=output_dir, workers=workers
+                )
+                files = sorted(os.listdir(output_dir))
+                self.assertEqual(
+                    files, ["x_histogram_grid.png", "y_histogram_grid.png"]
+                )
+                images.append(
+                    [open(os.path.join(output_dir, f), "rb").read() for f in files]
+                )
+        self.assertEqual(images[0], images[1])
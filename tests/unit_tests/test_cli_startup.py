@@ -0,0 +1,62 @@
+import json
+import statistics
+import subprocess
+import sys
+import unittest
+
+# generous, so the check isn't flaky on slow machines. Importing every
+# dependency up front took several seconds.
+STARTUP_BUDGET_SECONDS = 1.5
+
+HEAVY_MODULES = [
+    "aiohttp",
+    "llama_index",
+    "matplotlib",
+    "pandas",
+    "plotly",
+    "seaborn",
+    "setuptools",
+    "trulens_eval",
+]
+
+# runs in a fresh interpreter, so modules imported by other tests don't count
+STARTUP_SCRIPT = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+from ragulate.cli import build_parser
+
+build_parser().parse_args(sys.argv[1:])
+print(json.dumps({"seconds": time.perf_counter() - start, "modules": list(sys.modules)}))
+"""
+
+
+def measure_startup(*args: str):
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, *args],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestCliStartup(unittest.TestCase):
+
+    def test_commands_do_not_import_heavy_dependencies(self):
+        for args in [
+            ["download", "PaulGrahamEssayDataset", "-k", "llama"],
+            ["compare", "-r", "a", "-r", "b"],
+            ["query", "-n", "a", "-s", "a.py", "-m", "a", "--dataset", "a"],
+            ["run", "config.yaml"],
+        ]:
+            modules = {m.split(".")[0] for m in measure_startup(*args)["modules"]}
+            self.assertEqual(modules & set(HEAVY_MODULES), set(), args)
+
+    def test_startup_time(self):
+        seconds = statistics.median(
+            measure_startup("merge", "-r", "a")["seconds"] for _ in range(3)
+        )
+        self.assertLess(seconds, STARTUP_BUDGET_SECONDS)
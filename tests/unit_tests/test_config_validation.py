@@ -91,6 +91,26 @@ class TestConfigValidation(unittest.TestCase):
         self.assertIn("chunk_size", chunk_size_1000.ingredients)
         self.assertEqual(chunk_size_1000.ingredients["chunk_size"], 1000)
 
+    def test_limits_must_be_positive(self):
+        for options in [
+            {"query_options": {"rate_limit": 0}},
+            {"evaluation_options": {"rate_limit": 0}},
+            {"evaluation_options": {"token_limit": 0.5}},
+        ]:
+            config = {
+                "version": 0.1,
+                "steps": {
+                    "query": [
+                        {"name": "minimal", "script": "minimal.py", "method": "query"}
+                    ],
+                },
+                "recipes": [{"query": "minimal"}],
+                "datasets": ["blockchain_solana"],
+                **options,
+            }
+            parser = ConfigParser(config_schema=ConfigSchema_0_1(), config=config)
+            self.assertFalse(parser.is_valid, options)
+
     def test_minimal_config(self):
         config = {
             "version": 0.1,
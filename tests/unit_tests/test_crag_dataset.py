@@ -0,0 +1,86 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from ragulate.datasets import CragDataset
+
+QUESTION_TYPES = ["simple", "comparison", "multi-hop", "set"]
+
+
+class TestCragDataset(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dataset = CragDataset(
+            dataset_name="task_1", root_storage_path=self.tmp_dir.name
+        )
+        os.makedirs(self.dataset.storage_path())
+
+        self.rows = []
+        for i in range(200):
+            row = {
+                "query": f"question {i}?",
+                "answer": f"answer {i}",
+                "question_type": QUESTION_TYPES[i % len(QUESTION_TYPES)],
+            }
+            if i % 17 == 0:
+                row["answer"] = None
+            self.rows.append(row)
+
+        with open(self.dataset._questions_path(), "w") as f:
+            for row in self.rows:
+                f.write(json.dumps(row) + "\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _expected(self, subsets):
+        return [
+            row
+            for row in self.rows
+            if row["answer"] is not None
+            and (len(subsets) == 0 or row["question_type"] in subsets)
+        ]
+
+    def test_subsets_are_read_from_the_index(self):
+        for subsets in [[], ["multi-hop"], ["simple", "set"]]:
+            self.dataset.subsets = subsets
+            queries, golden_set = self.dataset.get_queries_and_golden_set()
+
+            expected = self._expected(subsets)
+            self.assertEqual(queries, [row["query"] for row in expected])
+            self.assertEqual(
+                golden_set,
+                [
+                    {"query": row["query"], "response": row["answer"]}
+                    for row in expected
+                ],
+            )
+        self.assertTrue(os.path.exists(self.dataset._question_index_path()))
+
+    def test_sampling_matches_sampling_the_full_list(self):
+        self.dataset.subsets = ["comparison", "set"]
+        queries, golden_set = self.dataset.get_sampled_queries_and_golden_set(
+            sample_percent=0.3, seed=42
+        )
+
+        expected = [row["query"] for row in self._expected(self.dataset.subsets)]
+        random.seed(42)
+        indices = random.sample(range(len(expected)), int(0.3 * len(expected)))
+        self.assertEqual(queries, [expected[i] for i in indices])
+        self.assertEqual([g["query"] for g in golden_set], queries)
+
+    def test_index_is_rebuilt_when_questions_change(self):
+        self.dataset.get_queries_and_golden_set()
+        with open(self.dataset._questions_path(), "a") as f:
+            f.write(
+                json.dumps(
+                    {"query": "new?", "answer": "yes", "question_type": "simple"}
+                )
+                + "\n"
+            )
+
+        queries, _golden_set = self.dataset.get_queries_and_golden_set()
+        self.assertEqual(queries[-1], "new?")
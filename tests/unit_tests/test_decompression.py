@@ -0,0 +1,81 @@
+import bz2
+import gzip
+import os
+import tempfile
+import unittest
+
+from ragulate.datasets.decompression import (
+    _ParallelBz2Decoder,
+    decompress_file,
+    detect_codec,
+    zstandard,
+)
+
+CONTENT = bytes(range(256)) * 4096  # 1 MiB
+PIECES = [CONTENT[i : i + 100_000] for i in range(0, len(CONTENT), 100_000)]
+
+
+class TestDecompression(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.tmp_dir.name, "file.compressed")
+        self.output_path = os.path.join(self.tmp_dir.name, "file.bin")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _decompress(self, compressed, **kwargs):
+        with open(self.input_path, "wb") as f:
+            f.write(compressed)
+        decompress_file(
+            input_file_path=self.input_path,
+            output_file_path=self.output_path,
+            read_buffer_size=4096,
+            **kwargs,
+        )
+        with open(self.output_path, "rb") as f:
+            return f.read()
+
+    def test_codecs_are_detected(self):
+        self.assertEqual(self._decompress(bz2.compress(CONTENT)), CONTENT)
+        self.assertEqual(
+            self._decompress(b"".join(gzip.compress(p) for p in PIECES)), CONTENT
+        )
+        if zstandard is not None:
+            compressor = zstandard.ZstdCompressor()
+            self.assertEqual(
+                self._decompress(b"".join(compressor.compress(p) for p in PIECES)),
+                CONTENT,
+            )
+
+        with self.assertRaises(ValueError):
+            detect_codec(b"PK\x03\x04")
+
+    def test_truncated_data_raises(self):
+        with self.assertRaises(ValueError):
+            self._decompress(gzip.compress(CONTENT)[:-100])
+
+    def _decode_in_parallel(self, compressed):
+        decoder = _ParallelBz2Decoder(workers=2, piece_size=50_000)
+        output = []
+        for i in range(0, len(compressed), 4096):
+            output.append(decoder.decode(compressed[i : i + 4096]))
+        output.append(decoder.finish())
+        return b"".join(output), decoder
+
+    def test_multi_stream_bz2_is_decoded_in_parallel(self):
+        output, decoder = self._decode_in_parallel(
+            b"".join(bz2.compress(p) for p in PIECES)
+        )
+
+        self.assertEqual(output, CONTENT)
+        self.assertIsNone(decoder._serial)
+
+    def test_single_stream_bz2_falls_back_to_serial(self):
+        # random bytes don't compress, so the stream spans several pieces
+        content = os.urandom(300_000)
+        output, decoder = self._decode_in_parallel(bz2.compress(content))
+
+        self.assertEqual(output, content)
+        self.assertIsNotNone(decoder._serial)
@@ -0,0 +1,145 @@
+import asyncio
+import bz2
+import os
+import tempfile
+import unittest
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from ragulate.datasets.download import download_and_decompress, download_file
+
+CONTENT = bytes(range(256)) * 4096  # 1 MiB
+# two concatenated streams, like files written by parallel bz2 compressors
+COMPRESSED = bz2.compress(CONTENT[:300_000]) + bz2.compress(CONTENT[300_000:])
+
+
+class TestDownload(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.tmp_dir.name, "file.bin")
+        self.range_requests = []
+        self.fail_after = None
+        self.accept_ranges = True
+        self.compressed = COMPRESSED
+
+        app = web.Application()
+        app.router.add_route("HEAD", "/file.bin", self._head)
+        app.router.add_get("/file.bin", self._get, allow_head=False)
+        app.router.add_get("/file.bin.bz2", self._get_compressed)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.session = aiohttp.ClientSession()
+        self.url = str(self.server.make_url("/file.bin"))
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.server.close()
+        self.tmp_dir.cleanup()
+
+    def _headers(self):
+        headers = {"Content-Length": str(len(CONTENT)), "ETag": '"v1"'}
+        if self.accept_ranges:
+            headers["Accept-Ranges"] = "bytes"
+        return headers
+
+    async def _head(self, request):
+        return web.Response(headers=self._headers())
+
+    async def _get(self, request):
+        range_header = request.headers.get("Range")
+        if range_header is None or not self.accept_ranges:
+            return web.Response(body=CONTENT)
+
+        start, end = [int(p) for p in range_header[len("bytes=") :].split("-")]
+        self.range_requests.append((start, end))
+        body = CONTENT[start : end + 1]
+        response = web.StreamResponse(
+            status=206,
+            headers={
+                "Content-Range": f"bytes {start}-{end}/{len(CONTENT)}",
+                "Content-Length": str(len(body)),
+            },
+        )
+        await response.prepare(request)
+        if self.fail_after is not None:
+            # drop the connection part way through the segment
+            await response.write(body[: self.fail_after])
+            await asyncio.sleep(0.1)
+            request.transport.close()
+            return response
+        await response.write(body)
+        await response.write_eof()
+        return response
+
+    async def _get_compressed(self, request):
+        return web.Response(body=self.compressed)
+
+    async def _download(self):
+        await download_file(
+            session=self.session,
+            url=self.url,
+            output_file_path=self.output_path,
+            chunk_size=4096,
+            segments=4,
+            min_segment_size=64 * 1024,
+        )
+
+    def _read_output(self):
+        with open(self.output_path, "rb") as f:
+            return f.read()
+
+    async def test_downloads_in_parallel_segments(self):
+        await self._download()
+
+        self.assertEqual(self._read_output(), CONTENT)
+        self.assertEqual(len(self.range_requests), 4)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["file.bin"])
+
+    async def test_interrupted_download_resumes(self):
+        self.fail_after = 100_000
+        with self.assertRaises(aiohttp.ClientError):
+            await self._download()
+        self.assertFalse(os.path.exists(self.output_path))
+        self.assertTrue(os.path.exists(self.output_path + ".part.json"))
+
+        self.fail_after = None
+        self.range_requests = []
+        await self._download()
+
+        self.assertEqual(self._read_output(), CONTENT)
+        # every segment resumes past the bytes it already had
+        self.assertTrue(
+            all(start % (256 * 1024) > 0 for start, _ in self.range_requests),
+        )
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["file.bin"])
+
+    async def test_downloads_without_range_support(self):
+        self.accept_ranges = False
+        await self._download()
+
+        self.assertEqual(self._read_output(), CONTENT)
+        self.assertEqual(self.range_requests, [])
+
+    async def _download_and_decompress(self):
+        await download_and_decompress(
+            session=self.session,
+            url=str(self.server.make_url("/file.bin.bz2")),
+            output_file_path=self.output_path,
+            chunk_size=4096,
+        )
+
+    async def test_decompresses_while_streaming(self):
+        await self._download_and_decompress()
+
+        self.assertEqual(self._read_output(), CONTENT)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["file.bin"])
+
+    async def test_corrupt_stream_leaves_no_output(self):
+        self.compressed = COMPRESSED[:1000] + b"\0" * 1000 + COMPRESSED[2000:]
+        with self.assertRaises(OSError):
+            await self._download_and_decompress()
+
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
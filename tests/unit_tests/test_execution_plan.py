@@ -0,0 +1,97 @@
+import os
+import tempfile
+import textwrap
+import unittest
+
+from ragulate.pipelines import ExecutionPlan, IngestPipeline, QueryPipeline, Scheduler
+
+RECIPE_SCRIPT = textwrap.dedent(
+    """
+    def ingest(file_path, chunk_size, overlap=10, **extra):
+        pass
+
+    def query(chunk_size, k, **kwargs):
+        pass
+    """
+)
+
+
+class TestExecutionPlan(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.script_path = tempfile.mkstemp(suffix=".py")
+        with os.fdopen(fd, "w") as f:
+            f.write(RECIPE_SCRIPT)
+
+    def tearDown(self):
+        os.remove(self.script_path)
+
+    def _add_recipe(self, plan: ExecutionPlan, name: str, **ingredients):
+        ingest_pipeline = IngestPipeline(
+            recipe_name=name,
+            script_path=self.script_path,
+            method_name="ingest",
+            ingredients=ingredients,
+            datasets=[],
+        )
+        query_pipeline = QueryPipeline(
+            recipe_name=name,
+            script_path=self.script_path,
+            method_name="query",
+            ingredients=ingredients,
+            datasets=[],
+        )
+        plan.add_recipe(ingest_pipeline=ingest_pipeline, query_pipeline=query_pipeline)
+        return ingest_pipeline
+
+    def test_ingest_ingredients_ignore_unconsumed_params(self):
+        plan = ExecutionPlan()
+        ingest_pipeline = self._add_recipe(plan, "a", chunk_size=100, k=2)
+
+        self.assertEqual(ingest_pipeline.ingredients, {"chunk_size": 100})
+
+    def test_recipes_share_ingest_steps(self):
+        plan = ExecutionPlan()
+        for chunk_size in [100, 200]:
+            for k in [2, 5, 10]:
+                self._add_recipe(
+                    plan, f"chunk_size_{chunk_size}_k_{k}", chunk_size=chunk_size, k=k
+                )
+
+        self.assertEqual(len(plan.steps), 2)
+        for step in plan.steps:
+            self.assertEqual(len(step.query_pipelines), 3)
+            chunk_size = step.ingest_pipeline.ingredients["chunk_size"]
+            for query_pipeline in step.query_pipelines:
+                self.assertEqual(query_pipeline.ingredients["chunk_size"], chunk_size)
+
+    def test_duplicate_queries_are_dropped(self):
+        plan = ExecutionPlan()
+        self._add_recipe(plan, "a", chunk_size=100, k=2)
+        self._add_recipe(plan, "b", chunk_size=100, k=2)
+
+        self.assertEqual(len(plan.steps), 1)
+        self.assertEqual(len(plan.steps[0].query_pipelines), 1)
+
+    def test_queries_depend_on_their_ingest(self):
+        plan = ExecutionPlan()
+        for chunk_size in [100, 200]:
+            for k in [2, 5]:
+                self._add_recipe(
+                    plan, f"chunk_size_{chunk_size}_k_{k}", chunk_size=chunk_size, k=k
+                )
+
+        scheduler = Scheduler(parallelism=2)
+        download = scheduler.add_task("download", "download", lambda: None)
+        query_tasks = plan.add_tasks(scheduler=scheduler, dependencies=[download])
+
+        self.assertEqual(len(scheduler.tasks), 1 + 2 + 4)
+        self.assertEqual(len(query_tasks), 4)
+        for task in query_tasks:
+            (ingest_task,) = task.dependencies
+            self.assertEqual(ingest_task.kind, "ingest")
+            self.assertEqual(ingest_task.dependencies, [download])
+            self.assertEqual(
+                ingest_task.func.__self__.ingredients["chunk_size"],
+                task.func.__self__.ingredients["chunk_size"],
+            )
@@ -0,0 +1,49 @@
+import unittest
+
+from ragulate.pipelines.golden_set import GoldenSetIndex
+
+GOLDEN_SET = [
+    {"query": "Who invented the lightbulb?", "response": "Thomas Edison"},
+    {"query": "What is  the capital of France?", "response": "Paris"},
+    {"query": "is it?", "response": "yes"},
+    {"query": "is it!", "response": "no"},
+]
+
+
+class TestGoldenSetIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = GoldenSetIndex()
+        self.index.add(GOLDEN_SET, namespace="first")
+        self.index.add(
+            [{"query": "Who invented the lightbulb?", "response": "Joseph Swan"}],
+            namespace="second",
+        )
+
+    def test_queries_are_normalized(self):
+        self.assertEqual(
+            self.index.lookup("who invented the lightbulb?", namespace="first"),
+            "Thomas Edison",
+        )
+        self.assertEqual(
+            self.index.lookup(" What is the Capital of France? ", namespace="first"),
+            "Paris",
+        )
+        self.assertIsNone(self.index.lookup("Who painted it?", namespace="first"))
+
+    def test_near_duplicates_fall_back_unless_ambiguous(self):
+        self.assertEqual(
+            self.index.lookup("What is the capital of France", namespace="first"),
+            "Paris",
+        )
+        self.assertEqual(self.index.lookup("is it!", namespace="first"), "no")
+        self.assertIsNone(self.index.lookup("is it", namespace="first"))
+
+    def test_namespaces_are_separate(self):
+        self.assertEqual(
+            self.index.lookup("Who invented the lightbulb?", namespace="second"),
+            "Joseph Swan",
+        )
+        self.assertIsNone(
+            self.index.lookup("What is the capital of France?", namespace="second")
+        )
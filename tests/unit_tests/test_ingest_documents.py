@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+import textwrap
+import unittest
+from unittest import mock
+
+from ragulate.datasets import CragDataset
+from ragulate.pipelines import IngestPipeline
+
+RECIPE_SCRIPT = textwrap.dedent(
+    """
+    import json
+
+    def ingest(documents, output_path):
+        with open(output_path, "a") as f:
+            f.write(json.dumps([d["page_url"] for d in documents]) + "\\n")
+
+    def ingest_html(html_documents, output_path):
+        with open(output_path, "a") as f:
+            f.write(json.dumps([d["page_result"] for d in html_documents]) + "\\n")
+
+    def ingest_files(file_path, output_path):
+        pass
+    """
+)
+
+
+class TestIngestDocuments(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        env = mock.patch.dict(
+            os.environ, {"RAGULATE_STATE_DIR": self.tmp_dir.name + "/state"}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+        self.script_path = os.path.join(self.tmp_dir.name, "recipe.py")
+        with open(self.script_path, "w") as f:
+            f.write(RECIPE_SCRIPT)
+        self.output_path = os.path.join(self.tmp_dir.name, "ingested.jsonl")
+
+        self.dataset = CragDataset(
+            dataset_name="task_1", root_storage_path=self.tmp_dir.name
+        )
+        os.makedirs(self.dataset.storage_path())
+        for kind, content in [("parsed", "content of"), ("html", "<p>html of")]:
+            with open(
+                os.path.join(self.dataset.storage_path(), f"{kind}_documents.jsonl"),
+                "w",
+            ) as f:
+                for interaction_id in range(5):
+                    for page in range(5):
+                        # every question retrieves page 0, so it is a duplicate
+                        page_url = f"https://example.com/{interaction_id * page}"
+                        document = {
+                            "interaction_id": str(interaction_id),
+                            "page_url": page_url,
+                            "page_result": f"{content} {page_url}",
+                        }
+                        f.write(json.dumps(document) + "\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _ingest(self, method_name="ingest", **kwargs):
+        pipeline = IngestPipeline(
+            recipe_name="docs",
+            script_path=self.script_path,
+            method_name=method_name,
+            ingredients={"output_path": self.output_path},
+            datasets=[self.dataset],
+            batch_size=3,
+            **kwargs,
+        )
+        pipeline.ingest()
+
+    def _ingested_batches(self):
+        if not os.path.exists(self.output_path):
+            return []
+        with open(self.output_path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_documents_are_deduped_and_batched(self):
+        self._ingest(workers=2)
+
+        batches = self._ingested_batches()
+        urls = [url for batch in batches for url in batch]
+        self.assertEqual(len(urls), len(set(urls)))
+        self.assertEqual(
+            set(urls),
+            {f"https://example.com/{i * p}" for i in range(5) for p in range(5)},
+        )
+        self.assertTrue(all(len(batch) <= 3 for batch in batches))
+
+    def test_ingested_documents_are_skipped_unless_forced(self):
+        self._ingest()
+        first_count = len(self._ingested_batches())
+
+        self._ingest()
+        self.assertEqual(len(self._ingested_batches()), first_count)
+
+        self._ingest(force=True)
+        self.assertEqual(len(self._ingested_batches()), first_count * 2)
+
+    def test_html_documents_are_streamed(self):
+        self._ingest(method_name="ingest_html")
+
+        contents = [c for batch in self._ingested_batches() for c in batch]
+        self.assertEqual(len(contents), len(set(contents)))
+        self.assertEqual(
+            set(contents),
+            {
+                f"<p>html of https://example.com/{i * p}"
+                for i in range(5)
+                for p in range(5)
+            },
+        )
+
+    def test_file_ingest_of_streamed_dataset_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self._ingest(method_name="ingest_files")
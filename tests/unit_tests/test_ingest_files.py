@@ -0,0 +1,275 @@
+import os
+import tempfile
+import textwrap
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict
+from unittest import mock
+
+from ragulate.datasets import LlamaDataset
+from ragulate.pipelines import IngestPipeline
+from ragulate.pipelines.ingest_manifest import IngestManifest
+
+# set to the name of a source file the recipe fails to ingest
+FAIL_ON_ENV = "RAGULATE_TEST_FAIL_ON"
+# set to fail the third file the slow ingest methods start, and hold the files
+# started after it until the test opens their gate
+FAIL_THIRD_ENV = "RAGULATE_TEST_FAIL_THIRD"
+
+RECIPE_SCRIPT = textwrap.dedent(
+    """
+    import asyncio
+    import os
+    import time
+
+    def ingest(file_path, output_path):
+        if os.path.basename(file_path) == os.getenv("RAGULATE_TEST_FAIL_ON"):
+            raise RuntimeError(f"can't ingest {file_path}")
+        with open(output_path, "a") as f:
+            f.write(os.path.basename(file_path) + "\\n")
+
+    def _start(file_path, output_path):
+        # marks the file as running, and returns how many files are running
+        # and the order it was started in
+        name = os.path.basename(file_path)
+        os.makedirs(f"{output_path}.running", exist_ok=True)
+        open(os.path.join(f"{output_path}.running", name), "w").close()
+        running = len(os.listdir(f"{output_path}.running"))
+
+        os.makedirs(f"{output_path}.started", exist_ok=True)
+        started = 1
+        while True:
+            try:
+                fd = os.open(
+                    f"{output_path}.started/{started}",
+                    os.O_CREAT | os.O_EXCL | os.O_WRONLY,
+                )
+            except FileExistsError:
+                started += 1
+                continue
+            os.write(fd, name.encode())
+            os.close(fd)
+            return running, started
+
+    def _gated(output_path, started):
+        # with RAGULATE_TEST_FAIL_THIRD set, the third file started fails, and
+        # the files started after it wait for the test to open the gate
+        if not os.getenv("RAGULATE_TEST_FAIL_THIRD") or started < 3:
+            return False
+        if started == 3:
+            raise RuntimeError("can't ingest the third file")
+        return not os.path.exists(f"{output_path}.gate")
+
+    def _finish(file_path, output_path, running):
+        name = os.path.basename(file_path)
+        os.remove(os.path.join(f"{output_path}.running", name))
+        with open(output_path, "a") as f:
+            f.write(f"{name}\\n")
+        with open(f"{output_path}.concurrency", "a") as f:
+            f.write(f"{running}\\n")
+
+    def slow_ingest(file_path, output_path):
+        running, started = _start(file_path, output_path)
+        time.sleep(0.05)
+        while _gated(output_path, started):
+            time.sleep(0.01)
+        _finish(file_path, output_path, running)
+
+    async def slow_ingest_async(file_path, output_path):
+        running, started = _start(file_path, output_path)
+        await asyncio.sleep(0.05)
+        while _gated(output_path, started):
+            await asyncio.sleep(0.01)
+        _finish(file_path, output_path, running)
+    """
+)
+
+SOURCE_FILES = sorted(f"file_{i}.txt" for i in range(12))
+
+# the slow ingest methods and executors that ingest several files at once
+POOL_INGESTS = [
+    ("slow_ingest", "thread"),
+    ("slow_ingest", "process"),
+    ("slow_ingest_async", "thread"),
+]
+
+
+class TestIngestFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        env = mock.patch.dict(
+            os.environ, {"RAGULATE_STATE_DIR": self.tmp_dir.name + "/state"}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+        self.script_path = os.path.join(self.tmp_dir.name, "recipe.py")
+        with open(self.script_path, "w") as f:
+            f.write(RECIPE_SCRIPT)
+        self.output_path = os.path.join(self.tmp_dir.name, "ingested.txt")
+
+        self.dataset = LlamaDataset(
+            dataset_name="Files", root_storage_path=self.tmp_dir.name
+        )
+        source_path = os.path.join(self.dataset._get_dataset_path(), "source_files")
+        os.makedirs(source_path)
+        for name in SOURCE_FILES:
+            with open(os.path.join(source_path, name), "w") as f:
+                f.write(f"content of {name}")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _pipeline(self, **kwargs) -> IngestPipeline:
+        return IngestPipeline(
+            recipe_name="files",
+            script_path=self.script_path,
+            method_name=kwargs.pop("method_name", "ingest"),
+            ingredients={"output_path": self.output_path},
+            datasets=[self.dataset],
+            **kwargs,
+        )
+
+    def _ingest(self, **kwargs):
+        self._pipeline(**kwargs).ingest()
+
+    def _ingested_files(self):
+        if not os.path.exists(self.output_path):
+            return []
+        with open(self.output_path) as f:
+            return sorted(line.strip() for line in f)
+
+    def _marked_files(self, pipeline: IngestPipeline):
+        manifest = IngestManifest()
+        try:
+            return sorted(
+                os.path.basename(f)
+                for f in self.dataset.get_source_file_paths()
+                if manifest.is_ingested(pipeline.manifest_key(), f)
+            )
+        finally:
+            manifest.close()
+
+    def test_unchanged_files_are_skipped(self):
+        self._ingest()
+        self.assertEqual(self._ingested_files(), SOURCE_FILES)
+
+        self._ingest()
+        self.assertEqual(self._ingested_files(), SOURCE_FILES)
+
+    def test_forced_ingest_ingests_every_file_again(self):
+        self._ingest()
+        self._ingest(force=True)
+        self.assertEqual(self._ingested_files(), sorted(SOURCE_FILES * 2))
+
+    def test_edited_files_and_scripts_are_ingested_again(self):
+        self._ingest()
+
+        edited_file = self.dataset.get_source_file_paths()[0]
+        with open(edited_file, "a") as f:
+            f.write(" and more")
+        self._ingest()
+        self.assertEqual(len(self._ingested_files()), len(SOURCE_FILES) + 1)
+
+        with open(self.script_path, "a") as f:
+            f.write("# edited\n")
+        self._ingest()
+        self.assertEqual(
+            self._ingested_files(),
+            sorted(SOURCE_FILES * 2 + [os.path.basename(edited_file)]),
+        )
+
+    def test_failed_files_are_not_marked_ingested(self):
+        with mock.patch.dict(os.environ, {FAIL_ON_ENV: SOURCE_FILES[3]}):
+            with self.assertRaises(RuntimeError):
+                self._ingest()
+        pipeline = self._pipeline()
+        self.assertNotIn(SOURCE_FILES[3], self._marked_files(pipeline))
+        self.assertEqual(self._marked_files(pipeline), self._ingested_files())
+
+        pipeline.ingest()
+        self.assertEqual(self._ingested_files(), SOURCE_FILES)
+        self.assertEqual(self._marked_files(pipeline), SOURCE_FILES)
+
+    def _max_concurrency(self):
+        with open(f"{self.output_path}.concurrency") as f:
+            return max(int(line) for line in f)
+
+    def _started_files(self) -> Dict[int, str]:
+        """the name of each started file, by the order it was started in"""
+        started = {}
+        for order in os.listdir(f"{self.output_path}.started"):
+            with open(os.path.join(f"{self.output_path}.started", order)) as f:
+                started[int(order)] = f.read()
+        return started
+
+    @contextmanager
+    def _gate_opened_on_shutdown(self):
+        """opens the gate of the held files once the ingest pool shuts down"""
+        gate_path = f"{self.output_path}.gate"
+        thread_shutdown = ThreadPoolExecutor.shutdown
+        process_shutdown = ProcessPoolExecutor.shutdown
+
+        def shutdown_threads(pool, wait=True, *, cancel_futures=False):
+            # the files that haven't started are cancelled before the held
+            # ones free their threads
+            thread_shutdown(pool, wait=False, cancel_futures=cancel_futures)
+            open(gate_path, "w").close()
+            thread_shutdown(pool, wait=wait)
+
+        def shutdown_processes(pool, wait=True, *, cancel_futures=False):
+            # process pools cancel their files in a background thread, which
+            # would wait on the held files
+            open(gate_path, "w").close()
+            process_shutdown(pool, wait=wait, cancel_futures=cancel_futures)
+
+        try:
+            with mock.patch.object(
+                ThreadPoolExecutor, "shutdown", shutdown_threads
+            ), mock.patch.object(ProcessPoolExecutor, "shutdown", shutdown_processes):
+                yield
+        finally:
+            # async ingests cancel their held files without shutting down a pool
+            open(gate_path, "w").close()
+
+    def _use_output(self, method_name, executor):
+        self.output_path = os.path.join(
+            self.tmp_dir.name, f"{method_name}_{executor}.txt"
+        )
+
+    def test_concurrent_ingests_are_limited_to_the_workers(self):
+        for method_name, executor in POOL_INGESTS:
+            with self.subTest(method_name=method_name, executor=executor):
+                self._use_output(method_name, executor)
+                self._ingest(method_name=method_name, executor=executor, workers=3)
+
+                self.assertEqual(self._ingested_files(), SOURCE_FILES)
+                self.assertLessEqual(self._max_concurrency(), 3)
+                if executor == "thread":
+                    # process workers may start too slowly to overlap
+                    self.assertGreater(self._max_concurrency(), 1)
+
+    def test_failed_ingest_cancels_the_remaining_files(self):
+        for method_name, executor in POOL_INGESTS:
+            with self.subTest(method_name=method_name, executor=executor):
+                self._use_output(method_name, executor)
+                pipeline = self._pipeline(
+                    method_name=method_name, executor=executor, workers=2
+                )
+                with mock.patch.dict(os.environ, {FAIL_THIRD_ENV: "1"}):
+                    with self._gate_opened_on_shutdown():
+                        with self.assertRaises(RuntimeError):
+                            pipeline.ingest()
+
+                # the files held until the ingest failed may have finished
+                # since, but only files that finished before it are marked
+                started = self._started_files()
+                self.assertLessEqual(
+                    set(self._marked_files(pipeline)), {started[1], started[2]}
+                )
+                if executor == "thread":
+                    # once the third file fails, each worker is held by the
+                    # next file it starts, and every other file is cancelled
+                    self.assertLessEqual(len(started), 5)
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import time
+import unittest
+from functools import partial
+
+from ragulate.pipelines.job_queue import DONE, FAILED, PENDING, RUNNING, JobQueue
+from ragulate.pipelines.workers import WorkerPool
+
+
+def _touch(path: str) -> None:
+    with open(path, "a") as f:
+        f.write("x")
+
+
+def _crash_once(path: str) -> None:
+    """kills its worker the first time it runs"""
+    if not os.path.exists(path):
+        _touch(path)
+        os._exit(1)
+    _touch(path)
+
+
+def _fail() -> None:
+    raise RuntimeError("boom")
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "jobs.sqlite")
+        self.queue = JobQueue(db_path=self.db_path, max_attempts=2)
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmp_dir.cleanup()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_jobs_are_claimed_once_in_order(self):
+        for name in ["a", "b"]:
+            self.queue.add(name=name, func=partial(_touch, self._path(name)))
+
+        a = self.queue.claim(worker_id="w1")
+        b = self.queue.claim(worker_id="w2")
+        self.assertEqual([a.name, b.name], ["a", "b"])
+        self.assertIsNone(self.queue.claim(worker_id="w3"))
+
+        a.func()
+        self.assertTrue(os.path.exists(self._path("a")))
+        self.queue.complete(job_id=a.job_id, worker_id="w1")
+        self.assertEqual(self.queue.counts(), {DONE: 1, RUNNING: 1})
+        self.assertEqual(self.queue.unfinished(), 1)
+
+    def test_failed_jobs_are_retried(self):
+        self.queue.add(name="a", func=_fail)
+        for attempt in [1, 2]:
+            job = self.queue.claim(worker_id="w1")
+            self.assertEqual(job.attempts, attempt)
+            self.queue.fail(job_id=job.job_id, worker_id="w1", error="boom")
+
+        self.assertIsNone(self.queue.claim(worker_id="w1"))
+        self.assertEqual(self.queue.failures(), {"a": "boom"})
+
+    def test_expired_leases_are_queued_again(self):
+        queue = JobQueue(db_path=self.db_path, lease_seconds=0.1)
+        try:
+            queue.add(name="a", func=_fail)
+            job = queue.claim(worker_id="w1")
+            self.assertIsNone(queue.claim(worker_id="w2"))
+
+            time.sleep(0.2)
+            again = queue.claim(worker_id="w2")
+            self.assertEqual(again.job_id, job.job_id)
+
+            # the first worker no longer holds the job
+            queue.complete(job_id=job.job_id, worker_id="w1")
+            self.assertEqual(queue.counts(), {RUNNING: 1})
+        finally:
+            queue.close()
+
+    def test_release_worker(self):
+        self.queue.add(name="a", func=_fail)
+        self.queue.claim(worker_id="w1")
+        self.queue.release_worker(worker_id="w1")
+        self.assertEqual(self.queue.counts(), {PENDING: 1})
+
+    def test_worker_pool_requeues_jobs_of_crashed_workers(self):
+        self.queue.add(name="crash", func=partial(_crash_once, self._path("crash")))
+        for name in ["a", "b", "c"]:
+            self.queue.add(name=name, func=partial(_touch, self._path(name)))
+
+        WorkerPool(queue=self.queue, workers=2).run()
+
+        self.assertEqual(self.queue.counts(), {DONE: 4})
+        with open(self._path("crash")) as f:
+            self.assertEqual(f.read(), "xx")
+        for name in ["a", "b", "c"]:
+            self.assertTrue(os.path.exists(self._path(name)))
+
+    def test_worker_pool_raises_failed_jobs(self):
+        self.queue.add(name="a", func=_fail)
+        with self.assertRaises(ValueError):
+            WorkerPool(queue=self.queue, workers=1).run()
+        self.assertEqual(self.queue.counts(), {FAILED: 1})
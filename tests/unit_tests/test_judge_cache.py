@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+from ragulate.pipelines.judge_cache import JudgeCache
+
+
+class FakeProvider:
+    model_engine = "fake-model"
+
+
+class TestJudgeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp_dir.name, "judge_cache.sqlite")
+        self.calls = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _relevance(self, prompt: str, response: str):
+        self.calls.append((prompt, response))
+        return len(self.calls), {"reason": "because"}
+
+    def test_repeated_calls_are_cached_across_instances(self):
+        cache = JudgeCache(db_path=self.db_path)
+        relevance = cache.wrap(
+            self._relevance, provider=FakeProvider(), feedback_name="relevance"
+        )
+        first = relevance("what is  ragulate?", "a tool")
+        self.assertEqual(relevance("what is ragulate?\n", "a tool"), first)
+        cache.close()
+
+        cache = JudgeCache(db_path=self.db_path)
+        relevance = cache.wrap(
+            self._relevance, provider=FakeProvider(), feedback_name="relevance"
+        )
+        self.assertEqual(
+            relevance(prompt="what is ragulate?", response="a tool"), first
+        )
+        self.assertEqual(len(self.calls), 1)
+        cache.close()
+
+    def test_key_includes_feedback_name_and_extra_key(self):
+        cache = JudgeCache(db_path=self.db_path)
+        expected = {"answer": "one"}
+        correctness = cache.wrap(
+            self._relevance,
+            provider=FakeProvider(),
+            feedback_name="correctness",
+            extra_key=lambda prompt, response: expected["answer"],
+        )
+        relevance = cache.wrap(
+            self._relevance, provider=FakeProvider(), feedback_name="relevance"
+        )
+
+        correctness("q", "a")
+        relevance("q", "a")
+        expected["answer"] = "two"
+        correctness("q", "a")
+        self.assertEqual(len(self.calls), 3)
+        cache.close()
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = JudgeCache(db_path=self.db_path, max_entries=10, eviction_interval=1)
+        for i in range(10):
+            cache.put(str(i), i)
+        cache.get("0")
+        cache.put("10", 10)
+
+        self.assertEqual(cache.get("0"), 0)
+        self.assertIs(cache.get("1"), cache.get("missing"))
+        self.assertEqual(cache.get("10"), 10)
+        cache.close()
@@ -0,0 +1,44 @@
+import unittest
+
+from trulens_eval.schema.feedback import FeedbackResultStatus
+
+from ragulate.pipelines.progress_tracker import ProgressTracker
+
+
+class TestProgressTracker(unittest.TestCase):
+
+    def test_counts_follow_feedback_events(self):
+        tracker = ProgressTracker()
+        tracker.feedbacks_queued(3)
+        tracker.feedback_started()
+        tracker.feedback_started()
+        tracker.feedback_finished(FeedbackResultStatus.DONE)
+        tracker.feedback_cancelled()
+
+        counts = tracker.get_feedback_count_by_status()
+        self.assertEqual(counts[FeedbackResultStatus.NONE], 0)
+        self.assertEqual(counts[FeedbackResultStatus.RUNNING], 1)
+        self.assertEqual(counts[FeedbackResultStatus.DONE], 1)
+
+    def test_reconciles_on_a_timer_relative_to_startup(self):
+        db_counts = {FeedbackResultStatus.DONE: 10}
+        calls = []
+
+        def reconcile():
+            calls.append(1)
+            return dict(db_counts)
+
+        tracker = ProgressTracker(reconcile=reconcile, reconcile_interval=3600)
+        tracker.feedbacks_queued(4)
+        db_counts[FeedbackResultStatus.DONE] = 12
+        db_counts[FeedbackResultStatus.NONE] = 2
+
+        # only the startup baseline has been read so far
+        counts = tracker.get_feedback_count_by_status()
+        self.assertEqual(counts, {FeedbackResultStatus.NONE: 4})
+        self.assertEqual(len(calls), 1)
+
+        tracker.reconcile()
+        counts = tracker.get_feedback_count_by_status()
+        self.assertEqual(counts[FeedbackResultStatus.DONE], 2)
+        self.assertEqual(counts[FeedbackResultStatus.NONE], 2)
@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+import unittest
+
+from ragulate.datasets import CragDataset
+from ragulate.datasets.query_cache import arrow_available
+
+
+@unittest.skipUnless(arrow_available(), "pyarrow is not installed")
+class TestQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dataset = CragDataset(
+            dataset_name="task_1", root_storage_path=self.tmp_dir.name
+        )
+        os.makedirs(self.dataset.storage_path())
+        self._write_questions(count=100)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write_questions(self, count):
+        with open(self.dataset._questions_path(), "w") as f:
+            for i in range(count):
+                row = {
+                    "query": f"question {i}?",
+                    "answer": f"answer {i}",
+                    "question_type": "simple" if i % 2 else "set",
+                }
+                f.write(json.dumps(row) + "\n")
+
+    def _cache_files(self):
+        return sorted(os.listdir(self.dataset._query_cache_dir()))
+
+    def test_cache_matches_the_dataset_files(self):
+        self.dataset.subsets = ["set"]
+        expected = self.dataset._read_queries_and_golden_set()
+        expected_sample = self.dataset._read_sampled_queries_and_golden_set(
+            sample_percent=0.5, seed=7
+        )
+
+        self.assertEqual(self.dataset.get_queries_and_golden_set(), expected)
+        self.assertEqual(self._cache_files(), ["queries.set.arrow"])
+        self.assertEqual(
+            self.dataset.get_sampled_queries_and_golden_set(sample_percent=0.5, seed=7),
+            expected_sample,
+        )
+
+        self.dataset.subsets = []
+        queries, _golden_set = self.dataset.get_queries_and_golden_set()
+        self.assertEqual(len(queries), 100)
+        self.assertEqual(
+            self._cache_files(), ["queries.all.arrow", "queries.set.arrow"]
+        )
+
+    def test_cache_is_rebuilt_when_sources_change(self):
+        self.dataset.get_queries_and_golden_set()
+        self._write_questions(count=120)
+
+        queries, golden_set = self.dataset.get_queries_and_golden_set()
+        self.assertEqual(len(queries), 120)
+        self.assertEqual(golden_set[-1]["response"], "answer 119")
@@ -0,0 +1,258 @@
+import json
+import os
+import signal
+import tempfile
+import textwrap
+import time
+import unittest
+from typing import Dict, List, Tuple
+
+from trulens_eval import Feedback
+
+from ragulate.datasets import BaseDataset
+from ragulate.pipelines import QueryPipeline
+from ragulate.pipelines.job_queue import JobQueue
+from ragulate.pipelines.query_progress import QueryProgress
+from ragulate.pipelines.workers import WorkerPool
+from ragulate.result_store import ResultStore
+from ragulate.utils import query_id
+
+QUERIES = [f"question {i}?" for i in range(6)]
+
+RECIPE_SCRIPT = textwrap.dedent(
+    """
+    from typing import List
+
+    from langchain_core.documents import Document
+    from langchain_core.retrievers import BaseRetriever
+    from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+
+    class Retriever(BaseRetriever):
+        def _get_relevant_documents(self, query, *, run_manager) -> List[Document]:
+            return [Document(page_content=query)]
+
+    class RateLimitError(Exception):
+        status_code = 429
+        response = type("Response", (), {"headers": {"retry-after": "0.01"}})()
+
+    def query(**kwargs):
+        return {
+            "context": Retriever(),
+            "question": RunnablePassthrough(),
+        } | RunnableLambda(lambda inputs: inputs["question"].upper())
+
+    def rate_limited_query(**kwargs):
+        # every query is rate limited after retrieval the first time it runs
+        limited = set()
+
+        def answer(inputs):
+            if inputs["question"] not in limited:
+                limited.add(inputs["question"])
+                raise RateLimitError()
+            return inputs["question"].upper()
+
+        return {
+            "context": Retriever(),
+            "question": RunnablePassthrough(),
+        } | RunnableLambda(answer)
+    """
+)
+
+# set in a worker's environment, so its first evaluation of the third query
+# kills it
+CRASH_MARKER_ENV = "RAGULATE_TEST_CRASH_MARKER"
+
+_interrupted_pipeline = None
+
+
+def _answer_length(answer: str) -> float:
+    crash_marker = os.getenv(CRASH_MARKER_ENV)
+    if crash_marker is not None and answer == QUERIES[2].upper():
+        if not os.path.exists(crash_marker):
+            with open(crash_marker, "w"):
+                pass
+            os._exit(1)
+
+    global _interrupted_pipeline
+    pipeline = _interrupted_pipeline
+    if pipeline is not None:
+        # stops the run like Ctrl-C does, once every query has been recorded
+        _interrupted_pipeline = None
+        while pipeline._finished_queries < len(QUERIES):
+            time.sleep(0.01)
+        pipeline.signal_handler(signal.SIGINT, None)
+    return min(1.0, len(answer) / 100)
+
+
+class FakeDataset(BaseDataset):
+    def sub_storage_path(self) -> str:
+        return self.name
+
+    def download_dataset(self):
+        pass
+
+    def get_source_file_paths(self) -> List[str]:
+        return []
+
+    def _read_queries_and_golden_set(self) -> Tuple[List[str], List[Dict[str, str]]]:
+        return list(QUERIES), []
+
+
+class LocalQueryPipeline(QueryPipeline):
+    """evaluates a single feedback that doesn't call an LLM"""
+
+    def get_provider(self):
+        return None
+
+    def get_feedback_functions(self, feedbacks, dataset_name: str) -> List[Feedback]:
+        return [Feedback(_answer_length, name="answer_length").on_output()]
+
+
+def _failing_judge(answer: str) -> float:
+    raise RuntimeError("the judge is down")
+
+
+class FailingJudgeQueryPipeline(LocalQueryPipeline):
+    """evaluates a feedback whose judge always fails"""
+
+    def get_feedback_functions(self, feedbacks, dataset_name: str) -> List[Feedback]:
+        return [Feedback(_failing_judge, name="answer_length").on_output()]
+
+
+class TestQueryPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.script_path = os.path.join(self.tmp_dir.name, "recipe.py")
+        with open(self.script_path, "w") as f:
+            f.write(RECIPE_SCRIPT)
+        self.database_url = (
+            f"sqlite:///{os.path.join(self.tmp_dir.name, 'results.sqlite')}"
+        )
+        self.store = ResultStore(recipe_name="recipe", database_url=self.database_url)
+
+    def tearDown(self):
+        # the pipelines take over Ctrl-C
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        os.environ.pop(CRASH_MARKER_ENV, None)
+        self.tmp_dir.cleanup()
+
+    def _pipeline(
+        self, pipeline_class=LocalQueryPipeline, **kwargs
+    ) -> LocalQueryPipeline:
+        options = dict(
+            recipe_name="recipe",
+            script_path=self.script_path,
+            method_name="query",
+            ingredients={},
+            datasets=[FakeDataset(dataset_name="dataset")],
+            evaluation_mode="batch",
+            evaluation_parallelism=1,
+            judge_cache=False,
+            database_url=self.database_url,
+            show_progress=False,
+        )
+        options.update(kwargs)
+        return pipeline_class(**options)
+
+    def _results(
+        self, app_id: str = "dataset"
+    ) -> Tuple[List[str], List[Tuple[str, str]], set]:
+        """
+        the inputs of the records of a dataset's app, their done feedbacks,
+        and the completed query ids
+        """
+        engine = self.store.engine()
+        try:
+            progress = QueryProgress(
+                engine=engine, table_name=self.store.progress_table
+            )
+            prefix = self.store.table_prefix
+            with engine.connect() as connection:
+                records = connection.exec_driver_sql(
+                    f"SELECT record_id, input FROM {prefix}records WHERE app_id = ?",
+                    (app_id,),
+                ).fetchall()
+                record_ids = {record[0] for record in records}
+                feedbacks = connection.exec_driver_sql(
+                    f"SELECT record_id, status FROM {prefix}feedbacks WHERE status = 'done'"
+                ).fetchall()
+                feedbacks = [row for row in feedbacks if row[0] in record_ids]
+            return (
+                sorted(record[1] for record in records),
+                [tuple(row) for row in feedbacks],
+                progress.completed(app_id=app_id),
+            )
+        finally:
+            engine.dispose()
+
+    def _assert_complete(self, app_id: str = "dataset"):
+        inputs, feedbacks, completed = self._results(app_id=app_id)
+        # one record per query, each with its feedback
+        self.assertEqual(inputs, sorted(json.dumps(query) for query in QUERIES))
+        self.assertEqual(len(set(record_id for record_id, _ in feedbacks)), len(inputs))
+        self.assertEqual(completed, {query_id(query) for query in QUERIES})
+
+    def test_resume_evaluates_cancelled_feedbacks(self):
+        global _interrupted_pipeline
+        pipeline = self._pipeline()
+        _interrupted_pipeline = pipeline
+        pipeline.query()
+
+        # the first query was evaluated, and the feedbacks queued for the
+        # others were cancelled, so only it completed
+        inputs, feedbacks, completed = self._results()
+        self.assertEqual(len(inputs), len(QUERIES))
+        self.assertEqual(len(feedbacks), 1)
+        self.assertEqual(completed, {query_id(QUERIES[0])})
+
+        self._pipeline().query()
+        self._assert_complete()
+
+    def test_queries_with_failed_feedbacks_are_resumed(self):
+        self._pipeline(pipeline_class=FailingJudgeQueryPipeline).query()
+
+        inputs, feedbacks, completed = self._results()
+        self.assertEqual(len(inputs), len(QUERIES))
+        self.assertEqual(feedbacks, [])
+        self.assertEqual(completed, set())
+
+        self._pipeline().query()
+        self._assert_complete()
+
+    def test_concurrent_queries_are_recorded_once_by_their_dataset(self):
+        self._pipeline(
+            datasets=[
+                FakeDataset(dataset_name="dataset"),
+                FakeDataset(dataset_name="other"),
+            ],
+            concurrency=4,
+        ).query()
+        self._assert_complete(app_id="dataset")
+        self._assert_complete(app_id="other")
+
+    def test_limits_must_be_positive(self):
+        for option in [
+            "query_rate_limit",
+            "evaluation_rate_limit",
+            "evaluation_token_limit",
+        ]:
+            with self.assertRaises(ValueError):
+                self._pipeline(**{option: 0})
+
+    def test_rate_limited_queries_are_recorded_once(self):
+        self._pipeline(method_name="rate_limited_query").query()
+        self._assert_complete()
+
+    def test_requeued_worker_job_evaluates_every_query(self):
+        os.environ[CRASH_MARKER_ENV] = os.path.join(self.tmp_dir.name, "crashed")
+        self.store.prepare()
+        queue = JobQueue(db_path=os.path.join(self.tmp_dir.name, "jobs.sqlite"))
+        try:
+            queue.add(name="query", func=self._pipeline(shard_database=False).query)
+            WorkerPool(queue=queue, workers=1).run()
+        finally:
+            queue.close()
+
+        self.assertTrue(os.path.exists(os.environ[CRASH_MARKER_ENV]))
+        self._assert_complete()
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import Column, MetaData, String, Table, create_engine
+
+from ragulate.pipelines.query_progress import QueryProgress
+from ragulate.utils import query_id
+
+
+class TestQueryProgress(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            f"sqlite:///{os.path.join(self.tmp_dir.name, 'recipe.sqlite')}"
+        )
+        self.records = Table(
+            "trulens_records",
+            MetaData(),
+            Column("record_id", String, primary_key=True),
+            Column("app_id", String),
+            Column("input", String),
+        )
+        self.records.create(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(
+                self.records.insert(),
+                [
+                    {
+                        "record_id": "1",
+                        "app_id": "dataset",
+                        "input": json.dumps("what is it?"),
+                    },
+                    {
+                        "record_id": "2",
+                        "app_id": "dataset",
+                        "input": json.dumps("who is it?"),
+                    },
+                    {
+                        "record_id": "3",
+                        "app_id": "other",
+                        "input": json.dumps("where is it?"),
+                    },
+                    {"record_id": "4", "app_id": "dataset", "input": None},
+                ],
+            )
+        self.progress = QueryProgress(engine=self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_backfill_decodes_record_inputs(self):
+        self.assertEqual(
+            self.progress.backfill(app_id="dataset", records_table=self.records),
+            2,
+        )
+        self.assertEqual(
+            self.progress.completed(app_id="dataset"),
+            {query_id("what is it?"), query_id("who is it?")},
+        )
+
+        # apps with progress aren't backfilled again
+        self.progress.mark_completed(
+            app_id="dataset", query_ids=[query_id("new?"), query_id("who is it?")]
+        )
+        self.assertEqual(
+            self.progress.backfill(app_id="dataset", records_table=self.records),
+            0,
+        )
+        self.assertEqual(len(self.progress.completed(app_id="dataset")), 3)
+
+    def test_reset_forgets_progress_of_one_app(self):
+        self.progress.backfill(app_id="dataset", records_table=self.records)
+        self.progress.backfill(app_id="other", records_table=self.records)
+        self.progress.reset(app_id="other")
+
+        self.assertEqual(self.progress.completed(app_id="other"), set())
+        self.assertEqual(len(self.progress.completed(app_id="dataset")), 2)
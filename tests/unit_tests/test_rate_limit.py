@@ -0,0 +1,104 @@
+import threading
+import time
+import unittest
+
+from ragulate.rate_limit import (
+    RateLimiter,
+    TokenBucket,
+    is_rate_limit_error,
+    rate_limit_provider,
+)
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+class FakeProvider:
+    """a provider whose quota only allows `quota` calls in flight at once"""
+
+    def __init__(self, quota: int):
+        self.quota = quota
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rate_limited_calls = 0
+        self.lock = threading.Lock()
+
+    def _create_chat_completion(self, prompt=None, messages=None, **kwargs):
+        with self.lock:
+            if self.in_flight >= self.quota:
+                self.rate_limited_calls += 1
+                raise FakeRateLimitError("Error code: 429 - Too Many Requests")
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        return "Score: 8"
+
+
+class TestRateLimit(unittest.TestCase):
+
+    def test_detects_rate_limit_errors(self):
+        self.assertTrue(is_rate_limit_error(FakeRateLimitError()))
+        self.assertTrue(is_rate_limit_error(RuntimeError("Rate limit reached")))
+        try:
+            try:
+                raise FakeRateLimitError()
+            except FakeRateLimitError as e:
+                raise RuntimeError("request failed") from e
+        except RuntimeError as e:
+            self.assertTrue(is_rate_limit_error(e))
+        self.assertFalse(is_rate_limit_error(ValueError("bad input")))
+
+        # "429" only counts as a status, and errors with a status are judged by it
+        self.assertTrue(is_rate_limit_error(RuntimeError("Error code: 429")))
+        self.assertFalse(is_rate_limit_error(RuntimeError("record 4291 not found")))
+        self.assertFalse(is_rate_limit_error(ValueError("prompt has 1429 tokens")))
+        server_error = RuntimeError("Error code: 429 in upstream")
+        server_error.status_code = 500
+        self.assertFalse(is_rate_limit_error(server_error))
+
+    def test_rate_limited_calls_are_retried_with_less_concurrency(self):
+        provider = FakeProvider(quota=2)
+        limiter = RateLimiter(max_concurrency=8, initial_backoff=0.01)
+        rate_limit_provider(provider, limiter)
+
+        results = []
+
+        def call_provider():
+            for i in range(5):
+                results.append(provider._create_chat_completion(prompt=f"q{i}"))
+
+        # plain threads, as importing TruLens patches ThreadPoolExecutor with a
+        # version whose slow `submit` would keep the calls from overlapping.
+        threads = [threading.Thread(target=call_provider) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["Score: 8"] * 40)
+        self.assertGreater(provider.rate_limited_calls, 0)
+        self.assertLessEqual(provider.max_in_flight, 2)
+        self.assertLess(limiter.concurrency_limit, 8)
+
+    def test_other_errors_are_not_retried(self):
+        calls = []
+
+        def fail():
+            calls.append(1)
+            raise ValueError("bad input")
+
+        limiter = RateLimiter(initial_backoff=0.01)
+        with self.assertRaises(ValueError):
+            limiter.call(fail)
+        self.assertEqual(len(calls), 1)
+
+    def test_token_bucket_paces_calls(self):
+        bucket = TokenBucket(per_minute=600, burst_seconds=0.1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # one call is allowed immediately, then one every 0.1 seconds
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
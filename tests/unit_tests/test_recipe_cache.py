@@ -0,0 +1,89 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from ragulate import cached_resource, clear_resources
+from ragulate.pipelines.base_pipeline import get_method, load_module
+
+SCRIPT = """
+import itertools
+
+loads = itertools.count()
+next(loads)
+
+
+def query(k: int):
+    return k
+"""
+
+
+class TestModuleCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.script_path = os.path.join(self.tmp_dir.name, "recipe.py")
+        with open(self.script_path, "w") as f:
+            f.write(SCRIPT)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_script_is_loaded_once(self):
+        module = load_module(self.script_path, name="query")
+        self.assertIs(load_module(self.script_path, name="ingest"), module)
+        self.assertIs(
+            get_method(
+                script_path=self.script_path, pipeline_type="query", method_name="query"
+            ),
+            module.query,
+        )
+        self.assertEqual(next(module.loads), 1)
+
+    def test_changed_script_is_loaded_again(self):
+        module = load_module(self.script_path, name="query")
+        stat = os.stat(self.script_path)
+        os.utime(self.script_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertIsNot(load_module(self.script_path, name="query"), module)
+
+
+class TestCachedResource(unittest.TestCase):
+
+    def setUp(self):
+        self.builds = []
+
+        @cached_resource
+        def get_model(chunk_size: int, device: str = "cpu"):
+            self.builds.append((chunk_size, device))
+            return object()
+
+        self.get_model = get_model
+
+    def tearDown(self):
+        clear_resources()
+
+    def test_resource_is_built_once_per_arguments(self):
+        model = self.get_model(100)
+        self.assertIs(self.get_model(100), model)
+        self.assertIsNot(self.get_model(200), model)
+        self.assertIs(self.get_model(100, device="cpu"), self.get_model(100, "cpu"))
+        self.assertEqual(self.builds, [(100, "cpu"), (200, "cpu")])
+
+    def test_concurrent_calls_build_once(self):
+        threads = [
+            threading.Thread(target=self.get_model, args=(100,)) for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.builds, [(100, "cpu")])
+
+    def test_unhashable_arguments(self):
+        with self.assertRaises(ValueError):
+            self.get_model([100])
+
+    def test_clear_resources(self):
+        model = self.get_model(100)
+        clear_resources()
+        self.assertIsNot(self.get_model(100), model)
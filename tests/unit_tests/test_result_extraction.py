@@ -0,0 +1,139 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+from sqlalchemy import delete, insert, update
+
+from ragulate import result_extraction
+from ragulate.analysis import Analysis
+from ragulate.result_extraction import ResultSnapshot
+from ragulate.result_store import ResultStore
+
+PERF = json.dumps(
+    {"start_time": "2024-06-01T10:00:00", "end_time": "2024-06-01T10:00:03.5"}
+)
+
+
+class TestResultExtraction(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        env = mock.patch.dict(
+            os.environ,
+            {
+                "RAGULATE_STATE_DIR": os.path.join(self.tmp_dir.name, "state"),
+                "RAGULATE_DATABASE_URL": f"sqlite:///{os.path.join(self.tmp_dir.name, 'results.sqlite')}",
+            },
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+        if result_extraction.pyarrow is None:
+            # keeps snapshots in memory, so refreshes are still incremental
+            snapshots = {}
+            for name, func in [
+                ("_load", lambda snapshot: snapshots.get("saved")),
+                (
+                    "_save",
+                    lambda snapshot, summary, records, feedbacks: snapshots.update(
+                        saved=(summary, records.copy(), feedbacks.copy())
+                    ),
+                ),
+            ]:
+                patch = mock.patch.object(ResultSnapshot, name, func)
+                patch.start()
+                self.addCleanup(patch.stop)
+
+        self.tru = ResultStore(recipe_name="recipe").tru()
+        self.orm = self.tru.db.orm
+        self.ts = 0.0
+
+    def tearDown(self):
+        self.tru.db.engine.dispose()
+        self.tru.delete_singleton()
+        self.tmp_dir.cleanup()
+
+    def _add_record(self, record_id, dataset, results):
+        self.ts += 1
+        with self.tru.db.engine.begin() as connection:
+            connection.execute(
+                insert(self.orm.Record.__table__),
+                {
+                    "record_id": record_id,
+                    "app_id": dataset,
+                    "input": json.dumps("question?"),
+                    "record_json": "{}",
+                    "tags": "",
+                    "ts": self.ts,
+                    "cost_json": json.dumps({"n_tokens": 10, "cost": 0.5}),
+                    "perf_json": PERF,
+                },
+            )
+            for name, result in results.items():
+                connection.execute(
+                    insert(self.orm.FeedbackResult.__table__),
+                    {
+                        "feedback_result_id": f"{record_id}-{name}",
+                        "record_id": record_id,
+                        "feedback_definition_id": name,
+                        "last_ts": self.ts,
+                        "status": "done",
+                        "calls_json": "{}",
+                        "name": name,
+                        "result": result,
+                        "cost_json": "{}",
+                    },
+                )
+
+    def _get_data(self):
+        df, metrics = Analysis().get_all_data(recipes=["recipe"])
+        return df.sort_values("record_id").reset_index(drop=True), sorted(metrics)
+
+    def test_results_are_extracted_incrementally(self):
+        self._add_record("a", "first", {"groundedness": 0.5, "answer_relevance": -1})
+        df, metrics = self._get_data()
+        self.assertEqual(metrics, ["answer_relevance", "groundedness"])
+        self.assertEqual(df.loc[0, "latency"], 3.0)
+        self.assertEqual(df.loc[0, "total_tokens"], 10)
+        self.assertEqual(df.loc[0, "recipe"], "recipe")
+        self.assertTrue(df["answer_relevance"].isna().all())
+
+        self._add_record("b", "second", {"groundedness": 1.0})
+        df, _metrics = self._get_data()
+        self.assertEqual(df["record_id"].tolist(), ["a", "b"])
+        self.assertEqual(df["dataset"].tolist(), ["first", "second"])
+        self.assertEqual(df["groundedness"].tolist(), [0.5, 1.0])
+
+        with self.tru.db.engine.begin() as connection:
+            connection.execute(delete(self.orm.Record.__table__))
+            connection.execute(delete(self.orm.FeedbackResult.__table__))
+        self._add_record("c", "first", {"groundedness": 0.25})
+        df, _metrics = self._get_data()
+        self.assertEqual(df["record_id"].tolist(), ["c"])
+        self.assertEqual(df["groundedness"].tolist(), [0.25])
+
+    def test_feedbacks_finished_in_place_are_read_again(self):
+        self._add_record("a", "first", {"groundedness": None})
+        self._add_record("b", "first", {"groundedness": 1.0})
+        with self.tru.db.engine.begin() as connection:
+            connection.execute(
+                update(self.orm.FeedbackResult.__table__)
+                .where(self.orm.FeedbackResult.feedback_result_id == "a-groundedness")
+                .values(status="running")
+            )
+        df, _metrics = self._get_data()
+        self.assertTrue(pd.isna(df.loc[0, "groundedness"]))
+
+        # the slow feedback finishes with the timestamp of when it started,
+        # older than the latest one in the snapshot
+        with self.tru.db.engine.begin() as connection:
+            connection.execute(
+                update(self.orm.FeedbackResult.__table__)
+                .where(self.orm.FeedbackResult.feedback_result_id == "a-groundedness")
+                .values(status="done", result=0.75)
+            )
+        df, _metrics = self._get_data()
+        self.assertEqual(df["groundedness"].tolist(), [0.75, 1.0])
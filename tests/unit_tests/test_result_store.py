@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import func, insert, select, text
+
+from ragulate.pipelines.query_progress import QueryProgress
+from ragulate.result_store import ResultStore
+from ragulate.utils import query_id
+
+
+class TestResultStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(self.tmp_dir.name, 'shared.sqlite')}"
+        self.store = ResultStore(
+            recipe_name="Chunk Size 100", database_url=database_url
+        )
+        self.tru = self.store.tru()
+        self.orm = self.tru.db.orm
+
+        with self.tru.db.engine.begin() as connection:
+            for app_id in ["first", "second"]:
+                connection.execute(
+                    insert(self.orm.AppDefinition.__table__),
+                    {"app_id": app_id, "app_json": "{}"},
+                )
+                for i in range(3):
+                    record_id = f"{app_id}-{i}"
+                    connection.execute(
+                        insert(self.orm.Record.__table__),
+                        {
+                            "record_id": record_id,
+                            "app_id": app_id,
+                            "input": json.dumps(f"question {i}?"),
+                            "record_json": "{}",
+                            "tags": "",
+                            "ts": 0.0,
+                            "cost_json": "{}",
+                            "perf_json": "{}",
+                        },
+                    )
+                    connection.execute(
+                        insert(self.orm.FeedbackResult.__table__),
+                        {
+                            "feedback_result_id": f"{record_id}-feedback",
+                            "record_id": record_id,
+                            "feedback_definition_id": "definition",
+                            "last_ts": 0.0,
+                            "status": "done",
+                            "calls_json": "{}",
+                            "name": "groundedness",
+                            "cost_json": "{}",
+                        },
+                    )
+
+    def tearDown(self):
+        self.tru.db.engine.dispose()
+        self.tru.delete_singleton()
+        self.tmp_dir.cleanup()
+
+    def _count(self, table, app_id):
+        with self.tru.db.engine.connect() as connection:
+            if table is self.orm.FeedbackResult:
+                return connection.execute(
+                    select(func.count())
+                    .select_from(table.__table__)
+                    .where(table.record_id.like(f"{app_id}-%"))
+                ).scalar()
+            return connection.execute(
+                select(func.count())
+                .select_from(table.__table__)
+                .where(table.app_id == app_id)
+            ).scalar()
+
+    def test_shared_database_is_scoped_by_recipe(self):
+        self.assertEqual(self.store.table_prefix, "ragulate_chunk_size_100_")
+        self.assertEqual(
+            self.orm.Record.__tablename__, "ragulate_chunk_size_100_records"
+        )
+        with self.tru.db.engine.connect() as connection:
+            self.assertEqual(
+                connection.execute(text("PRAGMA journal_mode")).scalar(), "wal"
+            )
+
+    def test_reset_app_only_deletes_that_app(self):
+        progress = QueryProgress(
+            engine=self.tru.db.engine, table_name=self.store.progress_table
+        )
+        for app_id in ["first", "second"]:
+            progress.backfill(app_id=app_id, records_table=self.orm.Record.__table__)
+
+        self.store.reset_app(tru=self.tru, app_id="first")
+        progress.reset(app_id="first")
+
+        for table in [self.orm.AppDefinition, self.orm.Record, self.orm.FeedbackResult]:
+            self.assertEqual(self._count(table, "first"), 0)
+        self.assertEqual(self._count(self.orm.Record, "second"), 3)
+        self.assertEqual(self._count(self.orm.FeedbackResult, "second"), 3)
+        self.assertEqual(progress.completed(app_id="first"), set())
+        self.assertEqual(
+            progress.completed(app_id="second"),
+            {query_id(f"question {i}?") for i in range(3)},
+        )
@@ -0,0 +1,127 @@
+import os
+import tempfile
+import time
+import unittest
+from functools import partial
+
+from ragulate.pipelines import Scheduler
+from ragulate.pipelines.scheduler import DONE, FAILED, SKIPPED
+
+
+def _record(log_path: str, name: str, duration: float = 0.0) -> None:
+    with open(log_path, "a") as f:
+        f.write(f"start {name}\n")
+    time.sleep(duration)
+    with open(log_path, "a") as f:
+        f.write(f"end {name}\n")
+
+
+def _fail() -> None:
+    raise RuntimeError("boom")
+
+
+def _wait_for(path: str, marker: str) -> None:
+    """only finishes once the other task is running at the same time"""
+    with open(os.path.join(path, marker), "w"):
+        pass
+    other = os.path.join(path, "b" if marker == "a" else "a")
+    deadline = time.monotonic() + 60
+    while not os.path.exists(other):
+        if time.monotonic() > deadline:
+            raise TimeoutError()
+        time.sleep(0.05)
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.tmp_dir.name, "log")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _log(self):
+        with open(self.log_path) as f:
+            return f.read().splitlines()
+
+    def test_serial_runs_in_order(self):
+        scheduler = Scheduler()
+        download = scheduler.add_task(
+            "download", "download", partial(_record, self.log_path, "download")
+        )
+        ingest = scheduler.add_task(
+            "ingest", "ingest", partial(_record, self.log_path, "ingest"), [download]
+        )
+        for name in ["query a", "query b"]:
+            scheduler.add_task(
+                name, "query", partial(_record, self.log_path, name), [ingest]
+            )
+        scheduler.run()
+
+        self.assertEqual(
+            [line.split(" ", 1)[1] for line in self._log() if line.startswith("end")],
+            ["download", "ingest", "query a", "query b"],
+        )
+        self.assertTrue(all(t.status == DONE for t in scheduler.tasks))
+
+    def test_failure_skips_dependents_only(self):
+        scheduler = Scheduler()
+        failed = scheduler.add_task("ingest a", "ingest", _fail)
+        skipped = scheduler.add_task(
+            "query a", "query", partial(_record, self.log_path, "a"), [failed]
+        )
+        done = scheduler.add_task(
+            "query b", "query", partial(_record, self.log_path, "b")
+        )
+        compare = scheduler.add_task(
+            "compare", "compare", lambda: None, [skipped, done], local=True
+        )
+
+        with self.assertRaises(ValueError):
+            scheduler.run()
+        self.assertEqual(
+            [failed.status, skipped.status, done.status, compare.status],
+            [FAILED, SKIPPED, DONE, SKIPPED],
+        )
+
+    def test_parallel_runs_independent_tasks_concurrently(self):
+        scheduler = Scheduler(parallelism=2)
+        tasks = [
+            scheduler.add_task(
+                f"query {marker}",
+                "query",
+                partial(_wait_for, self.tmp_dir.name, marker),
+            )
+            for marker in ["a", "b"]
+        ]
+        compare = scheduler.add_task(
+            "compare",
+            "compare",
+            partial(_record, self.log_path, "compare"),
+            tasks,
+            local=True,
+        )
+        scheduler.run()
+
+        self.assertEqual(compare.status, DONE)
+        self.assertEqual(self._log(), ["start compare", "end compare"])
+
+    def test_kind_limits(self):
+        scheduler = Scheduler(parallelism=3, limits={"ingest": 1})
+        for name in ["a", "b", "c"]:
+            scheduler.add_task(
+                f"ingest {name}", "ingest", partial(_record, self.log_path, name, 0.2)
+            )
+        scheduler.run()
+
+        # the ingests never overlap
+        log = self._log()
+        for i in range(0, len(log), 2):
+            self.assertEqual(log[i].split()[1], log[i + 1].split()[1])
+            self.assertTrue(log[i].startswith("start"))
+
+    def test_limits_must_be_positive(self):
+        for options in [{"parallelism": 0}, {"limits": {"ingest": 0}}]:
+            with self.assertRaises(ValueError):
+                Scheduler(**options)
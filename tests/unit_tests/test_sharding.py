@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from ragulate.pipelines import QueryPipeline
+from ragulate.sharding import in_shard, merge_shards, parse_shard, shard_recipe_name
+
+
+class TestSharding(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for value in ["4/4", "1/0", "1", "a/b"]:
+            with self.assertRaises(ValueError):
+                parse_shard(value)
+
+    def test_shards_split_queries_without_overlap(self):
+        queries = [f"question {i}?" for i in range(1000)]
+        shards = [(i, 4) for i in range(4)]
+        counts = [sum(in_shard(q, shard) for q in queries) for shard in shards]
+
+        self.assertEqual(sum(counts), len(queries))
+        self.assertTrue(all(count > 150 for count in counts))
+
+    def _write_shard(self, shard, record_ids):
+        db_path = f"{shard_recipe_name('recipe', shard)}.sqlite"
+        with sqlite3.connect(db_path) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS records (record_id TEXT PRIMARY KEY, status TEXT)"
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO records VALUES (?, ?)",
+                [(r, status) for r, status in record_ids],
+            )
+        connection.close()
+
+    def _merged_records(self):
+        with sqlite3.connect("recipe.sqlite") as connection:
+            rows = connection.execute("SELECT * FROM records ORDER BY record_id")
+            return rows.fetchall()
+
+    def test_sampled_shards_need_a_seed(self):
+        with open("recipe.py", "w") as f:
+            f.write("def query(**kwargs):\n    pass\n")
+        options = dict(
+            recipe_name="recipe",
+            script_path="recipe.py",
+            method_name="query",
+            ingredients={},
+            datasets=[],
+            sample_percent=0.5,
+            shard=(0, 2),
+        )
+        with self.assertRaises(ValueError):
+            QueryPipeline(**options)
+        QueryPipeline(random_seed=7, **options)
+
+    def test_shards_are_merged(self):
+        self._write_shard((0, 2), [("a", "running"), ("b", "done")])
+        self._write_shard((1, 2), [("c", "done")])
+        self.assertEqual(len(merge_shards("recipe")), 2)
+        self.assertEqual(
+            self._merged_records(), [("a", "running"), ("b", "done"), ("c", "done")]
+        )
+
+        # merging again picks up later progress of the shards
+        self._write_shard((0, 2), [("a", "done")])
+        merge_shards("recipe")
+        self.assertEqual(
+            self._merged_records(), [("a", "done"), ("b", "done"), ("c", "done")]
+        )
+
+        with self.assertRaises(ValueError):
+            merge_shards("other")